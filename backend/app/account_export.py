@@ -0,0 +1,36 @@
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.models import Subscription, User
+
+AccountRow = Tuple[str, User, Optional[Subscription]]
+
+
+def account_record(cursor: str, user: User, subscription: Optional[Subscription]) -> dict:
+    return {
+        "cursor": cursor,
+        "id": user.id,
+        "email": user.email,
+        "stripe_customer_id": user.stripe_customer_id,
+        "created_at": user.created_at.isoformat(),
+        "subscription": {
+            "stripe_subscription_id": subscription.stripe_subscription_id,
+            "status": subscription.status,
+            "plan": subscription.plan,
+            "current_period_end": subscription.current_period_end.isoformat(),
+            "created_at": subscription.created_at.isoformat(),
+        } if subscription else None,
+    }
+
+
+async def export_accounts(repository, first_page: List[AccountRow], page_size: int) -> AsyncIterator[bytes]:
+    # One NDJSON line per account, a page at a time: only the page being
+    # written is held in memory, and the send of each chunk waits for the
+    # client, so a slow reader slows the export instead of buffering it.
+    # A client that gets cut off resumes from the last cursor it received.
+    page = first_page
+    while page:
+        yield "".join(json.dumps(account_record(*row)) + "\n" for row in page).encode("utf-8")
+        if len(page) < page_size:
+            return
+        page = await repository.list_accounts_page(page[-1][0], page_size)
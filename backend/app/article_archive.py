@@ -0,0 +1,116 @@
+import asyncio
+import base64
+import bisect
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.models import Article
+
+logger = logging.getLogger(__name__)
+
+
+def article_id(guid_or_link: str) -> str:
+    return hashlib.sha256(guid_or_link.encode("utf-8")).hexdigest()[:16]
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def encode_cursor(key: Tuple[float, str]) -> str:
+    raw = f"{key[0]!r}|{key[1]}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    timestamp, _, identifier = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").partition("|")
+    return float(timestamp), identifier
+
+
+class ArticleArchive:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.version = 0
+        self._articles: Dict[str, Article] = {}
+        # Sorted (published timestamp, id) pairs: the publish-time index used
+        # for pagination and date-range filters.
+        self._by_published: List[Tuple[float, str]] = []
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    self._add(Article.model_validate_json(line))
+        self.version += 1
+        logger.info("Loaded %d archived articles from %s", len(self._articles), self.path)
+
+    def _add(self, article: Article) -> bool:
+        if article.id in self._articles:
+            return False
+        self._articles[article.id] = article
+        bisect.insort(self._by_published, (_timestamp(article.published_at), article.id))
+        return True
+
+    def _append_to_disk(self, articles: List[Article]):
+        with open(self.path, "a") as f:
+            for article in articles:
+                f.write(article.model_dump_json() + "\n")
+
+    async def ingest(self, articles: List[Article]) -> List[Article]:
+        added = [article for article in articles if self._add(article)]
+        if added:
+            self.version += 1
+            if self.path:
+                await asyncio.to_thread(self._append_to_disk, added)
+        return added
+
+    def get(self, identifier: str) -> Optional[Article]:
+        return self._articles.get(identifier)
+
+    def articles(self) -> Iterator[Article]:
+        return iter(self._articles.values())
+
+    def page(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Tuple[List[Article], Optional[str]]:
+        # Newest first: walk the publish-time index backwards from the upper
+        # bound, so a page costs O(log n + limit).
+        end = len(self._by_published)
+        if cursor:
+            end = bisect.bisect_left(self._by_published, decode_cursor(cursor))
+        if until is not None:
+            end = min(end, bisect.bisect_right(self._by_published, (_timestamp(until), "￿")))
+        lower = _timestamp(since) if since is not None else None
+
+        items = []
+        position = end - 1
+        while position >= 0 and len(items) < limit:
+            key = self._by_published[position]
+            if lower is not None and key[0] < lower:
+                break
+            items.append(self._articles[key[1]])
+            position -= 1
+
+        next_cursor = None
+        if position >= 0 and items:
+            key = (_timestamp(items[-1].published_at), items[-1].id)
+            if lower is None or self._by_published[position][0] >= lower:
+                next_cursor = encode_cursor(key)
+        return items, next_cursor
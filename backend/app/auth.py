@@ -1,25 +1,35 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
+import time
 from jose import JWTError, jwt
 import bcrypt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import os
-from dotenv import load_dotenv
+from app.config import get_settings
 
-load_dotenv()
+settings = get_settings()
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
+SECRET_KEY = settings.jwt_secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+TOKEN_CACHE_TTL_SECONDS = settings.token_cache_ttl_seconds
+TOKEN_CACHE_MAX_ENTRIES = 10000
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -41,9 +51,31 @@ def decode_token(token: str):
     except JWTError:
         return None
 
-async def get_current_user_email(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    token = credentials.credentials
-    email = decode_token(token)
+_verified_tokens: Dict[str, Tuple[str, float]] = {}
+
+def decode_token_cached(token: str):
+    now = time.time()
+    cached = _verified_tokens.get(token)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    if email is None:
+        return None
+
+    if TOKEN_CACHE_TTL_SECONDS > 0:
+        if len(_verified_tokens) >= TOKEN_CACHE_MAX_ENTRIES:
+            _verified_tokens.clear()
+        # Never cache a token past its own expiry.
+        _verified_tokens[token] = (email, min(now + TOKEN_CACHE_TTL_SECONDS, payload.get("exp", now)))
+    return email
+
+def _email_from_token(token: Optional[str]) -> str:
+    email = decode_token_cached(token) if token else None
     if email is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -51,3 +83,14 @@ async def get_current_user_email(credentials: HTTPAuthorizationCredentials = Dep
             headers={"WWW-Authenticate": "Bearer"},
         )
     return email
+
+async def get_current_user_email(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    return _email_from_token(credentials.credentials)
+
+async def get_stream_user_email(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    access_token: Optional[str] = Query(None)
+) -> str:
+    # Browsers' EventSource cannot set an Authorization header, so streaming
+    # endpoints also accept the token as a query parameter.
+    return _email_from_token(credentials.credentials if credentials else access_token)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Awaitable, Callable, Deque, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+HEARTBEAT_FRAME = b": ping\n\n"
+EVICTED_FRAME = b'event: evicted\ndata: {"reason": "slow consumer"}\n\n'
+CLOSED_FRAME = b'event: closed\ndata: {"reason": "server shutdown"}\n\n'
+RESET_FRAME = b'event: reset\ndata: {"reason": "missed events"}\n\n'
+UNSUBSCRIBED_FRAME = b'event: closed\ndata: {"reason": "subscription inactive"}\n\n'
+
+
+def sse_frame(sequence: int, event: str, data: str) -> bytes:
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"id: {sequence}\nevent: {event}\n{lines}\n".encode("utf-8")
+
+
+@dataclass
+class BroadcasterStats:
+    published: int = 0
+    delivered: int = 0
+    connected: int = 0
+    disconnected: int = 0
+    evicted: int = 0
+    rejected: int = 0
+    replayed: int = 0
+    resets: int = 0
+
+
+class Subscriber:
+    __slots__ = ("queue", "closing")
+
+    def __init__(self, buffer_size: int):
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(buffer_size + 1)
+        self.closing = False
+
+
+class Broadcaster:
+    def __init__(self, buffer_size: int = 64, replay_size: int = 256, max_subscribers: int = 10000):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.stats = BroadcasterStats()
+        self._subscribers: Set[Subscriber] = set()
+        self._history: Deque[Tuple[int, bytes]] = deque(maxlen=replay_size)
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscriber:
+        if len(self._subscribers) >= self.max_subscribers:
+            self.stats.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many streaming clients, try again shortly",
+                headers={"Retry-After": "5"},
+            )
+        subscriber = Subscriber(self.buffer_size)
+        if last_event_id is not None:
+            self._replay(subscriber, last_event_id)
+        self._subscribers.add(subscriber)
+        self.stats.connected += 1
+        return subscriber
+
+    def _replay(self, subscriber: Subscriber, last_event_id: str):
+        # A reconnecting client resumes from the replay window; if it missed
+        # more than the window (or its buffer) holds it is told to refetch.
+        try:
+            last_seen = int(last_event_id)
+        except ValueError:
+            return
+        missed = [frame for sequence, frame in self._history if sequence > last_seen]
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if last_seen > self._sequence or oldest > last_seen + 1 or len(missed) > self.buffer_size:
+            subscriber.queue.put_nowait(RESET_FRAME)
+            self.stats.resets += 1
+            return
+        for frame in missed:
+            subscriber.queue.put_nowait(frame)
+        self.stats.replayed += len(missed)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.discard(subscriber)
+            self.stats.disconnected += 1
+
+    def publish(self, event: str, data: str):
+        # The frame is encoded once and the same bytes are queued for every
+        # subscriber; a subscriber whose buffer is full is evicted rather
+        # than allowed to hold frames back for everyone.
+        self._sequence += 1
+        frame = sse_frame(self._sequence, event, data)
+        self._history.append((self._sequence, frame))
+        self.stats.published += 1
+        for subscriber in list(self._subscribers):
+            if subscriber.queue.qsize() >= self.buffer_size:
+                self._close(subscriber, EVICTED_FRAME)
+                self.stats.evicted += 1
+                continue
+            subscriber.queue.put_nowait(frame)
+            self.stats.delivered += 1
+
+    def publish_json(self, event: str, payload: dict):
+        self.publish(event, json.dumps(payload))
+
+    def _close(self, subscriber: Subscriber, frame: bytes):
+        self.unsubscribe(subscriber)
+        subscriber.closing = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(frame)
+
+    def close(self):
+        for subscriber in list(self._subscribers):
+            self._close(subscriber, CLOSED_FRAME)
+
+    async def stream(
+        self,
+        subscriber: Subscriber,
+        heartbeat: float,
+        still_allowed: Callable[[], Awaitable[bool]],
+    ) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Idle connections double as the entitlement re-check.
+                    if not await still_allowed():
+                        yield UNSUBSCRIBED_FRAME
+                        return
+                    frame = HEARTBEAT_FRAME
+                yield frame
+                if subscriber.closing and subscriber.queue.empty():
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        data["subscribers"] = len(self._subscribers)
+        data["last_event_id"] = self._sequence
+        return data
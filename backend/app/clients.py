@@ -0,0 +1,41 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def stripe_api():
+    # The Stripe SDK takes around a second to import, more than the rest of
+    # the app together, and most requests never touch it; pay for it on
+    # first use instead of on every start.
+    import stripe
+
+    settings = get_settings()
+    if settings.stripe_secret_key:
+        stripe.api_key = settings.stripe_secret_key
+    if settings.stripe_api_base:
+        stripe.api_base = settings.stripe_api_base
+    return stripe
+
+
+@lru_cache(maxsize=None)
+def openai_client():
+    from openai import AsyncOpenAI
+
+    settings = get_settings()
+    # Retries are handled by the gateway so they count against its retry budget.
+    return AsyncOpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url, max_retries=0)
+
+
+async def warm_up():
+    # Runs in the background once the app is serving, so the first checkout
+    # or summary doesn't wait for the imports either.
+    for name, create in (("stripe", stripe_api), ("openai", openai_client)):
+        try:
+            await asyncio.to_thread(create)
+        except Exception as e:
+            logger.warning("Could not initialise the %s client: %s", name, e)
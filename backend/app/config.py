@@ -0,0 +1,141 @@
+import os
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Optional, Union, get_args, get_origin
+
+_TRUE = ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Every field is read from the environment variable of the same name in
+    # upper case; anything unset keeps the default below.
+
+    # Auth
+    jwt_secret_key: str = "your-secret-key-change-in-production"
+    bcrypt_rounds: int = 12
+    token_cache_ttl_seconds: float = 60.0
+    principal_cache_ttl_seconds: float = 30.0
+    admin_emails: str = ""
+    # Bearer token a Prometheus scraper sends for /metrics; admins' own
+    # tokens are accepted too.
+    metrics_token: Optional[str] = None
+    password_hash_workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    password_hash_max_pending: Optional[int] = None
+
+    # Logging and diagnostics
+    log_level: str = "INFO"
+    log_format: str = "json"
+    loop_lag_interval_seconds: float = 0.5
+    loop_stall_threshold_ms: float = 0.0
+    trace_sample_rate: float = 0.01
+    trace_buffer_size: int = 200
+
+    # Storage
+    database_url: Optional[str] = None
+    database_pool_min_size: int = 2
+    database_pool_max_size: int = 10
+    article_archive_path: Optional[str] = None
+    search_index_path: Optional[str] = None
+    search_index_flush_threshold: int = 5000
+    summary_db_path: Optional[str] = None
+    summary_cache_size: int = 1024
+    summary_cost_usd: float = 0.0005
+    news_response_cache_size: int = 256
+
+    # Rate limits
+    rate_limits_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limits: Optional[str] = None
+
+    # Feeds and streaming
+    fca_feed_url: str = "https://www.fca.org.uk/news/rss.xml"
+    fca_feed_refresh_seconds: float = 300.0
+    feed_sources_path: Optional[str] = None
+    feed_max_per_host: int = 2
+    feed_max_connections: int = 20
+    feed_parse_workers: int = 2
+    feed_timeout_seconds: float = 20.0
+    feed_user_agent: str = "ComplyEase feed ingester"
+    feed_max_backoff_seconds: float = 3600.0
+    stream_buffer_size: int = 64
+    stream_replay_size: int = 256
+    stream_max_clients: int = 10000
+    stream_heartbeat_seconds: float = 15.0
+
+    # OpenAI
+    openai_api_key: Optional[str] = None
+    openai_base_url: Optional[str] = None
+    openai_max_concurrency: int = 16
+    openai_per_user_concurrency: int = 2
+    openai_timeout_seconds: float = 20.0
+    openai_max_attempts: int = 3
+    openai_retry_budget_ratio: float = 0.2
+    openai_breaker_threshold: int = 5
+    openai_breaker_reset_seconds: float = 30.0
+    presummarize_workers: int = 2
+    presummarize_rate_per_second: float = 1.0
+    presummarize_max_queue: int = 200
+
+    # Stripe
+    stripe_secret_key: Optional[str] = None
+    stripe_publishable_key: Optional[str] = None
+    stripe_webhook_secret: str = ""
+    stripe_api_base: Optional[str] = None
+    stripe_price_id: Optional[str] = None
+    frontend_url: str = "http://localhost:5173"
+    webhook_workers: int = 4
+    webhook_claim_timeout_seconds: float = 300.0
+    # Stripe retries an event for up to three days; a processed event has to
+    # be remembered that long to recognise the retry as a duplicate.
+    webhook_dedup_window_seconds: float = 259200.0
+    expiry_sweep_interval_seconds: float = 300.0
+    expiry_sweep_grace_seconds: float = 3600.0
+    expiry_sweep_batch_size: int = 100
+    expiry_sweep_max_per_tick: int = 1000
+    expiry_sweep_concurrency: int = 4
+    stripe_backfill_on_startup: bool = False
+    stripe_backfill_since: str = "2011-01-01"
+    stripe_backfill_shards: int = 8
+    stripe_backfill_concurrency: int = 4
+    stripe_backfill_rps: float = 20.0
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "Settings":
+        values = {}
+        for setting in fields(cls):
+            name = setting.name.upper()
+            raw = environ.get(name)
+            if raw is None:
+                continue
+            try:
+                values[setting.name] = _parse(setting.type, raw)
+            except ValueError:
+                raise ValueError(f"{name}={raw!r} is not a valid {_kind(setting.type).__name__}") from None
+        return cls(**values)
+
+
+def _kind(annotation) -> type:
+    # Optional[int] -> int
+    if get_origin(annotation) is Union:
+        return next(arg for arg in get_args(annotation) if arg is not type(None))
+    return annotation
+
+
+def _parse(annotation, raw: str):
+    kind = _kind(annotation)
+    if kind is bool:
+        return raw.strip().lower() in _TRUE
+    if kind in (int, float):
+        return kind(raw)
+    return raw
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    # Read once per process: .env is loaded here and nowhere else, and every
+    # module sees the same values.
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return Settings.from_env()
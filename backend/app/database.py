@@ -1,62 +1,394 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from app.models import User, Subscription
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import heapq
+import sys
 import uuid
 
-users_db: Dict[str, User] = {}
-subscriptions_db: Dict[str, Subscription] = {}
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+DAY_US = 86_400_000_000
+
+def _to_epoch(moment: datetime) -> int:
+    # Naive datetimes are stored as they are (the app uses naive UTC);
+    # aware ones are converted to UTC first.
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+def _from_epoch(epoch_us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=epoch_us)
+
+def _day(epoch_us: int) -> int:
+    return EPOCH_ORDINAL + epoch_us // DAY_US
+
+class EmailAlreadyRegistered(Exception):
+    # Raised by every repository's create_user, so two registrations racing
+    # past the route's lookup still end in one account.
+    pass
+
+# The store keeps these slotted records rather than pydantic models: a User
+# model with its __dict__, fields-set and datetime costs several times as
+# much per account. They have the models' attributes, so the functions below
+# hand out the records themselves; model() copies one into a pydantic model
+# where a route needs a snapshot (see repository.snapshot).
+# Timestamps are microseconds since the epoch, and status and plan strings
+# are interned, as there are only a handful of distinct ones.
+class UserRecord:
+    __slots__ = ("id", "email", "hashed_password", "created_at_us", "stripe_customer_id")
+
+    def __init__(self, id: str, email: str, hashed_password: str, created_at_us: int, stripe_customer_id: Optional[str] = None):
+        self.id = id
+        self.email = email
+        self.hashed_password = hashed_password
+        self.created_at_us = created_at_us
+        self.stripe_customer_id = stripe_customer_id
+
+    @property
+    def created_at(self) -> datetime:
+        return _from_epoch(self.created_at_us)
+
+    def model(self) -> User:
+        # Everything in here was validated on the way in.
+        return User.model_construct(
+            id=self.id,
+            email=self.email,
+            hashed_password=self.hashed_password,
+            created_at=self.created_at,
+            stripe_customer_id=self.stripe_customer_id,
+        )
+
+class SubscriptionRecord:
+    __slots__ = ("user_id", "stripe_subscription_id", "status", "period_end_us", "created_at_us", "plan")
+
+    def __init__(self, user_id: str, stripe_subscription_id: str, status: str, period_end_us: int, created_at_us: int, plan: str):
+        self.user_id = user_id
+        self.stripe_subscription_id = stripe_subscription_id
+        self.status = sys.intern(status)
+        self.period_end_us = period_end_us
+        self.created_at_us = created_at_us
+        self.plan = sys.intern(plan)
+
+    @property
+    def current_period_end(self) -> datetime:
+        return _from_epoch(self.period_end_us)
+
+    @property
+    def created_at(self) -> datetime:
+        return _from_epoch(self.created_at_us)
+
+    def model(self) -> Subscription:
+        return Subscription.model_construct(
+            user_id=self.user_id,
+            stripe_subscription_id=self.stripe_subscription_id,
+            status=self.status,
+            current_period_end=self.current_period_end,
+            created_at=self.created_at,
+            plan=self.plan,
+        )
+
+users_db: Dict[str, UserRecord] = {}
+subscriptions_db: Dict[str, SubscriptionRecord] = {}
 email_to_user_id: Dict[str, str] = {}
+stripe_customer_to_user_id: Dict[str, str] = {}
+stripe_subscription_to_user_id: Dict[str, str] = {}
+webhook_events_db: Dict[str, dict] = {}
+# Stripe subscription id -> (created, type order) of the newest event applied
+# to it, so a late event cannot roll a subscription back.
+subscription_event_versions: Dict[str, Tuple[int, int]] = {}
 
-def create_user(email: str, hashed_password: str) -> User:
-    user_id = str(uuid.uuid4())
-    user = User(
-        id=user_id,
-        email=email,
-        hashed_password=hashed_password,
-        created_at=datetime.utcnow()
-    )
-    users_db[user_id] = user
-    email_to_user_id[email] = user_id
+# Maintained on every write so stats and exports never scan the dicts above.
+# user_order is append-only, and deleted users leave their id behind, so a
+# position in it is a stable export cursor.
+user_order: List[str] = []
+subscription_status_counts: Dict[str, int] = {}
+# Day ordinal of current_period_end -> users whose live subscription ends then.
+expiry_index: Dict[int, Set[str]] = {}
+# Min-heap of the days in expiry_index, for walking them oldest first. Days
+# whose bucket has since emptied are dropped lazily when they surface.
+expiry_days: List[int] = []
+LIVE_STATUSES = ("active", "trialing")
+
+def create_user(email: str, hashed_password: str) -> UserRecord:
+    if email in email_to_user_id:
+        raise EmailAlreadyRegistered(email)
+    # The same email string is the record's and the index key, so it is
+    # only stored once.
+    user = UserRecord(str(uuid.uuid4()), email, hashed_password, _to_epoch(datetime.utcnow()))
+    users_db[user.id] = user
+    email_to_user_id[email] = user.id
+    user_order.append(user.id)
     return user
 
-def get_user_by_email(email: str) -> Optional[User]:
+def get_user_by_email(email: str) -> Optional[UserRecord]:
     user_id = email_to_user_id.get(email)
     if user_id:
         return users_db.get(user_id)
     return None
 
-def get_user_by_id(user_id: str) -> Optional[User]:
+def get_user_by_id(user_id: str) -> Optional[UserRecord]:
     return users_db.get(user_id)
 
 def update_user_stripe_customer(user_id: str, stripe_customer_id: str):
     if user_id in users_db:
         user = users_db[user_id]
+        previous = user.stripe_customer_id
+        if previous and stripe_customer_to_user_id.get(previous) == user_id:
+            del stripe_customer_to_user_id[previous]
         user.stripe_customer_id = stripe_customer_id
-        users_db[user_id] = user
-
-def create_subscription(user_id: str, stripe_subscription_id: str, status: str, current_period_end: datetime) -> Subscription:
-    subscription = Subscription(
-        user_id=user_id,
-        stripe_subscription_id=stripe_subscription_id,
-        status=status,
-        current_period_end=current_period_end,
-        created_at=datetime.utcnow()
+        stripe_customer_to_user_id[stripe_customer_id] = user_id
+
+def update_user_password(user_id: str, hashed_password: str):
+    if user_id in users_db:
+        users_db[user_id].hashed_password = hashed_password
+
+def delete_user(user_id: str) -> bool:
+    user = users_db.pop(user_id, None)
+    if user is None:
+        return False
+    del email_to_user_id[user.email]
+    if user.stripe_customer_id and stripe_customer_to_user_id.get(user.stripe_customer_id) == user_id:
+        del stripe_customer_to_user_id[user.stripe_customer_id]
+    subscription = subscriptions_db.pop(user_id, None)
+    if subscription:
+        _unindex_subscription(subscription)
+        if stripe_subscription_to_user_id.get(subscription.stripe_subscription_id) == user_id:
+            del stripe_subscription_to_user_id[subscription.stripe_subscription_id]
+    return True
+
+def create_subscription(user_id: str, stripe_subscription_id: str, status: str, current_period_end: datetime, plan: str = "standard") -> SubscriptionRecord:
+    subscription = SubscriptionRecord(
+        user_id, stripe_subscription_id, status, _to_epoch(current_period_end), _to_epoch(datetime.utcnow()), plan
     )
+    previous = subscriptions_db.get(user_id)
+    if previous:
+        _unindex_subscription(previous)
+        if stripe_subscription_to_user_id.get(previous.stripe_subscription_id) == user_id:
+            del stripe_subscription_to_user_id[previous.stripe_subscription_id]
     subscriptions_db[user_id] = subscription
+    _index_subscription(subscription)
+    stripe_subscription_to_user_id[stripe_subscription_id] = user_id
     return subscription
 
-def get_subscription_by_user_id(user_id: str) -> Optional[Subscription]:
+def get_subscription_by_user_id(user_id: str) -> Optional[SubscriptionRecord]:
     return subscriptions_db.get(user_id)
 
-def update_subscription(user_id: str, status: str, current_period_end: datetime):
+def update_subscription(user_id: str, status: str, current_period_end: datetime, plan: Optional[str] = None):
     if user_id in subscriptions_db:
         subscription = subscriptions_db[user_id]
-        subscription.status = status
-        subscription.current_period_end = current_period_end
-        subscriptions_db[user_id] = subscription
-
-def get_user_by_stripe_customer_id(stripe_customer_id: str) -> Optional[User]:
-    for user in users_db.values():
-        if user.stripe_customer_id == stripe_customer_id:
-            return user
+        _unindex_subscription(subscription)
+        subscription.status = sys.intern(status)
+        subscription.period_end_us = _to_epoch(current_period_end)
+        _index_subscription(subscription)
+        if plan is not None:
+            subscription.plan = sys.intern(plan)
+        stripe_subscription_to_user_id[subscription.stripe_subscription_id] = user_id
+
+def _index_subscription(subscription: SubscriptionRecord):
+    subscription_status_counts[subscription.status] = subscription_status_counts.get(subscription.status, 0) + 1
+    if subscription.status in LIVE_STATUSES:
+        day = _day(subscription.period_end_us)
+        users = expiry_index.get(day)
+        if users is None:
+            users = expiry_index[day] = set()
+            heapq.heappush(expiry_days, day)
+        users.add(subscription.user_id)
+
+def _unindex_subscription(subscription: SubscriptionRecord):
+    subscription_status_counts[subscription.status] -= 1
+    if subscription.status in LIVE_STATUSES:
+        day = _day(subscription.period_end_us)
+        users = expiry_index.get(day)
+        if users is not None:
+            users.discard(subscription.user_id)
+            if not users:
+                del expiry_index[day]
+
+def count_live_ending_between(start: datetime, end: datetime) -> int:
+    # Whole days in between are counted by set size; only the users in the
+    # two boundary days are looked at one by one.
+    start_us, end_us = _to_epoch(start), _to_epoch(end)
+    first, last = _day(start_us), _day(end_us)
+    count = 0
+    for day in range(first, last + 1):
+        users = expiry_index.get(day)
+        if not users:
+            continue
+        if first < day < last:
+            count += len(users)
+        else:
+            count += sum(1 for user_id in users if start_us <= subscriptions_db[user_id].period_end_us < end_us)
+    return count
+
+def due_subscriptions(before: datetime, limit: int) -> List[SubscriptionRecord]:
+    # Live subscriptions whose period ended before `before`, from the oldest
+    # day on; only the days that are due are ever looked at.
+    before_us = _to_epoch(before)
+    cutoff = _day(before_us)
+    visited: List[int] = []
+    due = []
+    while expiry_days and expiry_days[0] <= cutoff and len(due) < limit:
+        day = heapq.heappop(expiry_days)
+        if day not in expiry_index or day in visited:
+            continue
+        visited.append(day)
+        for user_id in expiry_index[day]:
+            subscription = subscriptions_db[user_id]
+            if subscription.period_end_us < before_us:
+                due.append(subscription)
+                if len(due) == limit:
+                    break
+    for day in visited:
+        heapq.heappush(expiry_days, day)
+    return due
+
+def account_stats(now: datetime, expiring_within_days: int) -> dict:
+    return {
+        "users": len(users_db),
+        "subscriptions": {status: count for status, count in subscription_status_counts.items() if count},
+        "expiring": count_live_ending_between(now, now + timedelta(days=expiring_within_days)),
+    }
+
+def list_accounts_page(after: Optional[str], limit: int) -> List[Tuple[str, UserRecord, Optional[SubscriptionRecord]]]:
+    start = int(after) if after else 0
+    if start < 0:
+        raise ValueError(f"Invalid cursor {after!r}")
+    rows = []
+    for position in range(start, len(user_order)):
+        user = users_db.get(user_order[position])
+        if user is None:
+            continue
+        rows.append((str(position + 1), user, subscriptions_db.get(user.id)))
+        if len(rows) == limit:
+            break
+    return rows
+
+def _owns_live_subscription(user: UserRecord) -> bool:
+    # The user's current customer owns their subscription, so a live one
+    # pins the link: moving it would orphan that customer's webhooks.
+    existing = subscriptions_db.get(user.id)
+    return user.stripe_customer_id is not None and existing is not None and existing.status in LIVE_STATUSES
+
+def link_stripe_customers(rows: List[Tuple[str, str]]) -> List[str]:
+    # rows are (email, stripe_customer_id); returns the ids of users changed.
+    # Users whose current customer owns a live subscription are left alone.
+    changed = []
+    for email, customer_id in rows:
+        user = get_user_by_email(email)
+        if user is None or user.stripe_customer_id == customer_id or _owns_live_subscription(user):
+            continue
+        update_user_stripe_customer(user.id, customer_id)
+        changed.append(user.id)
+    return changed
+
+def upsert_stripe_subscriptions(rows: List[Tuple[str, str, str, str, datetime, str]]) -> List[str]:
+    # rows are (email, customer_id, subscription_id, status,
+    # current_period_end, plan). A subscription never replaces a different,
+    # live one unless it is live itself, and a skipped row leaves the
+    # customer link alone too. Returns the ids of users changed.
+    changed = []
+    for email, customer_id, subscription_id, status, current_period_end, plan in rows:
+        user = get_user_by_email(email)
+        if user is None:
+            continue
+        existing = subscriptions_db.get(user.id)
+        same = existing is not None and existing.stripe_subscription_id == subscription_id
+        if not (same or existing is None or status in LIVE_STATUSES or existing.status not in LIVE_STATUSES):
+            continue
+        if user.stripe_customer_id != customer_id:
+            update_user_stripe_customer(user.id, customer_id)
+        if same:
+            update_subscription(user.id, status, current_period_end, plan)
+        else:
+            create_subscription(user.id, subscription_id, status, current_period_end, plan)
+        changed.append(user.id)
+    return changed
+
+def get_user_by_stripe_customer_id(stripe_customer_id: str) -> Optional[UserRecord]:
+    user_id = stripe_customer_to_user_id.get(stripe_customer_id)
+    if user_id:
+        return users_db.get(user_id)
     return None
+
+def get_user_by_stripe_subscription_id(stripe_subscription_id: str) -> Optional[UserRecord]:
+    user_id = stripe_subscription_to_user_id.get(stripe_subscription_id)
+    if user_id:
+        return users_db.get(user_id)
+    return None
+
+def record_webhook_event(event_id: str, event_type: str, payload: str) -> bool:
+    if event_id in webhook_events_db:
+        return False
+    webhook_events_db[event_id] = {
+        "type": event_type,
+        "payload": payload,
+        "received_at": datetime.utcnow(),
+        "claimed_at": datetime.utcnow(),
+        "processed_at": None
+    }
+    return True
+
+def mark_webhook_event_processed(event_id: str):
+    if event_id in webhook_events_db:
+        webhook_events_db[event_id]["processed_at"] = datetime.utcnow()
+
+def claim_pending_webhook_events(stale_before: datetime) -> List[str]:
+    # Events are kept in arrival order, so the payloads come back oldest first.
+    now = datetime.utcnow()
+    claimed = []
+    for event in webhook_events_db.values():
+        if event["processed_at"] is None and event["claimed_at"] < stale_before:
+            event["claimed_at"] = now
+            claimed.append(event["payload"])
+    return claimed
+
+def prune_webhook_events(processed_before: datetime) -> int:
+    stale = [
+        event_id for event_id, event in webhook_events_db.items()
+        if event["processed_at"] is not None and event["processed_at"] < processed_before
+    ]
+    for event_id in stale:
+        del webhook_events_db[event_id]
+    return len(stale)
+
+def claim_subscription_event(stripe_subscription_id: str, version: Tuple[int, int]) -> bool:
+    last = subscription_event_versions.get(stripe_subscription_id)
+    if last is not None and version < last:
+        return False
+    subscription_event_versions[stripe_subscription_id] = version
+    return True
+
+def check_index_consistency() -> List[str]:
+    problems = []
+    for email, user_id in email_to_user_id.items():
+        user = users_db.get(user_id)
+        if user is None or user.email != email:
+            problems.append(f"email index entry {email} -> {user_id} does not match a user")
+    for customer_id, user_id in stripe_customer_to_user_id.items():
+        user = users_db.get(user_id)
+        if user is None or user.stripe_customer_id != customer_id:
+            problems.append(f"stripe customer index entry {customer_id} -> {user_id} does not match a user")
+    for subscription_id, user_id in stripe_subscription_to_user_id.items():
+        subscription = subscriptions_db.get(user_id)
+        if subscription is None or subscription.stripe_subscription_id != subscription_id:
+            problems.append(f"stripe subscription index entry {subscription_id} -> {user_id} does not match a subscription")
+    for user_id, user in users_db.items():
+        if email_to_user_id.get(user.email) != user_id:
+            problems.append(f"user {user_id} is missing from the email index")
+        if user.stripe_customer_id and stripe_customer_to_user_id.get(user.stripe_customer_id) != user_id:
+            problems.append(f"user {user_id} is missing from the stripe customer index")
+    for user_id, subscription in subscriptions_db.items():
+        if stripe_subscription_to_user_id.get(subscription.stripe_subscription_id) != user_id:
+            problems.append(f"subscription for user {user_id} is missing from the stripe subscription index")
+        if subscription.status in LIVE_STATUSES and user_id not in expiry_index.get(_day(subscription.period_end_us), ()):
+            problems.append(f"subscription for user {user_id} is missing from the expiry index")
+    ordered = sum(1 for user_id in user_order if user_id in users_db)
+    if ordered != len(users_db):
+        problems.append(f"user order has {ordered} entries for {len(users_db)} users")
+    status_counts: Dict[str, int] = {}
+    for subscription in subscriptions_db.values():
+        status_counts[subscription.status] = status_counts.get(subscription.status, 0) + 1
+    for status in set(status_counts) | set(subscription_status_counts):
+        if status_counts.get(status, 0) != subscription_status_counts.get(status, 0):
+            problems.append(f"{status} subscription count is {subscription_status_counts.get(status, 0)}, expected {status_counts.get(status, 0)}")
+    return problems
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, asdict
+from types import FrameType
+from typing import Deque, Dict, List, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def collapsed_stack(frame: Optional[FrameType]) -> str:
+    # Root first, frames joined by ';': the "folded" format read by
+    # flamegraph.pl, speedscope and inferno.
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def readable_stack(frame: Optional[FrameType]) -> List[str]:
+    lines = []
+    while frame is not None:
+        lines.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return lines[::-1]
+
+
+@dataclass
+class StallReport:
+    started_at: float
+    duration_seconds: float
+    stack: List[str]
+
+
+@dataclass
+class StallStats:
+    stalls: int = 0
+    captured: int = 0
+    max_stall_seconds: float = 0.0
+    total_stall_seconds: float = 0.0
+
+
+class StallDetector:
+    # The loop stamps a heartbeat every threshold/4; a watchdog thread that
+    # finds the stamp too old grabs the loop thread's stack while the
+    # blocking call is still on it.
+    def __init__(self, threshold: float, max_reports: int = 50):
+        self.threshold = threshold
+        self.beat_interval = threshold / 4
+        self.stats = StallStats()
+        self.reports: Deque[StallReport] = deque(maxlen=max_reports)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_beat = 0.0
+        self._current: Optional[StallReport] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def _beat(self):
+        now = time.monotonic()
+        late = now - self._last_beat - self.beat_interval
+        self._last_beat = now
+        if late > self.threshold:
+            self.stats.stalls += 1
+            self.stats.total_stall_seconds += late
+            self.stats.max_stall_seconds = max(self.stats.max_stall_seconds, late)
+        with self._lock:
+            if self._current is not None:
+                self._current.duration_seconds = late
+                self._current = None
+        self._handle = self._loop.call_later(self.beat_interval, self._beat)
+
+    def _watch(self):
+        while not self._stop.wait(self.beat_interval):
+            blocked = time.monotonic() - self._last_beat - self.beat_interval
+            if blocked <= self.threshold:
+                continue
+            with self._lock:
+                if self._current is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread)
+                report = StallReport(time.time() - blocked, blocked, readable_stack(frame))
+                self._current = report
+                self.reports.append(report)
+                self.stats.captured += 1
+            logger.warning(
+                "Event loop blocked for over %.0f ms in %s",
+                blocked * 1000, report.stack[-1] if report.stack else "?",
+                extra={"stack": report.stack},
+            )
+
+    def start(self):
+        if not self.enabled or self._watchdog is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._handle = self._loop.call_later(self.beat_interval, self._beat)
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        if self._watchdog is None:
+            return
+        self._stop.set()
+        self._handle.cancel()
+        self._watchdog.join(timeout=1)
+        self._watchdog = None
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        return [asdict(report) for report in list(self.reports)[-limit:][::-1]]
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        data["threshold_seconds"] = self.threshold
+        return data
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    # Costs nothing until someone asks for a profile, and needs no restart.
+    def __init__(self):
+        self.profiles = 0
+        self._busy = False
+
+    async def profile(self, seconds: float, interval: float) -> Dict[str, int]:
+        # Profiles the thread running the event loop, for wall-clock time, so
+        # blocking calls show up next to CPU work (idle time lands in the
+        # selector's select()).
+        if self._busy:
+            raise ProfilerBusy("A profile is already being recorded")
+        self._busy = True
+        self.profiles += 1
+        try:
+            if threading.current_thread() is threading.main_thread() and hasattr(signal, "setitimer"):
+                return await self._profile_with_timer(seconds, interval)
+            return await asyncio.to_thread(self._profile_from_thread, seconds, interval, threading.get_ident())
+        finally:
+            self._busy = False
+
+    async def _profile_with_timer(self, seconds: float, interval: float) -> Dict[str, int]:
+        # SIGALRM handlers run on the main thread between bytecodes, so each
+        # sample is whatever the loop was doing when the timer fired.
+        stacks: Counter = Counter()
+
+        def sample(signum, frame):
+            stacks[collapsed_stack(frame)] += 1
+
+        previous = signal.signal(signal.SIGALRM, sample)
+        signal.setitimer(signal.ITIMER_REAL, interval, interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        return stacks
+
+    def _profile_from_thread(self, seconds: float, interval: float, thread_id: int) -> Dict[str, int]:
+        # Used when the loop is not on the main thread (e.g. under a test
+        # client). Samples are biased toward points where the loop releases
+        # the GIL, such as select(), so treat this as a coarse view.
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stacks[collapsed_stack(frame)] += 1
+            time.sleep(interval)
+        return stacks
+
+
+def render_collapsed(stacks: Dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+stall_detector = StallDetector(get_settings().loop_stall_threshold_ms / 1000)
+profiler = SamplingProfiler()
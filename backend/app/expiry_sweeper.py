@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from app.clients import stripe_api
+from app.metrics import timed
+from app.models import Subscription
+from app.webhooks import _current_period_end, _plan, _stripe_time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SweepStats:
+    ticks: int = 0
+    processed: int = 0
+    renewed: int = 0
+    ended: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    last_tick_processed: int = 0
+    last_tick_seconds: float = 0.0
+
+
+class ExpirySweeper:
+    # Webhooks keep subscriptions current; this catches the ones whose
+    # period ended without an event reaching us. Each tick asks the
+    # repository's current_period_end index for what is due, so the cost is
+    # proportional to the overdue subscriptions, not to all of them.
+    def __init__(
+        self,
+        repository,
+        interval: float = 300.0,
+        grace: float = 3600.0,
+        batch_size: int = 100,
+        max_per_tick: int = 1000,
+        concurrency: int = 4,
+        recheck_after: float = 3600.0,
+        on_user_changed: Optional[Callable[[str], None]] = None,
+    ):
+        self.repository = repository
+        self.interval = interval
+        # Stripe renews at the period end and the webhook follows shortly
+        # after; the grace period keeps us out of that race.
+        self.grace = timedelta(seconds=grace)
+        self.batch_size = batch_size
+        self.max_per_tick = max_per_tick
+        self.recheck_after = recheck_after
+        self.on_user_changed = on_user_changed
+        self.stats = SweepStats()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Subscriptions Stripe still reports as live with the old period end
+        # (e.g. a renewal payment being retried), and when to ask again.
+        self._deferred: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _retrieve(self, subscription_id: str) -> Optional[dict]:
+        stripe = stripe_api()
+        async with self._semaphore:
+            try:
+                with timed("stripe", "subscription.retrieve"):
+                    return await asyncio.to_thread(stripe.Subscription.retrieve, subscription_id)
+            except stripe.InvalidRequestError as e:
+                if e.http_status == 404:
+                    return None
+                raise
+
+    async def _reconcile(self, subscription: Subscription, before: datetime):
+        # Keep what we knew before asking Stripe.
+        previous_status, previous_end = subscription.status, subscription.current_period_end
+        try:
+            remote = await self._retrieve(subscription.stripe_subscription_id)
+            if remote is None:
+                status, period_end, plan = "canceled", previous_end, None
+            else:
+                end = _current_period_end(remote)
+                status = remote["status"]
+                period_end = _stripe_time(end) if end else previous_end
+                plan = _plan(remote)
+            await self.repository.update_subscription(subscription.user_id, status, period_end, plan)
+        except Exception as e:
+            self.stats.errors += 1
+            self._deferred[subscription.user_id] = time.monotonic() + self.recheck_after
+            logger.warning("Could not reconcile subscription %s: %s", subscription.stripe_subscription_id, e)
+            return
+        self.stats.processed += 1
+        if status in ("active", "trialing") and period_end < before:
+            # Still due, whether or not the period end moved; without this it
+            # would be fetched again by the next batch and every later tick.
+            self._deferred[subscription.user_id] = time.monotonic() + self.recheck_after
+        if status == previous_status and period_end == previous_end:
+            self.stats.unchanged += 1
+            return
+        if period_end > previous_end and status in ("active", "trialing"):
+            self.stats.renewed += 1
+        else:
+            self.stats.ended += 1
+        if self.on_user_changed is not None:
+            self.on_user_changed(subscription.user_id)
+        logger.info(
+            "Reconciled subscription %s for user %s: %s until %s",
+            subscription.stripe_subscription_id, subscription.user_id, status, period_end.isoformat(),
+        )
+
+    async def sweep_once(self) -> int:
+        # Processes due subscriptions batch by batch, each batch with at most
+        # `concurrency` Stripe calls in flight, and returns how many it did.
+        started = time.perf_counter()
+        now = time.monotonic()
+        self._deferred = {user_id: at for user_id, at in self._deferred.items() if at > now}
+        before = datetime.utcnow() - self.grace
+        processed = 0
+        while processed < self.max_per_tick:
+            # Deferred subscriptions are still due, so over-fetch by as many.
+            due = await self.repository.due_subscriptions(before, self.batch_size + len(self._deferred))
+            batch = [subscription for subscription in due if subscription.user_id not in self._deferred]
+            batch = batch[:min(self.batch_size, self.max_per_tick - processed)]
+            if not batch:
+                break
+            await asyncio.gather(*[self._reconcile(subscription, before) for subscription in batch])
+            processed += len(batch)
+        self.stats.ticks += 1
+        self.stats.last_tick_processed = processed
+        self.stats.last_tick_seconds = time.perf_counter() - started
+        if processed:
+            logger.info("Expiry sweep processed %d subscriptions in %.2f s", processed, self.stats.last_tick_seconds)
+        return processed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                logger.error("Expiry sweep failed: %s", e, exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        data["deferred"] = len(self._deferred)
+        return data
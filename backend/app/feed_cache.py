@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, List, Optional
+
+from app.models import Article
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FeedResponse:
+    entries: list = field(default_factory=list)
+    etag: Optional[str] = None
+    modified: Optional[str] = None
+    not_modified: bool = False
+    bytes: int = 0
+    parse_seconds: float = 0.0
+
+
+# A fetcher receives the validators from the previous response and returns the
+# new entries, or a response with not_modified=True when upstream answered 304.
+FeedFetcher = Callable[[Optional[str], Optional[str]], Awaitable[FeedResponse]]
+
+
+@dataclass
+class FeedCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale_hits: int = 0
+    refreshes: int = 0
+    not_modified: int = 0
+    errors: int = 0
+    consecutive_errors: int = 0
+    bytes_fetched: int = 0
+    last_refresh_seconds: float = 0.0
+    total_refresh_seconds: float = 0.0
+    last_parse_seconds: float = 0.0
+    total_parse_seconds: float = 0.0
+    last_refreshed_at: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        attempts = self.refreshes + self.not_modified + self.errors
+        data["avg_refresh_seconds"] = self.total_refresh_seconds / attempts if attempts else 0.0
+        return data
+
+
+class FeedCache:
+    def __init__(
+        self,
+        fetcher: FeedFetcher,
+        parse: Callable[[list], List[Article]],
+        refresh_interval: float = 300.0,
+        max_age: Optional[float] = None,
+        name: str = "FCA feed",
+        max_backoff: float = 3600.0,
+    ):
+        self.fetcher = fetcher
+        self.parse = parse
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age if max_age is not None else refresh_interval * 2
+        self.max_backoff = max(max_backoff, refresh_interval)
+        self.stats = FeedCacheStats()
+        self._articles: Optional[List[Article]] = None
+        self._fetched_at = 0.0
+        self._etag: Optional[str] = None
+        self._modified: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._revalidation: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[List[Article]], Awaitable[None]]] = []
+
+    def add_listener(self, listener: Callable[[List[Article]], Awaitable[None]]):
+        self._listeners.append(listener)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at > self.max_age
+
+    async def get_articles(self) -> List[Article]:
+        if self._articles is None:
+            self.stats.misses += 1
+            await self.refresh(only_if_empty=True)
+            return list(self._articles or [])
+
+        self.stats.hits += 1
+        if self.is_stale():
+            self.stats.stale_hits += 1
+            self._revalidate_in_background()
+        return list(self._articles)
+
+    async def refresh(self, only_if_empty: bool = False) -> bool:
+        async with self._lock:
+            if only_if_empty and self._articles is not None:
+                # Cold-cache callers queue on the lock; the first one fetched
+                # for everyone behind it.
+                return False
+            started = time.perf_counter()
+            try:
+                response = await self.fetcher(self._etag, self._modified)
+            except Exception as e:
+                self.stats.errors += 1
+                self.stats.consecutive_errors += 1
+                logger.error("%s refresh failed: %s", self.name, e)
+                if self._articles is None:
+                    self._articles = []
+                return False
+            finally:
+                elapsed = time.perf_counter() - started
+                self.stats.last_refresh_seconds = elapsed
+                self.stats.total_refresh_seconds += elapsed
+
+            self._fetched_at = time.monotonic()
+            self.stats.consecutive_errors = 0
+            self.stats.last_refreshed_at = time.time()
+            self.stats.bytes_fetched += response.bytes
+            self.stats.last_parse_seconds = response.parse_seconds
+            self.stats.total_parse_seconds += response.parse_seconds
+            self._etag = response.etag
+            self._modified = response.modified
+
+            if response.not_modified and self._articles is not None:
+                self.stats.not_modified += 1
+                return False
+
+            self._articles = self.parse(response.entries)
+            self.stats.refreshes += 1
+            articles = list(self._articles)
+
+        for listener in self._listeners:
+            try:
+                await listener(articles)
+            except Exception as e:
+                logger.error("Feed refresh listener %r failed: %s", listener, e, exc_info=True)
+        return True
+
+    def _revalidate_in_background(self):
+        if self._revalidation is None or self._revalidation.done():
+            self._revalidation = asyncio.create_task(self.refresh())
+
+    def next_delay(self) -> float:
+        # A failing source is polled exponentially less often, with jitter so
+        # sources that broke together do not retry in lockstep.
+        failures = self.stats.consecutive_errors
+        if not failures:
+            return self.refresh_interval
+        delay = min(self.max_backoff, self.refresh_interval * 2 ** min(failures, 16))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.next_delay())
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._revalidation):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._revalidation = None
@@ -0,0 +1,35 @@
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.config import get_settings
+
+FCA_FEED_URL = get_settings().fca_feed_url
+FCA_FEED_REFRESH_SECONDS = get_settings().fca_feed_refresh_seconds
+
+
+@dataclass(frozen=True)
+class FeedSource:
+    # name doubles as the source tag stored on every Article from this feed.
+    name: str
+    url: str
+    interval: float = 300.0
+    max_items: int = 20
+
+
+def default_sources() -> List[FeedSource]:
+    return [FeedSource("FCA", FCA_FEED_URL, FCA_FEED_REFRESH_SECONDS)]
+
+
+def load_sources(path: Optional[str] = None) -> List[FeedSource]:
+    # The registry is a JSON list of {"name", "url", "interval", "max_items"}
+    # objects; without one only the FCA feed is ingested, as before.
+    if not path:
+        return default_sources()
+    with open(path) as f:
+        entries = json.load(f)
+    sources = [FeedSource(**entry) for entry in entries]
+    names = [source.name for source in sources]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate feed source names in {path}")
+    return sources
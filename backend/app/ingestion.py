@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+from app.article_archive import article_id
+from app.feed_cache import FeedCache, FeedFetcher, FeedResponse
+from app.feed_registry import FeedSource
+from app.metrics import timed
+from app.models import Article
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = ("utm_", "mc_", "fbclid", "gclid")
+
+
+def canonical_link(link: str) -> str:
+    # Regulators cross-post the same notice (the PRA's items also appear in
+    # Bank of England feeds), often with different schemes, hosts or
+    # tracking parameters; those variants share one canonical form.
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+def entry_to_article(entry: dict, source: str) -> Article:
+    published_parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    return Article(
+        id=article_id(entry.get("id") or entry.get("link", "")),
+        title=entry.get("title", ""),
+        link=entry.get("link", ""),
+        published=entry.get("published", entry.get("updated", "")),
+        published_at=datetime(*published_parsed[:6], tzinfo=timezone.utc) if published_parsed else datetime.now(timezone.utc),
+        summary=entry.get("summary", ""),
+        full_content=entry.get("description", entry.get("summary", "")),
+        source=source,
+    )
+
+
+def load_parser() -> str:
+    # feedparser is imported where it is used, which is mostly in the parse
+    # workers; the API process itself never needs it with workers enabled.
+    import feedparser
+
+    return feedparser.__version__
+
+
+def parse_feed(source: str, body: bytes, max_items: int) -> List[Article]:
+    # Runs in a worker process: feedparser is pure Python and takes long
+    # enough on large feeds to stall every request on the event loop.
+    import feedparser
+
+    feed = feedparser.parse(body)
+    if feed.get("bozo") and not feed.entries:
+        # bozo_exception is not always picklable, so only its text crosses
+        # back to the parent process.
+        raise ValueError(f"Could not parse {source} feed: {feed.get('bozo_exception')}")
+    return [entry_to_article(entry, source) for entry in feed.entries[:max_items]]
+
+
+def timed_parse_feed(source: str, body: bytes, max_items: int) -> Tuple[List[Article], float]:
+    # Timed inside the worker so the metric excludes time queued for the pool.
+    started = time.perf_counter()
+    articles = parse_feed(source, body, max_items)
+    return articles, time.perf_counter() - started
+
+
+def is_local(url: str) -> bool:
+    return "://" not in url or url.startswith("file://")
+
+
+@dataclass
+class IngestionStats:
+    fetches: int = 0
+    not_modified: int = 0
+    articles: int = 0
+    duplicates: int = 0
+    parse_failures: int = 0
+    pool_restarts: int = 0
+
+
+class IngestionEngine:
+    def __init__(
+        self,
+        sources: List[FeedSource],
+        max_per_host: int = 2,
+        max_connections: int = 20,
+        parse_workers: int = 2,
+        timeout: float = 20.0,
+        user_agent: str = "ComplyEase feed ingester",
+        max_backoff: float = 3600.0,
+    ):
+        self.sources = sources
+        self.max_per_host = max_per_host
+        self.max_connections = max_connections
+        self.parse_workers = parse_workers
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.stats = IngestionStats()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        # Canonical link -> the source that first published it.
+        self._seen: Dict[str, Optional[str]] = {}
+        self._listeners: List[Callable[[List[Article]], Awaitable[None]]] = []
+        self.caches: Dict[str, FeedCache] = {}
+        for source in sources:
+            cache = FeedCache(
+                fetcher=self._fetcher(source),
+                parse=list,
+                refresh_interval=source.interval,
+                name=f"{source.name} feed",
+                max_backoff=max_backoff,
+            )
+            cache.add_listener(self._on_refresh)
+            self.caches[source.name] = cache
+
+    def add_listener(self, listener: Callable[[List[Article]], Awaitable[None]]):
+        self._listeners.append(listener)
+
+    def remember(self, articles: Iterable[Article]):
+        # Seeded from the archive so a restart keeps deduplicating against
+        # articles ingested earlier.
+        for article in articles:
+            self._seen.setdefault(canonical_link(article.link), article.source)
+
+    def _unique(self, articles: List[Article], count: bool = False) -> List[Article]:
+        # An item belongs to the first source that published it; the same
+        # notice from any other feed is a duplicate.
+        unique, emitted = [], set()
+        for article in articles:
+            key = canonical_link(article.link)
+            owner = self._seen.setdefault(key, article.source)
+            if owner is None:
+                # Archived before articles carried a source tag.
+                owner = self._seen[key] = article.source
+            if owner == article.source and key not in emitted:
+                emitted.add(key)
+                unique.append(article)
+            elif count:
+                self.stats.duplicates += 1
+        return unique
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": self.user_agent},
+                limits=httpx.Limits(max_connections=self.max_connections),
+            )
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = "" if is_local(url) else urlsplit(url).netloc.lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slot
+
+    async def _download(self, source: FeedSource, etag: Optional[str], modified: Optional[str]) -> Optional[httpx.Response]:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if modified:
+            headers["If-Modified-Since"] = modified
+        # Several sources usually live on one host (the Bank of England
+        # publishes a feed per topic); the per-host cap keeps us polite.
+        async with self._host_slot(source.url):
+            with timed("feed", "fetch"):
+                response = await self._http().get(source.url, headers=headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return response
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn rather than fork: the server process already runs threads
+            # (password hashing, to_thread) that a fork would copy mid-flight.
+            self._pool = ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def _parse(self, source: FeedSource, body: bytes) -> Tuple[List[Article], float]:
+        if not self.parse_workers:
+            return await asyncio.to_thread(timed_parse_feed, source.name, body, source.max_items)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor(), timed_parse_feed, source.name, body, source.max_items
+            )
+        except BrokenProcessPool:
+            self.stats.pool_restarts += 1
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            raise
+
+    def _fetcher(self, source: FeedSource) -> FeedFetcher:
+        async def fetch(etag: Optional[str], modified: Optional[str]) -> FeedResponse:
+            self.stats.fetches += 1
+            if is_local(source.url):
+                body = await asyncio.to_thread(Path(source.url.removeprefix("file://")).read_bytes)
+                etag = modified = None
+            else:
+                response = await self._download(source, etag, modified)
+                if response is None:
+                    self.stats.not_modified += 1
+                    return FeedResponse(etag=etag, modified=modified, not_modified=True)
+                body = response.content
+                etag = response.headers.get("etag")
+                modified = response.headers.get("last-modified")
+            try:
+                articles, parse_seconds = await self._parse(source, body)
+            except Exception:
+                self.stats.parse_failures += 1
+                raise
+            return FeedResponse(
+                entries=articles,
+                etag=etag,
+                modified=modified,
+                bytes=len(body),
+                parse_seconds=parse_seconds,
+            )
+        return fetch
+
+    async def _on_refresh(self, articles: List[Article]):
+        fresh = self._unique(articles, count=True)
+        self.stats.articles += len(fresh)
+        for listener in self._listeners:
+            try:
+                await listener(fresh)
+            except Exception as e:
+                logger.error("Ingestion listener %r failed: %s", listener, e, exc_info=True)
+
+    async def get_articles(self) -> List[Article]:
+        # Sources that have never been fetched are fetched concurrently; the
+        # rest are served from their caches (revalidated in the background).
+        batches = await asyncio.gather(*(cache.get_articles() for cache in self.caches.values()))
+        return self._unique([article for batch in batches for article in batch])
+
+    def start(self):
+        if self.parse_workers:
+            self._executor().submit(load_parser)
+        for cache in self.caches.values():
+            cache.start()
+
+    async def stop(self):
+        await asyncio.gather(*(cache.stop() for cache in self.caches.values()))
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.shutdown, wait=True, cancel_futures=True)
+            self._pool = None
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        data["parse_workers"] = self.parse_workers
+        data["sources"] = {name: cache.stats.as_dict() for name, cache in self.caches.items()}
+        return data
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from app.metrics import timed
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryBudget:
+    # Every request deposits `ratio` tokens and every retry withdraws one, so
+    # retries can never add more than `ratio` extra load on a degraded provider.
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 3.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probing:
+                logger.warning("LLM circuit opened after %d consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self):
+        # The probe ended without a verdict on the provider (cancelled, or an
+        # error about the request itself), so let the next call probe instead.
+        self._probing = False
+
+
+@dataclass
+class GatewayStats:
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    rejected_open_circuit: int = 0
+    retry_budget_exhausted: int = 0
+    in_flight: int = 0
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai  # already loaded by the client that raised
+
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        client_factory: Callable[[], "openai.AsyncOpenAI"],
+        max_concurrency: int = 16,
+        per_user_concurrency: int = 2,
+        timeout: float = 20.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        retry_budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        # Called on each request rather than up front, so the OpenAI SDK is
+        # only imported once something needs it.
+        self.client_factory = client_factory
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.per_user_concurrency = per_user_concurrency
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = GatewayStats()
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._per_user: Dict[str, asyncio.Semaphore] = {}
+        self._per_user_waiters: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def _user_slot(self, user_id: Optional[str]):
+        if user_id is None:
+            yield
+            return
+        semaphore = self._per_user.get(user_id)
+        if semaphore is None:
+            semaphore = self._per_user[user_id] = asyncio.Semaphore(self.per_user_concurrency)
+        self._per_user_waiters[user_id] = self._per_user_waiters.get(user_id, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._per_user_waiters[user_id] -= 1
+            if not self._per_user_waiters[user_id]:
+                del self._per_user_waiters[user_id]
+                del self._per_user[user_id]
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+        # Both concurrency slots are held while sleeping, so a long
+        # Retry-After is cut short rather than starving other callers.
+        return min(self.backoff_max, max(0.0, delay))
+
+    async def chat_completion(self, user_id: Optional[str] = None, **kwargs):
+        probing = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            self.stats.rejected_open_circuit += 1
+            raise CircuitOpenError("LLM provider is degraded; try again shortly")
+
+        self.stats.requests += 1
+        self.retry_budget.deposit()
+        try:
+            return await self._call(user_id, kwargs)
+        finally:
+            if probing:
+                self.breaker.release_probe()
+
+    async def _call(self, user_id: Optional[str], kwargs: dict):
+        async with self._user_slot(user_id), self._global:
+            attempt = 0
+            while True:
+                self.stats.in_flight += 1
+                try:
+                    with timed("openai", "chat.completions.create"):
+                        response = await asyncio.wait_for(
+                            self.client_factory().chat.completions.create(**kwargs), self.timeout
+                        )
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats.timeouts += 1
+                    if not _is_retryable(e):
+                        # The provider answered, so this says nothing about
+                        # its health either way.
+                        self.stats.failures += 1
+                        raise
+                    attempt += 1
+                    if attempt >= self.max_attempts or not self.retry_budget.withdraw():
+                        if attempt < self.max_attempts:
+                            self.stats.retry_budget_exhausted += 1
+                        self.stats.failures += 1
+                        self.breaker.record_failure()
+                        raise
+                    self.stats.retries += 1
+                    delay = self._backoff(attempt, e)
+                    logger.info("Retrying LLM call in %.2fs after %s", delay, type(e).__name__)
+                    await asyncio.sleep(delay)
+                    continue
+                finally:
+                    self.stats.in_flight -= 1
+
+                self.stats.successes += 1
+                self.breaker.record_success()
+                return response
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        data["circuit_state"] = self.breaker.state
+        data["retry_budget_tokens"] = round(self.retry_budget.tokens, 2)
+        return data
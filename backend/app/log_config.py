@@ -0,0 +1,91 @@
+import atexit
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.config import get_settings
+from app.tracing import current_trace_id
+
+# Attributes every LogRecord has; anything else came in through extra= and
+# is emitted as a structured field.
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            data["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    # The stock QueueHandler formats the message in the logging thread so the
+    # record can be pickled; ours never leaves the process, so %-formatting
+    # and JSON encoding are left to the listener thread. Log arguments are
+    # therefore read late: pass values, not objects about to be mutated.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.trace_id = current_trace_id()
+        return record
+
+
+_listener: Optional[QueueListener] = None
+_previous: Optional[tuple] = None
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> QueueListener:
+    # Changes process-wide logging state, so it is called when the app or a
+    # CLI starts, never on import; shutdown_logging() puts it back.
+    global _listener, _previous
+    if _listener is not None:
+        return _listener
+    settings = get_settings()
+    level = (level or settings.log_level).upper()
+    fmt = fmt or settings.log_format
+    root = logging.getLogger()
+    _previous = (
+        logging._srcfile, logging.logThreads, logging.logProcesses, logging.logMultiprocessing,
+        root.handlers[:], root.level,
+    )
+    # Nothing we emit uses the caller's file/line or the thread and process
+    # names, and looking them up is most of the cost of creating a record.
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root.handlers[:] = [DeferredQueueHandler(records)]
+    root.setLevel(level)
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    # Flushes the queued records and restores what configure_logging changed.
+    global _listener, _previous
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger()
+    (logging._srcfile, logging.logThreads, logging.logProcesses, logging.logMultiprocessing,
+     root.handlers[:], level) = _previous
+    root.setLevel(level)
+    _previous = None
@@ -1,47 +1,139 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List
-import stripe
-import os
-from dotenv import load_dotenv
+from typing import List, Optional
+import asyncio
+import json
 import logging
 
-from app.models import UserCreate, UserLogin, Token, Article
+from app.account_export import export_accounts
+from app.clients import stripe_api, warm_up
+from app.config import get_settings
+from app.diagnostics import ProfilerBusy, profiler, render_collapsed, stall_detector
+from app.log_config import configure_logging, shutdown_logging
+from app.metrics import RequestMetricsMiddleware, LoopLagMonitor, metrics_registry, tracer
+from app.models import UserCreate, UserLogin, Token, Article, Principal
+from app.summary_store import summary_key
+from app.llm_gateway import CircuitOpenError
 from app.auth import (
-    get_password_hash,
-    verify_password,
+    password_needs_rehash,
     create_access_token,
-    get_current_user_email,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from app.database import (
-    create_user,
-    get_user_by_email,
-    get_user_by_id,
-    update_user_stripe_customer,
-    create_subscription,
-    get_subscription_by_user_id,
-    update_subscription,
-    get_user_by_stripe_customer_id,
-    email_to_user_id
+from app.repository import EmailAlreadyRegistered, repository
+from app.principal import (
+    principal_cache,
+    load_principal,
+    get_current_principal,
+    require_active_subscription,
+    require_active_stream_subscription,
+    require_admin,
+    require_metrics_access
 )
+from app.webhooks import WebhookQueue
+from app.expiry_sweeper import ExpirySweeper
+from app.stripe_backfill import StripeBackfill, create_backfill
+from app.password_pool import password_pool
+from app.rate_limit import rate_limiter, limit_by_ip, limit_by_plan
 from app.services import (
-    fetch_fca_news,
-    summarize_article,
+    fetch_news,
+    news_ingestion,
+    article_archive,
+    news_response_cache,
+    news_broadcaster,
+    article_list,
+    search_index,
+    rebuild_search_index,
+    summary_ready,
+    generate_summary,
+    summary_store,
+    llm_gateway,
+    presummarizer,
     create_stripe_checkout_session,
     create_stripe_portal_session
 )
 
-load_dotenv()
+settings = get_settings()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+summary_rate_limit = limit_by_plan("summary")
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    loop_lag_monitor.start()
+    stall_detector.start()
+    await repository.open()
+    webhook_queue.start()
+    await webhook_queue.recover()
+    expiry_sweeper.start()
+    if settings.stripe_backfill_on_startup:
+        # The in-memory store starts empty; rebuild it from Stripe.
+        start_stripe_backfill()
+    rebuild_search_index()
+    presummarizer.start()
+    news_ingestion.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    news_broadcaster.close()
+    await news_ingestion.stop()
+    await presummarizer.stop()
+    await search_index.flush()
+    search_index.close()
+    if stripe_backfill_task is not None:
+        stripe_backfill_task.cancel()
+    await expiry_sweeper.stop()
+    await webhook_queue.stop()
+    await repository.close()
+    password_pool.shutdown()
+    await loop_lag_monitor.stop()
+    stall_detector.stop()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+STRIPE_WEBHOOK_SECRET = settings.stripe_webhook_secret
+STREAM_HEARTBEAT_SECONDS = settings.stream_heartbeat_seconds
+
+loop_lag_monitor = LoopLagMonitor(settings.loop_lag_interval_seconds)
+
+webhook_queue = WebhookQueue(
+    repository,
+    workers=settings.webhook_workers,
+    claim_timeout=settings.webhook_claim_timeout_seconds,
+    dedup_window=settings.webhook_dedup_window_seconds,
+    on_user_changed=principal_cache.invalidate_user
+)
+
+expiry_sweeper = ExpirySweeper(
+    repository,
+    interval=settings.expiry_sweep_interval_seconds,
+    grace=settings.expiry_sweep_grace_seconds,
+    batch_size=settings.expiry_sweep_batch_size,
+    max_per_tick=settings.expiry_sweep_max_per_tick,
+    concurrency=settings.expiry_sweep_concurrency,
+    on_user_changed=principal_cache.invalidate_user
+)
+
+stripe_backfill: Optional[StripeBackfill] = None
+stripe_backfill_task: Optional[asyncio.Task] = None
+
+async def run_stripe_backfill(backfill: StripeBackfill):
+    try:
+        await backfill.run()
+    except Exception:
+        # Also kept in progress()["error"] for the admin endpoint.
+        logger.exception("Stripe backfill failed")
+
+def start_stripe_backfill() -> StripeBackfill:
+    global stripe_backfill, stripe_backfill_task
+    stripe_backfill = create_backfill(repository, on_user_changed=principal_cache.invalidate_user)
+    stripe_backfill_task = asyncio.create_task(run_stripe_backfill(stripe_backfill))
+    return stripe_backfill
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,22 +142,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
 
-@app.post("/api/auth/register", response_model=Token)
+@app.post("/api/auth/register", response_model=Token, dependencies=[Depends(limit_by_ip("register"))])
 async def register(user: UserCreate):
-    existing_user = get_user_by_email(user.email)
+    existing_user = await repository.get_user_by_email(user.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
-    new_user = create_user(user.email, hashed_password)
+    hashed_password = await password_pool.hash(user.password)
+    try:
+        new_user = await repository.create_user(user.email, hashed_password)
+    except EmailAlreadyRegistered:
+        # Another registration for the same address won while this one
+        # was hashing.
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -74,16 +175,23 @@ async def register(user: UserCreate):
     
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.post("/api/auth/login", response_model=Token)
+@app.post("/api/auth/login", response_model=Token, dependencies=[Depends(limit_by_ip("login_ip"))])
 async def login(user: UserLogin):
-    db_user = get_user_by_email(user.email)
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    # Per account as well as per address, so guessing one password from
+    # many addresses is throttled before it reaches bcrypt.
+    await rate_limiter.hit("login_account", user.email.lower())
+    db_user = await repository.get_user_by_email(user.email)
+    if not db_user or not await password_pool.verify(user.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if password_needs_rehash(db_user.hashed_password):
+        await repository.update_user_password(db_user.id, await password_pool.hash(user.password))
+        principal_cache.invalidate_user(db_user.id)
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": db_user.email}, expires_delta=access_token_expires
@@ -92,17 +200,14 @@ async def login(user: UserLogin):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/api/auth/me")
-async def get_current_user(email: str = Depends(get_current_user_email)):
-    user = get_user_by_email(email)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    subscription = get_subscription_by_user_id(user.id)
+async def get_current_user(principal: Principal = Depends(get_current_principal)):
+    user = principal.user
+    subscription = principal.subscription
     
     return {
         "email": user.email,
         "id": user.id,
-        "has_subscription": subscription is not None and subscription.status == "active",
+        "has_subscription": principal.has_active_subscription,
         "subscription": {
             "status": subscription.status if subscription else None,
             "current_period_end": subscription.current_period_end.isoformat() if subscription else None
@@ -110,13 +215,12 @@ async def get_current_user(email: str = Depends(get_current_user_email)):
     }
 
 @app.post("/api/stripe/create-checkout-session")
-async def create_checkout_session(email: str = Depends(get_current_user_email)):
-    user = get_user_by_email(email)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def create_checkout_session(principal: Principal = Depends(get_current_principal)):
+    user = principal.user
     
     try:
-        session = create_stripe_checkout_session(
+        session = await asyncio.to_thread(
+            create_stripe_checkout_session,
             customer_email=user.email,
             customer_id=user.stripe_customer_id
         )
@@ -125,13 +229,13 @@ async def create_checkout_session(email: str = Depends(get_current_user_email)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/stripe/create-portal-session")
-async def create_portal_session(email: str = Depends(get_current_user_email)):
-    user = get_user_by_email(email)
-    if not user or not user.stripe_customer_id:
+async def create_portal_session(principal: Principal = Depends(get_current_principal)):
+    user = principal.user
+    if not user.stripe_customer_id:
         raise HTTPException(status_code=400, detail="No Stripe customer found")
     
     try:
-        session = create_stripe_portal_session(user.stripe_customer_id)
+        session = await asyncio.to_thread(create_stripe_portal_session, user.stripe_customer_id)
         return {"url": session.url}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -142,205 +246,213 @@ async def stripe_webhook(request: Request):
     sig_header = request.headers.get("stripe-signature")
     
     try:
-        event = stripe.Webhook.construct_event(
+        event = stripe_api().Webhook.construct_event(
             payload, sig_header, STRIPE_WEBHOOK_SECRET
         )
     except ValueError as e:
-        logger.error(f"Invalid webhook payload: {e}")
+        logger.error("Invalid webhook payload: %s", e)
         raise HTTPException(status_code=400, detail="Invalid payload")
     except Exception as e:
         if "signature" in str(e).lower():
-            logger.error(f"Invalid webhook signature: {e}")
+            logger.error("Invalid webhook signature: %s", e)
             raise HTTPException(status_code=400, detail="Invalid signature")
-        logger.error(f"Webhook error: {e}")
+        logger.error("Webhook error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     
-    logger.info(f"Received webhook event: {event['type']}")
-    
-    try:
-        if event["type"] == "checkout.session.completed":
-            session = event["data"]["object"]
-            customer_id = session["customer"]
-            subscription_id = session.get("subscription")
-            
-            customer_email = session.get("customer_email") or session.get("customer_details", {}).get("email")
-            logger.info(f"Processing checkout.session.completed for email: {customer_email}, subscription: {subscription_id}")
-            
-            if customer_email:
-                user = get_user_by_email(customer_email)
-                if user:
-                    logger.info(f"Found user {user.id} for email {customer_email}")
-                    update_user_stripe_customer(user.id, customer_id)
-                    logger.info(f"Updated user {user.id} with Stripe customer {customer_id}")
-                    
-                    if subscription_id:
-                        try:
-                            subscription = stripe.Subscription.retrieve(subscription_id)
-                            create_subscription(
-                                user_id=user.id,
-                                stripe_subscription_id=subscription_id,
-                                status=subscription.status,
-                                current_period_end=datetime.fromtimestamp(subscription.current_period_end)
-                            )
-                            logger.info(f"Created subscription {subscription_id} for user {user.id} from checkout.session.completed")
-                        except Exception as e:
-                            logger.error(f"Failed to retrieve/create subscription {subscription_id}: {e}", exc_info=True)
-                    else:
-                        logger.warning(f"No subscription ID in checkout session for user {user.id}")
-                else:
-                    logger.warning(f"No user found for email: {customer_email}")
-            else:
-                logger.warning(f"No customer email in checkout session: {session.get('id')}")
-        
-        elif event["type"] == "customer.subscription.created":
-            subscription = event["data"]["object"]
-            customer_id = subscription["customer"]
-            subscription_id = subscription["id"]
-            logger.info(f"Processing customer.subscription.created for customer {customer_id}")
-            
-            user = get_user_by_stripe_customer_id(customer_id)
-            if user:
-                items = subscription.get("items", {}).get("data", [])
-                current_period_end = None
-                if items and "current_period_end" in items[0]:
-                    current_period_end = items[0]["current_period_end"]
-                
-                if not current_period_end:
-                    logger.error("current_period_end field missing from subscription item")
-                    return {"status": "error", "message": "current_period_end field missing from subscription item"}
-                
-                create_subscription(
-                    user_id=user.id,
-                    stripe_subscription_id=subscription_id,
-                    status=subscription["status"],
-                    current_period_end=datetime.fromtimestamp(current_period_end)
-                )
-                logger.info(f"Subscription created. ID: {subscription_id}, current_period_end: {current_period_end}")
-                return {"status": "success", "current_period_end": current_period_end}
-            else:
-                logger.warning(f"No user found for Stripe customer: {customer_id}")
-        
-        elif event["type"] == "customer.subscription.updated":
-            subscription = event["data"]["object"]
-            customer_id = subscription["customer"]
-            subscription_id = subscription["id"]
-            logger.info(f"Processing customer.subscription.updated for customer {customer_id}")
-            
-            user = get_user_by_stripe_customer_id(customer_id)
-            if user:
-                existing_subscription = get_subscription_by_user_id(user.id)
-                if existing_subscription:
-                    update_subscription(
-                        user_id=user.id,
-                        status=subscription["status"],
-                        current_period_end=datetime.fromtimestamp(subscription["current_period_end"])
-                    )
-                    logger.info(f"Updated subscription for user {user.id}")
-                else:
-                    create_subscription(
-                        user_id=user.id,
-                        stripe_subscription_id=subscription_id,
-                        status=subscription["status"],
-                        current_period_end=datetime.fromtimestamp(subscription["current_period_end"])
-                    )
-                    logger.info(f"Created subscription for user {user.id}")
-            else:
-                logger.warning(f"No user found for Stripe customer: {customer_id}")
-        
-        elif event["type"] == "customer.subscription.deleted":
-            subscription = event["data"]["object"]
-            customer_id = subscription["customer"]
-            logger.info(f"Processing customer.subscription.deleted for customer {customer_id}")
-            
-            user = get_user_by_stripe_customer_id(customer_id)
-            if user:
-                update_subscription(
-                    user_id=user.id,
-                    status="canceled",
-                    current_period_end=datetime.fromtimestamp(subscription["current_period_end"])
-                )
-                logger.info(f"Canceled subscription for user {user.id}")
-            else:
-                logger.warning(f"No user found for Stripe customer: {customer_id}")
-        
-    except Exception as e:
-        logger.error(f"Error processing webhook event {event['type']}: {e}", exc_info=True)
-        return {"status": "error", "message": str(e)}
+    logger.debug("Received webhook event %s", event["type"])
     
-    return {"status": "success"}
+    accepted = await webhook_queue.submit(json.loads(payload), payload.decode("utf-8"))
+    return {"status": "success", "duplicate": not accepted}
 
 @app.get("/api/news", response_model=List[Article])
-async def get_news(email: str = Depends(get_current_user_email)):
-    user = get_user_by_email(email)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def get_news(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    principal: Principal = Depends(require_active_subscription)
+):
+    if not len(article_archive):
+        await fetch_news()
     
-    subscription = get_subscription_by_user_id(user.id)
-    if not subscription or subscription.status != "active":
-        raise HTTPException(
-            status_code=403,
-            detail="Active subscription required to access news"
+    def render_page():
+        articles, next_cursor = article_archive.page(limit=limit, cursor=cursor, since=since, until=until)
+        return article_list.dump_json(articles), {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    
+    # The page is the same for every subscriber, so it is serialized once per
+    # archive version; the entitlement check above still runs per request.
+    try:
+        payload = news_response_cache.get_or_build(
+            (article_archive.version, limit, cursor, since, until), render_page
         )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    articles = await fetch_fca_news()
-    return articles
+    return news_response_cache.respond(request, payload)
 
-@app.get("/api/news/{article_index}/summary")
-async def get_article_summary(article_index: int, email: str = Depends(get_current_user_email)):
-    user = get_user_by_email(email)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@app.get("/api/news/stream")
+async def stream_news(request: Request, principal: Principal = Depends(require_active_stream_subscription)):
+    subscriber = news_broadcaster.subscribe(request.headers.get("last-event-id"))
+    email = principal.user.email
     
-    subscription = get_subscription_by_user_id(user.id)
-    if not subscription or subscription.status != "active":
-        raise HTTPException(
-            status_code=403,
-            detail="Active subscription required"
+    async def still_subscribed() -> bool:
+        current = await load_principal(email)
+        return current is not None and current.has_active_subscription
+    
+    return StreamingResponse(
+        news_broadcaster.stream(subscriber, STREAM_HEARTBEAT_SECONDS, still_subscribed),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/news/search", response_model=List[Article])
+async def search_news(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    principal: Principal = Depends(require_active_subscription)
+):
+    if not len(article_archive):
+        await fetch_news()
+    
+    # Hits come best first; the scores only rank them.
+    results = []
+    for doc_id, _ in search_index.search(q, limit):
+        article = article_archive.get(doc_id)
+        if article:
+            results.append(article)
+    return results
+
+async def summarize_for(article: Article, principal: Principal):
+    content = article.full_content or article.summary
+    
+    try:
+        summary = await summary_store.get_or_create(
+            summary_key(article.link, content),
+            lambda: generate_summary(content, principal.user.id)
+        )
+    except CircuitOpenError:
+        return JSONResponse(
+            status_code=202,
+            content={"summary": None, "status": "pending"},
+            headers={"Retry-After": str(int(llm_gateway.breaker.reset_timeout))}
         )
+    except Exception as e:
+        return {"summary": f"Error generating summary: {str(e)}"}
     
-    articles = await fetch_fca_news()
+    summary_ready(article, summary)
+    return {"summary": summary}
+
+@app.get("/api/articles/{article_id}", response_model=Article)
+async def get_article(article_id: str, principal: Principal = Depends(require_active_subscription)):
+    article = article_archive.get(article_id)
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    return article
+
+@app.get("/api/articles/{article_id}/summary")
+async def get_archived_article_summary(article_id: str, principal: Principal = Depends(summary_rate_limit)):
+    article = article_archive.get(article_id)
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    return await summarize_for(article, principal)
+
+@app.get("/api/news/{article_index}/summary")
+async def get_article_summary(article_index: int, principal: Principal = Depends(summary_rate_limit)):
+    articles = await fetch_news()
     
     if article_index < 0 or article_index >= len(articles):
         raise HTTPException(status_code=404, detail="Article not found")
     
-    article = articles[article_index]
-    
-    if not article.ai_summary:
-        article.ai_summary = await summarize_article(article.full_content or article.summary)
-    
-    return {"summary": article.ai_summary}
+    return await summarize_for(articles[article_index], principal)
 
 @app.get("/api/config")
 async def get_config():
     return {
-        "stripePublishableKey": os.getenv("STRIPE_PUBLISHABLE_KEY")
+        "stripePublishableKey": settings.stripe_publishable_key
     }
 
-@app.get("/api/debug/database-state")
-async def debug_database_state():
-    from app.database import users_db, subscriptions_db, email_to_user_id
-    
-    users_list = []
-    for user_id, user in users_db.items():
-        users_list.append({
-            "id": user.id,
-            "email": user.email,
-            "stripe_customer_id": user.stripe_customer_id,
-            "created_at": user.created_at.isoformat()
-        })
-    
-    subscriptions_list = []
-    for user_id, sub in subscriptions_db.items():
-        subscriptions_list.append({
-            "user_id": sub.user_id,
-            "stripe_subscription_id": sub.stripe_subscription_id,
-            "status": sub.status,
-            "current_period_end": sub.current_period_end.isoformat(),
-            "created_at": sub.created_at.isoformat()
-        })
-    
+def component_stats() -> dict:
     return {
-        "users": users_list,
-        "subscriptions": subscriptions_list,
-        "email_to_user_id_mapping": email_to_user_id
+        "feeds": news_ingestion.metrics(),
+        "summaries": summary_store.metrics(),
+        "llm_gateway": llm_gateway.metrics(),
+        "presummarizer": presummarizer.metrics(),
+        "webhooks": webhook_queue.metrics(),
+        "expiry_sweeper": expiry_sweeper.metrics(),
+        "principals": principal_cache.metrics(),
+        "password_pool": password_pool.metrics(),
+        "rate_limits": rate_limiter.metrics(),
+        "search": search_index.metrics(),
+        "news_responses": news_response_cache.metrics(),
+        "news_stream": news_broadcaster.metrics(),
+        "event_loop": {"max_lag_seconds": loop_lag_monitor.max_lag, **stall_detector.metrics()},
+        "tracing": {"sample_rate": tracer.sample_rate, "sampled": tracer.sampled}
     }
+
+metrics_registry.add_collector(component_stats)
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def prometheus_metrics():
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/debug/cache-stats")
+async def debug_cache_stats(principal: Principal = Depends(require_admin)):
+    return component_stats()
+
+@app.get("/api/debug/stalls")
+async def debug_stalls(limit: int = Query(20, ge=1, le=50), principal: Principal = Depends(require_admin)):
+    return {"enabled": stall_detector.enabled, "stalls": stall_detector.recent(limit)}
+
+@app.get("/api/debug/profile")
+async def debug_profile(
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(5, ge=1, le=100),
+    principal: Principal = Depends(require_admin)
+):
+    try:
+        stacks = await profiler.profile(seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(render_collapsed(stacks), media_type="text/plain")
+
+@app.get("/api/debug/traces")
+async def debug_traces(limit: int = Query(20, ge=1, le=200), principal: Principal = Depends(require_admin)):
+    return tracer.recent(limit)
+
+@app.get("/api/admin/accounts/stats")
+async def admin_account_stats(
+    expiring_within_days: int = Query(7, ge=0, le=366),
+    principal: Principal = Depends(require_admin)
+):
+    stats = await repository.account_stats(datetime.utcnow(), expiring_within_days)
+    stats["expiring_within_days"] = expiring_within_days
+    return stats
+
+@app.get("/api/admin/accounts/export")
+async def admin_export_accounts(
+    after: Optional[str] = None,
+    page_size: int = Query(500, ge=1, le=5000),
+    principal: Principal = Depends(require_admin)
+):
+    # The first page is read up front so a bad cursor is still a 400.
+    try:
+        first_page = await repository.list_accounts_page(after, page_size)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return StreamingResponse(
+        export_accounts(repository, first_page, page_size),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/api/admin/stripe-backfill", status_code=202)
+async def start_admin_stripe_backfill(principal: Principal = Depends(require_admin)):
+    if stripe_backfill_task is not None and not stripe_backfill_task.done():
+        raise HTTPException(status_code=409, detail="A Stripe backfill is already running")
+    return start_stripe_backfill().progress()
+
+@app.get("/api/admin/stripe-backfill")
+async def admin_stripe_backfill_progress(principal: Principal = Depends(require_admin)):
+    if stripe_backfill is None:
+        raise HTTPException(status_code=404, detail="No Stripe backfill has been started")
+    return stripe_backfill.progress()
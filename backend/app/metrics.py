@@ -0,0 +1,222 @@
+import asyncio
+import bisect
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import get_settings
+from app.tracing import Tracer
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NAMESPACE = "complyease"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _metric_name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(parts)).lower()
+
+
+class Histogram:
+    # Observations only touch a per-bucket count; cumulative counts are
+    # computed when the registry is scraped.
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *label_values: str):
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+            self._sums[label_values] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    def count(self, *label_values: str) -> int:
+        return sum(self._counts.get(label_values, ()))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            label_text = _labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{label_text} {self._sums[values]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+def render_component_stats(components: Dict[str, dict]) -> List[str]:
+    # The stats dataclasses every component already keeps (also served at
+    # /api/debug/cache-stats) become gauges; a nested dict, such as the
+    # per-source feed stats, becomes a "name" label.
+    samples: Dict[str, List[str]] = {}
+    for component, stats in components.items():
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                for label, nested in value.items():
+                    if not isinstance(nested, dict):
+                        continue
+                    for stat, number in nested.items():
+                        if isinstance(number, (int, float)):
+                            name = _metric_name(NAMESPACE, component, key, stat)
+                            samples.setdefault(name, []).append(f'{name}{{name="{_escape(str(label))}"}} {float(number)}')
+            elif isinstance(value, (int, float)):
+                name = _metric_name(NAMESPACE, component, key)
+                samples.setdefault(name, []).append(f"{name} {float(value)}")
+    lines = []
+    for name, series in samples.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(series)
+    return lines
+
+
+class MetricsRegistry:
+    def __init__(self, tracer: Tracer):
+        self.enabled = True
+        self.tracer = tracer
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Dict[str, dict]]] = []
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        histogram = Histogram(_metric_name(NAMESPACE, name), documentation, labels, buckets)
+        self._metrics.append(histogram)
+        return histogram
+
+    def add_collector(self, collect: Callable[[], Dict[str, dict]]):
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            lines.extend(render_component_stats(collect()))
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer(
+    sample_rate=get_settings().trace_sample_rate,
+    max_traces=get_settings().trace_buffer_size,
+)
+metrics_registry = MetricsRegistry(tracer)
+
+request_latency = metrics_registry.histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route", "status")
+)
+external_latency = metrics_registry.histogram(
+    "external_call_duration_seconds", "Latency of calls to FCA/regulator feeds, OpenAI and Stripe.",
+    ("service", "operation", "outcome"),
+)
+event_loop_lag = metrics_registry.histogram(
+    "event_loop_lag_seconds", "How late a periodic timer fires on the event loop.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+@contextmanager
+def timed(service: str, operation: str) -> Iterator[None]:
+    # The block may be a plain call or an await.
+    started = time.perf_counter()
+    outcome = "error"
+    with tracer.span(f"{service}.{operation}"):
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            if metrics_registry.enabled:
+                external_latency.observe(time.perf_counter() - started, service, operation, outcome)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.max_lag = max(self.max_lag, lag)
+            event_loop_lag.observe(lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class RequestMetricsMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware, which would add a task and
+    # a memory stream to every request.
+    def __init__(self, app, registry: MetricsRegistry = metrics_registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        if not self.registry.tracer.should_sample():
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                self._observe(scope, status[0], started)
+            return
+
+        with self.registry.tracer.trace("http.request", method=scope["method"], path=scope["path"]) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                span.set("route", self._observe(scope, status[0], started))
+                span.set("status", status[0])
+
+    @staticmethod
+    def _observe(scope, status: int, started: float) -> str:
+        # The matched route template, not the raw path, keeps the label set
+        # bounded (/api/articles/{article_id}).
+        template = getattr(scope.get("route"), "path", "unmatched")
+        request_latency.observe(time.perf_counter() - started, scope["method"], template, f"{status // 100}xx")
+        return template
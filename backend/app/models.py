@@ -33,11 +33,20 @@ class Subscription(BaseModel):
     status: str
     current_period_end: datetime
     created_at: datetime
+    plan: str = "standard"
 
 class Article(BaseModel):
+    id: Optional[str] = None
     title: str
     link: str
     published: str
+    published_at: Optional[datetime] = None
     summary: str
     full_content: Optional[str] = None
     ai_summary: Optional[str] = None
+    source: Optional[str] = None
+
+class Principal(BaseModel):
+    user: User
+    subscription: Optional[Subscription] = None
+    has_active_subscription: bool = False
@@ -0,0 +1,60 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.auth import get_password_hash, verify_password
+from app.config import get_settings
+
+
+class PasswordHasherPool:
+    # bcrypt releases the GIL while hashing, so a thread pool sized to the
+    # cores keeps the event loop free without the overhead of processes.
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+PASSWORD_HASH_WORKERS = get_settings().password_hash_workers
+
+password_pool = PasswordHasherPool(
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=get_settings().password_hash_max_pending or PASSWORD_HASH_WORKERS * 8,
+)
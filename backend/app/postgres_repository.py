@@ -0,0 +1,414 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from psycopg.errors import UniqueViolation
+from psycopg.rows import class_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
+
+from app.database import EmailAlreadyRegistered
+from app.models import User, Subscription
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever SCHEMA changes, so the next start applies it once.
+SCHEMA_VERSION = 2
+# Key of the advisory lock held while migrating, so workers starting
+# together do not run the DDL side by side.
+MIGRATION_LOCK = 0x636F6D706C79
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    hashed_password TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    stripe_customer_id TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_idx ON users (email);
+CREATE INDEX IF NOT EXISTS users_stripe_customer_id_idx ON users (stripe_customer_id);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id TEXT PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    stripe_subscription_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    current_period_end TIMESTAMP NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    plan TEXT NOT NULL DEFAULT 'standard'
+);
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS plan TEXT NOT NULL DEFAULT 'standard';
+CREATE INDEX IF NOT EXISTS subscriptions_stripe_subscription_id_idx ON subscriptions (stripe_subscription_id);
+CREATE TABLE IF NOT EXISTS stripe_events (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    received_at TIMESTAMP NOT NULL,
+    processed_at TIMESTAMP
+);
+ALTER TABLE stripe_events ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+CREATE INDEX IF NOT EXISTS stripe_events_pending_idx ON stripe_events (received_at) WHERE processed_at IS NULL;
+CREATE TABLE IF NOT EXISTS stripe_subscription_versions (
+    subscription_id TEXT PRIMARY KEY,
+    created BIGINT NOT NULL,
+    event_order INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subscriptions_live_period_end_idx ON subscriptions (current_period_end)
+    WHERE status IN ('active', 'trialing');
+CREATE TABLE IF NOT EXISTS account_counters (
+    name TEXT PRIMARY KEY,
+    value BIGINT NOT NULL
+);
+CREATE OR REPLACE FUNCTION bump_account_counter(counter TEXT, delta BIGINT) RETURNS void AS $$
+    INSERT INTO account_counters (name, value) VALUES (counter, delta)
+    ON CONFLICT (name) DO UPDATE SET value = account_counters.value + EXCLUDED.value;
+$$ LANGUAGE sql;
+CREATE OR REPLACE FUNCTION count_users() RETURNS trigger AS $$
+BEGIN
+    PERFORM bump_account_counter('users', CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+CREATE OR REPLACE FUNCTION count_subscriptions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_account_counter('subscriptions:' || OLD.status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_account_counter('subscriptions:' || NEW.status, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+-- Seeds the counters for rows written before the triggers existed; a no-op
+-- once they are in place.
+INSERT INTO account_counters (name, value) SELECT 'users', count(*) FROM users ON CONFLICT (name) DO NOTHING;
+INSERT INTO account_counters (name, value) SELECT 'subscriptions:' || status, count(*) FROM subscriptions GROUP BY status
+    ON CONFLICT (name) DO NOTHING;
+CREATE OR REPLACE TRIGGER users_counter AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION count_users();
+CREATE OR REPLACE TRIGGER subscriptions_counter AFTER INSERT OR DELETE OR UPDATE OF status ON subscriptions
+    FOR EACH ROW EXECUTE FUNCTION count_subscriptions();
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schema_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version INTEGER NOT NULL
+);
+"""
+
+USER_COLUMNS = "id, email, hashed_password, created_at, stripe_customer_id"
+SUBSCRIPTION_COLUMNS = "user_id, stripe_subscription_id, status, current_period_end, created_at, plan"
+USER_FIELDS = USER_COLUMNS.split(", ")
+SUBSCRIPTION_FIELDS = SUBSCRIPTION_COLUMNS.split(", ")
+ACCOUNT_COLUMNS = ", ".join([f"u.{field}" for field in USER_FIELDS] + [f"s.{field}" for field in SUBSCRIPTION_FIELDS[1:]])
+
+UPSERT_STRIPE_SUBSCRIPTIONS = """
+WITH rows AS (
+    SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::timestamp[], %s::text[])
+        AS r(email, customer_id, subscription_id, status, current_period_end, plan)
+), accepted AS (
+    -- A subscription never replaces a different, live one unless it is live
+    -- itself; a skipped row leaves the customer link alone too.
+    SELECT u.id, rows.* FROM rows
+    JOIN users u ON u.email = rows.email
+    LEFT JOIN subscriptions s ON s.user_id = u.id
+    WHERE s.user_id IS NULL
+        OR s.stripe_subscription_id = rows.subscription_id
+        OR rows.status IN ('active', 'trialing')
+        OR s.status NOT IN ('active', 'trialing')
+), linked AS (
+    UPDATE users u SET stripe_customer_id = a.customer_id
+    FROM accepted a
+    WHERE u.id = a.id AND u.stripe_customer_id IS DISTINCT FROM a.customer_id
+    RETURNING u.id
+), upserted AS (
+    INSERT INTO subscriptions AS s (user_id, stripe_subscription_id, status, current_period_end, created_at, plan)
+    SELECT id, subscription_id, status, current_period_end, %s, plan FROM accepted
+    ON CONFLICT (user_id) DO UPDATE SET
+        stripe_subscription_id = EXCLUDED.stripe_subscription_id,
+        status = EXCLUDED.status,
+        current_period_end = EXCLUDED.current_period_end,
+        plan = EXCLUDED.plan
+    RETURNING user_id
+)
+SELECT user_id FROM upserted
+UNION
+SELECT id FROM linked
+"""
+
+
+async def _schema_version(conn) -> int:
+    cur = await conn.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    (exists,) = await cur.fetchone()
+    if not exists:
+        return 0
+    cur = await conn.execute("SELECT version FROM schema_version")
+    row = await cur.fetchone()
+    return row[0] if row else 0
+
+
+class PostgresRepository:
+    def __init__(self, conninfo: str, min_size: int = 2, max_size: int = 10):
+        # prepare_threshold=0 makes psycopg prepare every statement on first
+        # use, so the hot lookups skip parse/plan on each later call.
+        self.pool = AsyncConnectionPool(
+            conninfo,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={"prepare_threshold": 0, "autocommit": True},
+            open=False,
+        )
+
+    async def open(self):
+        await self.pool.open()
+        async with self.pool.connection() as conn:
+            current = await _schema_version(conn)
+        if current < SCHEMA_VERSION:
+            await self.migrate()
+
+    async def migrate(self) -> bool:
+        # Applies SCHEMA at most once per version: the first worker to take
+        # the lock runs it, and the rest find the version already current.
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+                if await _schema_version(conn) >= SCHEMA_VERSION:
+                    return False
+                logger.info("Migrating the database schema to version %d", SCHEMA_VERSION)
+                await conn.execute(SCHEMA, prepare=False)
+                await conn.execute(
+                    "INSERT INTO schema_version (version) VALUES (%s) "
+                    "ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version",
+                    (SCHEMA_VERSION,),
+                )
+                return True
+
+    async def close(self):
+        await self.pool.close()
+
+    async def _fetch_one(self, row_type, query: str, params: tuple):
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=class_row(row_type)) as cur:
+                await cur.execute(query, params)
+                return await cur.fetchone()
+
+    async def _fetch_all(self, row_type, query: str, params: tuple = ()):
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=class_row(row_type)) as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    async def _execute(self, query: str, params: tuple):
+        async with self.pool.connection() as conn:
+            await conn.execute(query, params)
+
+    async def create_user(self, email: str, hashed_password: str) -> User:
+        try:
+            return await self._fetch_one(
+                User,
+                f"INSERT INTO users (id, email, hashed_password, created_at) VALUES (%s, %s, %s, %s) RETURNING {USER_COLUMNS}",
+                (str(uuid.uuid4()), email, hashed_password, datetime.utcnow()),
+            )
+        except UniqueViolation:
+            raise EmailAlreadyRegistered(email) from None
+
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        return await self._fetch_one(User, f"SELECT {USER_COLUMNS} FROM users WHERE email = %s", (email,))
+
+    async def get_user_by_id(self, user_id: str) -> Optional[User]:
+        return await self._fetch_one(User, f"SELECT {USER_COLUMNS} FROM users WHERE id = %s", (user_id,))
+
+    async def update_user_stripe_customer(self, user_id: str, stripe_customer_id: str):
+        await self._execute("UPDATE users SET stripe_customer_id = %s WHERE id = %s", (stripe_customer_id, user_id))
+
+    async def update_user_password(self, user_id: str, hashed_password: str):
+        await self._execute("UPDATE users SET hashed_password = %s WHERE id = %s", (hashed_password, user_id))
+
+    async def delete_user(self, user_id: str) -> bool:
+        # The subscription goes with it (ON DELETE CASCADE), and the counter
+        # triggers fire for both rows.
+        async with self.pool.connection() as conn:
+            cur = await conn.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            return cur.rowcount > 0
+
+    async def create_subscription(self, user_id: str, stripe_subscription_id: str, status: str, current_period_end: datetime, plan: str = "standard") -> Subscription:
+        return await self._fetch_one(
+            Subscription,
+            "INSERT INTO subscriptions (user_id, stripe_subscription_id, status, current_period_end, created_at, plan) "
+            "VALUES (%s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (user_id) DO UPDATE SET stripe_subscription_id = EXCLUDED.stripe_subscription_id, "
+            "status = EXCLUDED.status, current_period_end = EXCLUDED.current_period_end, created_at = EXCLUDED.created_at, "
+            "plan = EXCLUDED.plan "
+            f"RETURNING {SUBSCRIPTION_COLUMNS}",
+            (user_id, stripe_subscription_id, status, current_period_end, datetime.utcnow(), plan),
+        )
+
+    async def get_subscription_by_user_id(self, user_id: str) -> Optional[Subscription]:
+        return await self._fetch_one(
+            Subscription, f"SELECT {SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE user_id = %s", (user_id,)
+        )
+
+    async def update_subscription(self, user_id: str, status: str, current_period_end: datetime, plan: Optional[str] = None):
+        await self._execute(
+            "UPDATE subscriptions SET status = %s, current_period_end = %s, plan = COALESCE(%s, plan) WHERE user_id = %s",
+            (status, current_period_end, plan, user_id),
+        )
+
+    async def get_user_by_stripe_customer_id(self, stripe_customer_id: str) -> Optional[User]:
+        return await self._fetch_one(
+            User, f"SELECT {USER_COLUMNS} FROM users WHERE stripe_customer_id = %s LIMIT 1", (stripe_customer_id,)
+        )
+
+    async def get_user_by_stripe_subscription_id(self, stripe_subscription_id: str) -> Optional[User]:
+        return await self._fetch_one(
+            User,
+            "SELECT u.id, u.email, u.hashed_password, u.created_at, u.stripe_customer_id FROM users u "
+            "JOIN subscriptions s ON s.user_id = u.id WHERE s.stripe_subscription_id = %s LIMIT 1",
+            (stripe_subscription_id,),
+        )
+
+    async def record_webhook_event(self, event_id: str, event_type: str, payload: str) -> bool:
+        # The receiving worker holds the claim until it marks the event processed.
+        now = datetime.utcnow()
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "INSERT INTO stripe_events (id, type, payload, received_at, claimed_at) VALUES (%s, %s, %s, %s, %s) "
+                "ON CONFLICT (id) DO NOTHING",
+                (event_id, event_type, Jsonb(json.loads(payload)), now, now),
+            )
+            return cur.rowcount == 1
+
+    async def mark_webhook_event_processed(self, event_id: str):
+        await self._execute("UPDATE stripe_events SET processed_at = %s WHERE id = %s", (datetime.utcnow(), event_id))
+
+    async def claim_pending_webhook_events(self, stale_before: datetime) -> List[dict]:
+        # SKIP LOCKED lets workers recovering at the same time split the
+        # backlog instead of each replaying all of it.
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "UPDATE stripe_events SET claimed_at = %s WHERE id IN ("
+                "SELECT id FROM stripe_events WHERE processed_at IS NULL "
+                "AND (claimed_at IS NULL OR claimed_at < %s) FOR UPDATE SKIP LOCKED"
+                ") RETURNING payload, received_at",
+                (datetime.utcnow(), stale_before),
+            )
+            rows = await cur.fetchall()
+        return [payload for payload, _ in sorted(rows, key=lambda row: row[1])]
+
+    async def prune_webhook_events(self, processed_before: datetime) -> int:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute("DELETE FROM stripe_events WHERE processed_at < %s", (processed_before,))
+            return cur.rowcount
+
+    async def claim_subscription_event(self, stripe_subscription_id: str, version: Tuple[int, int]) -> bool:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "INSERT INTO stripe_subscription_versions AS v (subscription_id, created, event_order) VALUES (%s, %s, %s) "
+                "ON CONFLICT (subscription_id) DO UPDATE SET created = EXCLUDED.created, event_order = EXCLUDED.event_order "
+                "WHERE (v.created, v.event_order) <= (EXCLUDED.created, EXCLUDED.event_order)",
+                (stripe_subscription_id, *version),
+            )
+            return cur.rowcount == 1
+
+    async def link_stripe_customers(self, rows: List[Tuple[str, str]]) -> List[str]:
+        if not rows:
+            return []
+        emails, customer_ids = (list(column) for column in zip(*rows))
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "UPDATE users u SET stripe_customer_id = r.customer_id "
+                "FROM unnest(%s::text[], %s::text[]) AS r(email, customer_id) "
+                "WHERE u.email = r.email AND u.stripe_customer_id IS DISTINCT FROM r.customer_id "
+                # A customer that owns a live subscription keeps its user.
+                "AND (u.stripe_customer_id IS NULL OR NOT EXISTS ("
+                "SELECT 1 FROM subscriptions s WHERE s.user_id = u.id AND s.status IN ('active', 'trialing'))) "
+                "RETURNING u.id",
+                (emails, customer_ids),
+            )
+            return [row[0] for row in await cur.fetchall()]
+
+    async def upsert_stripe_subscriptions(self, rows: List[Tuple[str, str, str, str, datetime, str]]) -> List[str]:
+        # One statement per batch. The emails in a batch must be distinct, as
+        # ON CONFLICT cannot touch the same row twice.
+        if not rows:
+            return []
+        columns = [list(column) for column in zip(*rows)]
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(UPSERT_STRIPE_SUBSCRIPTIONS, (*columns, datetime.utcnow()))
+            return [row[0] for row in await cur.fetchall()]
+
+    async def due_subscriptions(self, before: datetime, limit: int) -> List[Subscription]:
+        # Served by subscriptions_live_period_end_idx.
+        return await self._fetch_all(
+            Subscription,
+            f"SELECT {SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE status IN ('active', 'trialing') "
+            "AND current_period_end < %s ORDER BY current_period_end LIMIT %s",
+            (before, limit),
+        )
+
+    async def account_stats(self, now: datetime, expiring_within_days: int) -> dict:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute("SELECT name, value FROM account_counters")
+            counters = dict(await cur.fetchall())
+            cur = await conn.execute(
+                "SELECT count(*) FROM subscriptions WHERE status IN ('active', 'trialing') "
+                "AND current_period_end >= %s AND current_period_end < %s",
+                (now, now + timedelta(days=expiring_within_days)),
+            )
+            (expiring,) = await cur.fetchone()
+        return {
+            "users": counters.get("users", 0),
+            "subscriptions": {
+                name.split(":", 1)[1]: value
+                for name, value in counters.items() if name.startswith("subscriptions:") and value
+            },
+            "expiring": expiring,
+        }
+
+    async def list_accounts_page(self, after: Optional[str], limit: int) -> List[Tuple[str, User, Optional[Subscription]]]:
+        # Keyset pagination on the primary key: every page is an index range
+        # scan, however deep into the table it starts.
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                f"SELECT {ACCOUNT_COLUMNS} FROM users u LEFT JOIN subscriptions s ON s.user_id = u.id "
+                "WHERE u.id > %s ORDER BY u.id LIMIT %s",
+                (after or "", limit),
+            )
+            rows = await cur.fetchall()
+        accounts = []
+        for row in rows:
+            user = User(**dict(zip(USER_FIELDS, row[:len(USER_FIELDS)])))
+            subscription = None
+            if row[len(USER_FIELDS)] is not None:
+                subscription = Subscription(user_id=user.id, **dict(zip(SUBSCRIPTION_FIELDS[1:], row[len(USER_FIELDS):])))
+            accounts.append((user.id, user, subscription))
+        return accounts
+
+
+async def main():
+    # Migrate ahead of a deploy, so no API worker has to on its way up.
+    from app.config import get_settings
+    from app.log_config import configure_logging
+
+    configure_logging()
+    settings = get_settings()
+    if not settings.database_url:
+        raise SystemExit("DATABASE_URL is not set")
+    repository = PostgresRepository(settings.database_url, min_size=1, max_size=1)
+    await repository.pool.open()
+    try:
+        migrated = await repository.migrate()
+    finally:
+        await repository.close()
+    print(f"schema version {SCHEMA_VERSION}" + (" applied" if migrated else " already current"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
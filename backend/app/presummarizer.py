@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.models import Article
+from app.summary_store import SummaryStore, summary_key
+
+logger = logging.getLogger(__name__)
+
+
+class Pacer:
+    # Spaces calls evenly at rate_per_second; unlike app.rate_limit it never
+    # rejects, it makes the caller wait for its slot.
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class PresummarizerStats:
+    enqueued: int = 0
+    skipped: int = 0
+    dropped: int = 0
+    completed: int = 0
+    failed: int = 0
+    last_latency_seconds: float = 0.0
+    max_latency_seconds: float = 0.0
+    total_latency_seconds: float = 0.0
+
+
+class Presummarizer:
+    def __init__(
+        self,
+        store: SummaryStore,
+        summarize: Callable[[str], Awaitable[str]],
+        workers: int = 2,
+        rate_per_second: float = 1.0,
+        max_queue: int = 200,
+        on_summary: Optional[Callable[[Article, str], None]] = None,
+    ):
+        self.store = store
+        self.summarize = summarize
+        self.workers = workers
+        self.on_summary = on_summary
+        self.pacer = Pacer(rate_per_second)
+        self.stats = PresummarizerStats()
+        self._queue: "asyncio.Queue[Tuple[str, Article]]" = asyncio.Queue(max_queue)
+        self._pending: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._started_at: Optional[float] = None
+
+    async def enqueue_missing(self, articles: List[Article]):
+        if not self.workers:
+            return
+        for article in articles:
+            content = article.full_content or article.summary
+            key = summary_key(article.link, content)
+            if key in self._pending:
+                self.stats.skipped += 1
+                continue
+            cached = await self.store.get(key)
+            if cached is not None:
+                self.stats.skipped += 1
+                if self.on_summary:
+                    self.on_summary(article, cached)
+                continue
+            try:
+                self._queue.put_nowait((key, article))
+            except asyncio.QueueFull:
+                self.stats.dropped += 1
+                continue
+            self._pending.add(key)
+            self.stats.enqueued += 1
+
+    async def _work(self):
+        while True:
+            key, article = await self._queue.get()
+            content = article.full_content or article.summary
+            try:
+                await self.pacer.acquire()
+                started = time.perf_counter()
+                summary = await self.store.get_or_create(key, lambda: self.summarize(content))
+                if self.on_summary:
+                    self.on_summary(article, summary)
+                elapsed = time.perf_counter() - started
+                self.stats.completed += 1
+                self.stats.last_latency_seconds = elapsed
+                self.stats.total_latency_seconds += elapsed
+                self.stats.max_latency_seconds = max(self.stats.max_latency_seconds, elapsed)
+            except Exception as e:
+                self.stats.failed += 1
+                logger.warning("Pre-summarization failed for %s: %s", key[:12], e)
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+
+    def start(self):
+        if self._tasks or not self.workers:
+            return
+        self._started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self):
+        await self._queue.join()
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        data["workers"] = len(self._tasks)
+        data["queue_depth"] = self._queue.qsize()
+        data["throughput_per_minute"] = self.stats.completed / elapsed * 60 if elapsed else 0.0
+        data["avg_latency_seconds"] = (
+            self.stats.total_latency_seconds / self.stats.completed if self.stats.completed else 0.0
+        )
+        return data
@@ -0,0 +1,113 @@
+import hmac
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.auth import get_current_user_email, get_stream_user_email, optional_security
+from app.config import get_settings
+from app.models import Principal
+from app.repository import repository, snapshot
+
+PRINCIPAL_CACHE_TTL_SECONDS = get_settings().principal_cache_ttl_seconds
+ADMIN_EMAILS = {email.strip().lower() for email in get_settings().admin_emails.split(",") if email.strip()}
+METRICS_TOKEN = get_settings().metrics_token
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[Principal, float]] = {}
+        self._email_by_user_id: Dict[str, str] = {}
+
+    def get(self, email: str) -> Optional[Principal]:
+        cached = self._entries.get(email)
+        if cached and cached[1] > time.monotonic():
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        return None
+
+    def put(self, email: str, principal: Principal):
+        if self.ttl <= 0:
+            return
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+            self._email_by_user_id.clear()
+        self._entries[email] = (principal, time.monotonic() + self.ttl)
+        self._email_by_user_id[principal.user.id] = email
+
+    def invalidate_user(self, user_id: str):
+        email = self._email_by_user_id.pop(user_id, None)
+        if email is not None:
+            self._entries.pop(email, None)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+principal_cache = PrincipalCache(ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+async def load_principal(email: str) -> Optional[Principal]:
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+
+    user = await repository.get_user_by_email(email)
+    if not user:
+        return None
+    subscription = await repository.get_subscription_by_user_id(user.id)
+    principal = Principal(
+        user=snapshot(user),
+        subscription=snapshot(subscription),
+        has_active_subscription=subscription is not None and subscription.status == "active",
+    )
+    principal_cache.put(email, principal)
+    return principal
+
+
+async def get_current_principal(email: str = Depends(get_current_user_email)) -> Principal:
+    principal = await load_principal(email)
+    if principal is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return principal
+
+
+async def require_active_subscription(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if not principal.has_active_subscription:
+        raise HTTPException(
+            status_code=403,
+            detail="Active subscription required"
+        )
+    return principal
+
+
+async def require_active_stream_subscription(email: str = Depends(get_stream_user_email)) -> Principal:
+    return await require_active_subscription(await get_current_principal(email))
+
+
+async def require_admin(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if principal.user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=403,
+            detail="Admin access required"
+        )
+    return principal
+
+
+async def require_metrics_access(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    # A scraper cannot log in, so it presents METRICS_TOKEN instead of a JWT.
+    if credentials and METRICS_TOKEN and hmac.compare_digest(credentials.credentials, METRICS_TOKEN):
+        return
+    await require_admin(await get_current_principal(await get_stream_user_email(credentials, None)))
@@ -0,0 +1,230 @@
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from fastapi import Depends, HTTPException, Request
+
+from app.config import get_settings
+from app.models import Principal
+from app.principal import require_active_subscription
+from app.repository import repository
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITS_ENABLED = get_settings().rate_limits_enabled
+RATE_LIMIT_BACKEND = get_settings().rate_limit_backend
+
+DEFAULT_PLAN = "standard"
+
+# Per policy, a limit for each subscription plan; plans without an entry
+# get the "standard" one. Policies that run before sign-in (login,
+# register) only have a "standard" limit.
+DEFAULT_LIMITS = {
+    "summary": {"standard": "30/minute", "pro": "120/minute"},
+    "login_ip": {"standard": "30/minute"},
+    "login_account": {"standard": "10/minute"},
+    "register": {"standard": "10/hour"},
+}
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+
+@dataclass(frozen=True)
+class Limit:
+    # A token bucket holding up to `burst` requests, refilled at `rate`
+    # requests per second.
+    rate: float
+    burst: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit":
+        # "30/minute": 30 requests at once, then one every two seconds.
+        count, _, period = spec.partition("/")
+        seconds = PERIODS.get(period.strip().rstrip("s"))
+        if seconds is None or float(count) <= 0:
+            raise ValueError(f"Invalid rate limit {spec!r}; expected e.g. '30/minute'")
+        return cls(rate=float(count) / seconds, burst=float(count))
+
+
+def load_limits(overrides: Optional[str] = None) -> Dict[str, Dict[str, Limit]]:
+    specs = {policy: dict(plans) for policy, plans in DEFAULT_LIMITS.items()}
+    for policy, plans in json.loads(overrides or "{}").items():
+        specs.setdefault(policy, {}).update(plans)
+    limits = {}
+    for policy, plans in specs.items():
+        if DEFAULT_PLAN not in plans:
+            raise ValueError(f"Rate limit policy {policy!r} needs a {DEFAULT_PLAN!r} limit")
+        limits[policy] = {plan: Limit.parse(spec) for plan, spec in plans.items()}
+    return limits
+
+
+class MemoryBucketStore:
+    # Buckets live in this process only, so with N workers a client gets up
+    # to N times the limit. take() is a dict lookup and a little float math.
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, List[float]] = {}
+        self._prune_at = max_buckets
+
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        # Returns 0.0 when the request may proceed, otherwise the seconds
+        # until enough tokens will have been refilled.
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._prune_at:
+                self._prune(now)
+            self._buckets[key] = [limit.burst - cost, now]
+            return 0.0
+        tokens = bucket[0] + (now - bucket[1]) * limit.rate
+        if tokens > limit.burst:
+            tokens = limit.burst
+        bucket[1] = now
+        if tokens >= cost:
+            bucket[0] = tokens - cost
+            return 0.0
+        bucket[0] = tokens
+        return (cost - tokens) / limit.rate
+
+    def _prune(self, now: float, idle: float = 86400.0):
+        # A bucket untouched for longer than any limit's period is full again,
+        # which is the same as having no bucket at all.
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < idle}
+        self._prune_at = max(self.max_buckets, len(self._buckets) * 2)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# The refill, the spend and the verdict happen in one statement on the row
+# lock, so concurrent workers never both spend the last token. SET sees the
+# row as it was before the update, and the database clock is used so the
+# workers' clocks do not have to agree.
+TAKE_TOKEN = """
+INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at, allowed)
+VALUES (%(key)s, %(burst)s - %(cost)s, EXTRACT(EPOCH FROM statement_timestamp()), TRUE)
+ON CONFLICT (key) DO UPDATE SET
+    allowed = LEAST(%(burst)s, b.tokens + (EXTRACT(EPOCH FROM statement_timestamp()) - b.updated_at) * %(rate)s) >= %(cost)s,
+    tokens = LEAST(%(burst)s, b.tokens + (EXTRACT(EPOCH FROM statement_timestamp()) - b.updated_at) * %(rate)s)
+        - CASE WHEN LEAST(%(burst)s, b.tokens + (EXTRACT(EPOCH FROM statement_timestamp()) - b.updated_at) * %(rate)s) >= %(cost)s
+               THEN %(cost)s ELSE 0 END,
+    updated_at = EXTRACT(EPOCH FROM statement_timestamp())
+RETURNING tokens, allowed
+"""
+
+
+class PostgresBucketStore:
+    # Shared by every worker and host using the same database, at the cost
+    # of a round trip per check. The table is UNLOGGED: losing buckets in a
+    # crash only means everyone starts with a full burst.
+    def __init__(self, repository):
+        self.repository = repository
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        async with self.repository.pool.connection() as conn:
+            cur = await conn.execute(TAKE_TOKEN, {"key": key, "rate": limit.rate, "burst": limit.burst, "cost": cost})
+            tokens, allowed = await cur.fetchone()
+        return 0.0 if allowed else (cost - tokens) / limit.rate
+
+
+@dataclass
+class PolicyStats:
+    allowed: int = 0
+    rejected: int = 0
+
+
+class RateLimitExceeded(HTTPException):
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        limits: Dict[str, Dict[str, Limit]],
+        shared: Optional[PostgresBucketStore] = None,
+        enabled: bool = True,
+    ):
+        self.limits = limits
+        self.enabled = enabled
+        self.memory = MemoryBucketStore()
+        self.shared = shared
+        self.shared_errors = 0
+        self.stats = {policy: PolicyStats() for policy in limits}
+
+    def limit_for(self, policy: str, plan: str = DEFAULT_PLAN) -> Limit:
+        plans = self.limits[policy]
+        return plans.get(plan) or plans[DEFAULT_PLAN]
+
+    async def hit(self, policy: str, identity: str, plan: str = DEFAULT_PLAN, cost: float = 1.0):
+        # Raises RateLimitExceeded, carrying a Retry-After header, once
+        # `identity` has used up its allowance for `policy`.
+        if not self.enabled:
+            return
+        limit = self.limit_for(policy, plan)
+        key = f"{policy}:{identity}"
+        if self.shared is None:
+            retry_after = self.memory.take(key, limit, cost)
+        else:
+            try:
+                retry_after = await self.shared.take(key, limit, cost)
+            except Exception as e:
+                # Fail over to this worker's own buckets rather than failing
+                # requests, or letting them all through, while the database
+                # is unreachable.
+                self.shared_errors += 1
+                logger.warning("Shared rate limit check for %s failed: %s", policy, e)
+                retry_after = self.memory.take(key, limit, cost)
+        stats = self.stats[policy]
+        if retry_after:
+            stats.rejected += 1
+            raise RateLimitExceeded(retry_after)
+        stats.allowed += 1
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": int(self.enabled),
+            "local_buckets": len(self.memory),
+            "shared_errors": self.shared_errors,
+            "policies": {policy: vars(stats).copy() for policy, stats in self.stats.items()},
+        }
+
+
+def create_rate_limiter() -> RateLimiter:
+    shared = None
+    if RATE_LIMIT_BACKEND == "postgres":
+        if not hasattr(repository, "pool"):
+            raise RuntimeError("RATE_LIMIT_BACKEND=postgres needs DATABASE_URL to be set")
+        shared = PostgresBucketStore(repository)
+    return RateLimiter(load_limits(get_settings().rate_limits), shared=shared, enabled=RATE_LIMITS_ENABLED)
+
+
+rate_limiter = create_rate_limiter()
+
+
+def client_ip(request: Request) -> str:
+    # Behind a proxy, run uvicorn with --proxy-headers so this is the
+    # client's address rather than the proxy's.
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_ip(policy: str):
+    async def dependency(request: Request):
+        await rate_limiter.hit(policy, client_ip(request))
+    return dependency
+
+
+def limit_by_plan(policy: str):
+    # Keyed by user, with the limit of the user's subscription plan.
+    async def dependency(principal: Principal = Depends(require_active_subscription)) -> Principal:
+        plan = principal.subscription.plan if principal.subscription else DEFAULT_PLAN
+        await rate_limiter.hit(policy, principal.user.id, plan)
+        return principal
+    return dependency
@@ -0,0 +1,112 @@
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.config import get_settings
+from app import database
+from app.database import EmailAlreadyRegistered, SubscriptionRecord, UserRecord
+
+
+def snapshot(row):
+    # MemoryRepository hands out the store's live records, which later writes
+    # change in place; anything kept past the request, like a cached
+    # Principal, takes a pydantic copy. Postgres rows are models already.
+    if row is None or isinstance(row, BaseModel):
+        return row
+    return row.model()
+
+
+class MemoryRepository:
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def create_user(self, email: str, hashed_password: str) -> UserRecord:
+        return database.create_user(email, hashed_password)
+
+    async def get_user_by_email(self, email: str) -> Optional[UserRecord]:
+        return database.get_user_by_email(email)
+
+    async def get_user_by_id(self, user_id: str) -> Optional[UserRecord]:
+        return database.get_user_by_id(user_id)
+
+    async def update_user_stripe_customer(self, user_id: str, stripe_customer_id: str):
+        database.update_user_stripe_customer(user_id, stripe_customer_id)
+
+    async def update_user_password(self, user_id: str, hashed_password: str):
+        database.update_user_password(user_id, hashed_password)
+
+    async def delete_user(self, user_id: str) -> bool:
+        return database.delete_user(user_id)
+
+    async def create_subscription(self, user_id: str, stripe_subscription_id: str, status: str, current_period_end: datetime, plan: str = "standard") -> SubscriptionRecord:
+        return database.create_subscription(user_id, stripe_subscription_id, status, current_period_end, plan)
+
+    async def get_subscription_by_user_id(self, user_id: str) -> Optional[SubscriptionRecord]:
+        return database.get_subscription_by_user_id(user_id)
+
+    async def update_subscription(self, user_id: str, status: str, current_period_end: datetime, plan: Optional[str] = None):
+        database.update_subscription(user_id, status, current_period_end, plan)
+
+    async def get_user_by_stripe_customer_id(self, stripe_customer_id: str) -> Optional[UserRecord]:
+        return database.get_user_by_stripe_customer_id(stripe_customer_id)
+
+    async def get_user_by_stripe_subscription_id(self, stripe_subscription_id: str) -> Optional[UserRecord]:
+        return database.get_user_by_stripe_subscription_id(stripe_subscription_id)
+
+    async def record_webhook_event(self, event_id: str, event_type: str, payload: str) -> bool:
+        return database.record_webhook_event(event_id, event_type, payload)
+
+    async def mark_webhook_event_processed(self, event_id: str):
+        database.mark_webhook_event_processed(event_id)
+
+    async def claim_pending_webhook_events(self, stale_before: datetime) -> List[dict]:
+        # Unprocessed events not claimed since stale_before, oldest first;
+        # they are claimed for the caller so no other worker replays them.
+        return [json.loads(payload) for payload in database.claim_pending_webhook_events(stale_before)]
+
+    async def prune_webhook_events(self, processed_before: datetime) -> int:
+        # Forgets events processed before processed_before; a redelivery of
+        # one of them would no longer be recognised as a duplicate.
+        return database.prune_webhook_events(processed_before)
+
+    async def claim_subscription_event(self, stripe_subscription_id: str, version: Tuple[int, int]) -> bool:
+        # False when an event newer than `version` was already applied.
+        return database.claim_subscription_event(stripe_subscription_id, version)
+
+    async def link_stripe_customers(self, rows: List[Tuple[str, str]]) -> List[str]:
+        return database.link_stripe_customers(rows)
+
+    async def upsert_stripe_subscriptions(self, rows: List[Tuple[str, str, str, str, datetime, str]]) -> List[str]:
+        return database.upsert_stripe_subscriptions(rows)
+
+    async def due_subscriptions(self, before: datetime, limit: int) -> List[SubscriptionRecord]:
+        return database.due_subscriptions(before, limit)
+
+    async def account_stats(self, now: datetime, expiring_within_days: int) -> dict:
+        return database.account_stats(now, expiring_within_days)
+
+    async def list_accounts_page(self, after: Optional[str], limit: int) -> List[Tuple[str, UserRecord, Optional[SubscriptionRecord]]]:
+        # Each row starts with an opaque cursor; passing it back as `after`
+        # continues with the next account.
+        return database.list_accounts_page(after, limit)
+
+
+def create_repository(database_url: Optional[str] = None):
+    settings = get_settings()
+    database_url = database_url or settings.database_url
+    if database_url:
+        from app.postgres_repository import PostgresRepository
+        return PostgresRepository(
+            database_url,
+            min_size=settings.database_pool_min_size,
+            max_size=settings.database_pool_max_size,
+        )
+    return MemoryRepository()
+
+
+repository = create_repository()
@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional extra; without it clients get gzip
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Below this size compression costs more than the bytes it saves.
+MIN_COMPRESS_BYTES = 512
+CACHE_CONTROL = "private, no-cache"
+
+
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    ENCODERS["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+ENCODERS["gzip"] = lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def accepted_encodings(header: Optional[str]) -> List[str]:
+    accepted = []
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.append(name.strip().lower())
+    return accepted
+
+
+def _etag_values(header: Optional[str]) -> List[str]:
+    # If-None-Match uses the weak comparison, so a W/ prefix is ignored.
+    return [tag.strip().removeprefix("W/") for tag in (header or "").split(",") if tag.strip()]
+
+
+@dataclass
+class CachedPayload:
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    def encode(self, encoding: str) -> bytes:
+        # Variants are compressed on first request, then reused until the
+        # payload is evicted.
+        body = self.encoded.get(encoding)
+        if body is None:
+            body = self.encoded[encoding] = ENCODERS[encoding](self.body)
+        return body
+
+    def variant(self, accept_encoding: Optional[str]) -> Tuple[Optional[str], bytes, str]:
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding in ENCODERS:
+                if encoding in accepted or "*" in accepted:
+                    # Each encoding is a different representation, so it
+                    # needs its own strong validator.
+                    return encoding, self.encode(encoding), self.variant_etag(encoding)
+        return None, self.body, self.etag
+
+    def variant_etag(self, encoding: str) -> str:
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def etags(self) -> List[str]:
+        return [self.etag] + [self.variant_etag(encoding) for encoding in ENCODERS]
+
+
+def build_payload(body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedPayload:
+    return CachedPayload(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"', headers=headers or {})
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    not_modified: int = 0
+    evictions: int = 0
+    bytes_sent: int = 0
+    bytes_saved: int = 0
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.stats = ResponseCacheStats()
+        self._entries: "OrderedDict[Hashable, CachedPayload]" = OrderedDict()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Tuple[bytes, Dict[str, str]]]) -> CachedPayload:
+        payload = self._entries.get(key)
+        if payload is not None:
+            self.stats.hits += 1
+            self._entries.move_to_end(key)
+            return payload
+        self.stats.misses += 1
+        payload = build_payload(*build())
+        self._entries[key] = payload
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+        return payload
+
+    def respond(self, request: Request, payload: CachedPayload) -> Response:
+        encoding, body, etag = payload.variant(request.headers.get("accept-encoding"))
+        headers = {**payload.headers, "ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        if_none_match = _etag_values(request.headers.get("if-none-match"))
+        if "*" in if_none_match or any(tag in if_none_match for tag in payload.etags()):
+            self.stats.not_modified += 1
+            self.stats.bytes_saved += len(body)
+            return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            self.stats.bytes_saved += len(payload.body) - len(body)
+        self.stats.bytes_sent += len(body)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        lookups = self.stats.hits + self.stats.misses
+        data["entries"] = len(self._entries)
+        data["hit_rate"] = self.stats.hits / lookups if lookups else 0.0
+        data["brotli"] = brotli is not None
+        return data
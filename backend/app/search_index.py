@@ -0,0 +1,515 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+from array import array
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.models import Article
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+TAG_RE = re.compile(r"<[^>]+>")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2
+MAX_PREFIX_EXPANSIONS = 50
+NORM_TOLERANCE = 0.01
+THRESHOLD_RECHECK = 0.75
+PROBE_RATIO = 16
+
+# Segment file layout, all integers native-endian u32 unless noted (the file
+# is a local cache that can always be rebuilt from the article archive):
+#   header        magic (8s), doc count, term count, total doc length (u64)
+#   doc_lengths   one per doc
+#   doc_ids       16 ASCII bytes per doc
+#   term_offsets  term count + 1 offsets into the term blob
+#   post_offsets  term count + 1 offsets into the postings arrays
+#   post_docs     doc number of each posting
+#   post_tfs      term frequency of each posting
+#   term_blob     sorted UTF-8 terms, concatenated
+# Every array starts 4-byte aligned so it can be cast straight out of mmap.
+MAGIC = b"FCASRCH1"
+HEADER = struct.Struct("=8sIIQ")
+DOC_ID_BYTES = 16
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [token for token in TOKEN_RE.findall(TAG_RE.sub(" ", text).lower()) if token not in STOPWORDS]
+
+
+def document_terms(article: Article) -> Counter:
+    terms = Counter()
+    for token in tokenize(article.title):
+        terms[token] += TITLE_WEIGHT
+    terms.update(tokenize(article.summary))
+    if article.full_content != article.summary:
+        terms.update(tokenize(article.full_content))
+    terms.update(tokenize(article.ai_summary))
+    return terms
+
+
+def length_norms(segment, avg_length: float) -> List[float]:
+    # Per-document BM25 length normalisation, cached on the segment. The
+    # average length barely moves as documents arrive, so the cache is only
+    # rebuilt once it drifts by more than NORM_TOLERANCE.
+    norms, cached_avg = segment.norms, segment.norms_avg_length
+    if abs(cached_avg - avg_length) > avg_length * NORM_TOLERANCE:
+        norms, cached_avg = [], avg_length
+        segment.norms, segment.norms_avg_length = norms, cached_avg
+    if len(norms) < len(segment):
+        scale = BM25_K1 * BM25_B / cached_avg
+        base = BM25_K1 * (1 - BM25_B)
+        norms.extend(base + scale * length for length in segment.doc_lengths[len(norms):])
+    return norms
+
+
+class MemorySegment:
+    def __init__(self):
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.dead: Set[int] = set()
+        self.norms: List[float] = []
+        self.norms_avg_length = 0.0
+        self._sorted_terms: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_id: str, terms: Counter) -> int:
+        doc_no = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self._sorted_terms = None
+            postings[doc_no] = tf
+        return doc_no
+
+    def doc_id(self, doc_no: int) -> str:
+        return self.doc_ids[doc_no]
+
+    def doc_length(self, doc_no: int) -> int:
+        return self.doc_lengths[doc_no]
+
+    def postings_for(self, term: str) -> Iterable[Tuple[int, int]]:
+        return self.postings.get(term, {}).items()
+
+    def doc_frequency(self, term: str) -> int:
+        return len(self.postings.get(term, ()))
+
+    def matches(self, term: str, candidates: Optional[Dict[int, float]] = None) -> Iterable[Tuple[int, int]]:
+        postings = self.postings.get(term)
+        if not postings:
+            return ()
+        if candidates is None:
+            return postings.items()
+        if len(candidates) < len(postings):
+            return [(doc_no, postings[doc_no]) for doc_no in candidates if doc_no in postings]
+        return [(doc_no, tf) for doc_no, tf in postings.items() if doc_no in candidates]
+
+    def terms_with_prefix(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        matches = []
+        for term in self._sorted_terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def terms(self) -> Iterable[str]:
+        return self.postings.keys()
+
+
+class DiskSegment:
+    def __init__(self, path: str):
+        self.path = path
+        self.dead: Set[int] = set()
+        self.norms: List[float] = []
+        self.norms_avg_length = 0.0
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.doc_count, self.term_count, self.total_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a search index segment")
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def take(count: int, width: int = 4) -> memoryview:
+            nonlocal offset
+            chunk = view[offset:offset + count * width]
+            offset += count * width
+            return chunk
+
+        self.doc_lengths = take(self.doc_count).cast("I")
+        self._doc_ids = take(self.doc_count, DOC_ID_BYTES)
+        self._term_offsets = take(self.term_count + 1).cast("I")
+        self._post_offsets = take(self.term_count + 1).cast("I")
+        posting_count = self._post_offsets[self.term_count] if self.term_count else 0
+        self._post_docs = take(posting_count).cast("I")
+        self._post_tfs = take(posting_count).cast("I")
+        self._term_blob = view[offset:]
+        self._views = [self.doc_lengths, self._doc_ids, self._term_offsets, self._post_offsets,
+                       self._post_docs, self._post_tfs, self._term_blob, view]
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._mmap.close()
+
+    def doc_id(self, doc_no: int) -> str:
+        start = doc_no * DOC_ID_BYTES
+        return bytes(self._doc_ids[start:start + DOC_ID_BYTES]).rstrip(b"\0").decode("ascii")
+
+    def doc_length(self, doc_no: int) -> int:
+        return self.doc_lengths[doc_no]
+
+    def _term(self, index: int) -> str:
+        return bytes(self._term_blob[self._term_offsets[index]:self._term_offsets[index + 1]]).decode("utf-8")
+
+    def _lower_bound(self, term: str) -> int:
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _postings_range(self, term: str) -> Tuple[int, int]:
+        index = self._lower_bound(term)
+        if index >= self.term_count or self._term(index) != term:
+            return 0, 0
+        return self._post_offsets[index], self._post_offsets[index + 1]
+
+    def postings_for(self, term: str) -> Iterable[Tuple[int, int]]:
+        start, end = self._postings_range(term)
+        return zip(self._post_docs[start:end], self._post_tfs[start:end])
+
+    def doc_frequency(self, term: str) -> int:
+        start, end = self._postings_range(term)
+        return end - start
+
+    def matches(self, term: str, candidates: Optional[Dict[int, float]] = None) -> Iterable[Tuple[int, int]]:
+        start, end = self._postings_range(term)
+        docs, tfs = self._post_docs, self._post_tfs
+        if candidates is None or start == end:
+            return zip(docs[start:end], tfs[start:end])
+        if len(candidates) * PROBE_RATIO < end - start:
+            # Postings are sorted by doc number, so a few candidates are
+            # cheaper to binary search than a scan of the whole list.
+            matches = []
+            for doc_no in candidates:
+                position = bisect.bisect_left(docs, doc_no, start, end)
+                if position < end and docs[position] == doc_no:
+                    matches.append((doc_no, tfs[position]))
+            return matches
+        return [(doc_no, tf) for doc_no, tf in zip(docs[start:end], tfs[start:end]) if doc_no in candidates]
+
+    def terms_with_prefix(self, prefix: str) -> List[str]:
+        matches = []
+        index = self._lower_bound(prefix)
+        while index < self.term_count and len(matches) < MAX_PREFIX_EXPANSIONS:
+            term = self._term(index)
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+            index += 1
+        return matches
+
+    def terms(self) -> Iterable[str]:
+        for index in range(self.term_count):
+            yield self._term(index)
+
+
+def write_segment(path: str, segments: List) -> Dict[str, int]:
+    # Merges the live documents of `segments` into one file and returns the
+    # new doc number of every document that was written.
+    renumber: List[Dict[int, int]] = []
+    doc_ids: List[str] = []
+    doc_lengths = array("I")
+    for segment in segments:
+        mapping = {}
+        for doc_no in range(len(segment)):
+            if doc_no in segment.dead:
+                continue
+            mapping[doc_no] = len(doc_ids)
+            doc_ids.append(segment.doc_id(doc_no))
+            doc_lengths.append(segment.doc_length(doc_no))
+        renumber.append(mapping)
+
+    terms = sorted(set().union(*(segment.terms() for segment in segments)))
+    term_offsets, post_offsets = array("I", [0]), array("I", [0])
+    post_docs, post_tfs = array("I"), array("I")
+    term_blob = bytearray()
+    for term in terms:
+        merged = []
+        for segment, mapping in zip(segments, renumber):
+            for doc_no, tf in segment.postings_for(term):
+                new_no = mapping.get(doc_no)
+                if new_no is not None:
+                    merged.append((new_no, tf))
+        if not merged:
+            continue
+        merged.sort()
+        for doc_no, tf in merged:
+            post_docs.append(doc_no)
+            post_tfs.append(tf)
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+        post_offsets.append(len(post_docs))
+
+    encoded_ids = bytearray()
+    for doc_id in doc_ids:
+        encoded_ids += doc_id.encode("ascii")[:DOC_ID_BYTES].ljust(DOC_ID_BYTES, b"\0")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(doc_ids), len(term_offsets) - 1, sum(doc_lengths)))
+        f.write(doc_lengths.tobytes())
+        f.write(encoded_ids)
+        for values in (term_offsets, post_offsets, post_docs, post_tfs):
+            f.write(values.tobytes())
+        f.write(term_blob)
+    os.replace(tmp_path, path)
+    return {doc_id: doc_no for doc_no, doc_id in enumerate(doc_ids)}
+
+
+class SearchIndex:
+    def __init__(self, path: Optional[str] = None, flush_threshold: int = 5000):
+        self.path = path
+        self.flush_threshold = flush_threshold
+        self.base: Optional[DiskSegment] = None
+        self.frozen: List[MemorySegment] = []
+        self.memory = MemorySegment()
+        self._live: Dict[str, Tuple[object, int]] = {}
+        self._total_length = 0
+        self._flushing = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self.searches = 0
+        self.flushes = 0
+        if path and os.path.exists(path):
+            self._attach_base(DiskSegment(path))
+
+    def _attach_base(self, base: DiskSegment):
+        self.base = base
+        for doc_no in range(len(base)):
+            doc_id = base.doc_id(doc_no)
+            self._live[doc_id] = (base, doc_no)
+            self._total_length += base.doc_length(doc_no)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._live
+
+    def _segments(self) -> List:
+        segments = [self.base] if self.base is not None else []
+        return segments + self.frozen + [self.memory]
+
+    def add(self, article: Article):
+        previous = self._live.get(article.id)
+        if previous is not None:
+            segment, doc_no = previous
+            segment.dead.add(doc_no)
+            self._total_length -= segment.doc_length(doc_no)
+        doc_no = self.memory.add(article.id, document_terms(article))
+        self._live[article.id] = (self.memory, doc_no)
+        self._total_length += self.memory.doc_length(doc_no)
+
+    def _query_terms(self, query: str) -> Dict[str, bool]:
+        # Maps each query token to whether it is prefix-matched: tokens marked
+        # with a trailing "*" and the last token (search as you type).
+        terms: Dict[str, bool] = {}
+        for word in query.split():
+            for token in tokenize(word):
+                terms[token] = terms.get(token, False) or word.endswith("*")
+        if terms:
+            terms[next(reversed(terms))] = True
+        return terms
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        self.searches += 1
+        terms = self._query_terms(query)
+        if not terms or not self._live or not self._total_length:
+            return []
+        avg_length = self._total_length / len(self._live)
+        segments = self._segments()
+        norms = [length_norms(segment, avg_length) for segment in segments]
+        # Superseded documents stay in the postings until the next merge, so
+        # they are counted on both sides of the idf ratio.
+        doc_count = sum(len(segment) for segment in segments)
+
+        # Each query token becomes a clause of weighted term expansions, and a
+        # document scores for the best expansion of every clause.
+        clauses: List[List[Tuple[str, float]]] = []
+        for token, prefix in terms.items():
+            expansions = {token}
+            if prefix:
+                for segment in segments:
+                    expansions.update(segment.terms_with_prefix(token))
+            weighted = []
+            for term in expansions:
+                df = sum(segment.doc_frequency(term) for segment in segments)
+                if df:
+                    weighted.append((term, (BM25_K1 + 1) * math.log(1 + (doc_count - df + 0.5) / (df + 0.5))))
+            if weighted:
+                clauses.append(sorted(weighted, key=itemgetter(1), reverse=True))
+
+        # MaxScore, term at a time: a term never adds more than its weight, so
+        # terms are visited from the highest weight down. Once the weights
+        # left cannot lift an unseen document past the current k-th best
+        # score, the remaining terms only rescore the candidates that can
+        # still reach the top k.
+        steps = sorted(
+            ((weight, clause_no, term) for clause_no, clause in enumerate(clauses) for term, weight in clause),
+            reverse=True,
+        )
+        clause_bounds = [clause[0][1] for clause in clauses]
+        next_expansion = [1] * len(clauses)
+        bound = checked_bound = sum(clause_bounds)
+        scores: List[Dict[int, float]] = [{} for _ in segments]
+        best = [[{} for _ in segments] if len(clause) > 1 else None for clause in clauses]
+        viable: Optional[List[Set[int]]] = None
+        threshold = 0.0
+
+        for weight, clause_no, term in steps:
+            if viable is None and bound < checked_bound * THRESHOLD_RECHECK:
+                threshold, checked_bound = self._kth_best(segments, scores, limit), bound
+            if viable is None and bound <= threshold:
+                viable, filtered_bound = [set(accumulated) for accumulated in scores], math.inf
+            if viable is not None and bound < filtered_bound * THRESHOLD_RECHECK:
+                filtered_bound = bound
+                viable = [
+                    {doc_no for doc_no in candidates if accumulated[doc_no] + bound > threshold}
+                    for candidates, accumulated in zip(viable, scores)
+                ]
+
+            for segment_no, segment in enumerate(segments):
+                candidates = viable[segment_no] if viable is not None else None
+                accumulated, segment_norms = scores[segment_no], norms[segment_no]
+                if best[clause_no] is None:
+                    if candidates is None and not accumulated:
+                        scores[segment_no] = {
+                            doc_no: weight * tf / (tf + segment_norms[doc_no]) for doc_no, tf in segment.matches(term)
+                        }
+                        continue
+                    for doc_no, tf in segment.matches(term, candidates):
+                        accumulated[doc_no] = accumulated.get(doc_no, 0.0) + weight * tf / (tf + segment_norms[doc_no])
+                else:
+                    clause_best = best[clause_no][segment_no]
+                    for doc_no, tf in segment.matches(term, candidates):
+                        score = weight * tf / (tf + segment_norms[doc_no])
+                        previous = clause_best.get(doc_no, 0.0)
+                        if score > previous:
+                            clause_best[doc_no] = score
+                            accumulated[doc_no] = accumulated.get(doc_no, 0.0) + score - previous
+
+            clause = clauses[clause_no]
+            following = clause[next_expansion[clause_no]][1] if next_expansion[clause_no] < len(clause) else 0.0
+            next_expansion[clause_no] += 1
+            bound -= clause_bounds[clause_no] - following
+            clause_bounds[clause_no] = following
+
+        self._drop_dead(segments, scores)
+        top = heapq.nlargest(limit, (
+            (score, segment_no, doc_no)
+            for segment_no, accumulated in enumerate(scores)
+            for doc_no, score in heapq.nlargest(limit, accumulated.items(), key=itemgetter(1))
+        ))
+        return [(segments[segment_no].doc_id(doc_no), score) for score, segment_no, doc_no in top]
+
+    @staticmethod
+    def _drop_dead(segments: List, scores: List[Dict[int, float]]):
+        for segment, accumulated in zip(segments, scores):
+            for doc_no in segment.dead.intersection(accumulated):
+                del accumulated[doc_no]
+
+    @classmethod
+    def _kth_best(cls, segments: List, scores: List[Dict[int, float]], limit: int) -> float:
+        cls._drop_dead(segments, scores)
+        best = heapq.nlargest(limit, itertools.chain.from_iterable(accumulated.values() for accumulated in scores))
+        return best[-1] if len(best) == limit else 0.0
+
+    def maybe_flush(self):
+        if self.path and len(self.memory) >= self.flush_threshold:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        if not self.path or self._flushing or not (len(self.memory) or self.frozen):
+            return
+        # New writes go to a fresh memory segment while the merge runs in a
+        # thread; the merged file then replaces the base and frozen segments.
+        # If the merge fails the frozen segments stay searchable and are
+        # retried on the next flush.
+        self._flushing = True
+        if len(self.memory):
+            self.frozen.append(self.memory)
+            self.memory = MemorySegment()
+        old_base, frozen = self.base, list(self.frozen)
+        merged = ([old_base] if old_base is not None else []) + frozen
+        try:
+            renumbered = await asyncio.to_thread(write_segment, self.path, merged)
+            new_base = DiskSegment(self.path)
+        except Exception as e:
+            logger.error("Search index flush failed: %s", e, exc_info=True)
+            return
+        finally:
+            self._flushing = False
+
+        for doc_id, doc_no in renumbered.items():
+            current = self._live.get(doc_id)
+            if current is not None and any(current[0] is segment for segment in merged):
+                self._live[doc_id] = (new_base, doc_no)
+            else:
+                new_base.dead.add(doc_no)
+        self.base = new_base
+        self.frozen = self.frozen[len(frozen):]
+        self.flushes += 1
+        if old_base is not None:
+            old_base.close()
+        logger.info("Flushed search index with %d documents to %s", len(renumbered), self.path)
+
+    def metrics(self) -> dict:
+        return {
+            "documents": len(self._live),
+            "disk_documents": len(self.base) if self.base is not None else 0,
+            "memory_documents": len(self.memory) + sum(len(segment) for segment in self.frozen),
+            "searches": self.searches,
+            "flushes": self.flushes,
+        }
+
+    def close(self):
+        if self.base is not None:
+            self.base.close()
+            self.base = None
@@ -1,50 +1,128 @@
-import feedparser
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
 from typing import List, Optional
+from pydantic import TypeAdapter
+from app.clients import openai_client, stripe_api
+from app.config import get_settings
 from app.models import Article
-import stripe
+from app.feed_registry import load_sources
+from app.ingestion import IngestionEngine
+from app.article_archive import ArticleArchive
+from app.summary_store import SummaryStore, SqliteSummaryBackend
+from app.llm_gateway import LLMGateway, RetryBudget, CircuitBreaker
+from app.presummarizer import Presummarizer
+from app.search_index import SearchIndex
+from app.response_cache import ResponseCache
+from app.broadcaster import Broadcaster
+from app.metrics import timed
 
-load_dotenv()
+settings = get_settings()
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+news_ingestion = IngestionEngine(
+    load_sources(settings.feed_sources_path),
+    max_per_host=settings.feed_max_per_host,
+    max_connections=settings.feed_max_connections,
+    parse_workers=settings.feed_parse_workers,
+    timeout=settings.feed_timeout_seconds,
+    user_agent=settings.feed_user_agent,
+    max_backoff=settings.feed_max_backoff_seconds,
+)
 
-async def fetch_fca_news() -> List[Article]:
-    feed_url = "https://www.fca.org.uk/news/rss.xml"
-    feed = feedparser.parse(feed_url)
-    
-    articles = []
-    for entry in feed.entries[:20]:
-        article = Article(
-            title=entry.get("title", ""),
-            link=entry.get("link", ""),
-            published=entry.get("published", ""),
-            summary=entry.get("summary", ""),
-            full_content=entry.get("description", entry.get("summary", ""))
-        )
-        articles.append(article)
-    
-    return articles
-
-async def summarize_article(content: str) -> str:
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes financial news articles concisely. Keep summaries to 2-3 sentences."},
-                {"role": "user", "content": f"Summarize this article:\n\n{content}"}
-            ],
-            max_tokens=150,
-            temperature=0.7
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error generating summary: {str(e)}"
+article_archive = ArticleArchive(settings.article_archive_path)
+news_ingestion.remember(article_archive.articles())
+
+search_index = SearchIndex(
+    settings.search_index_path,
+    flush_threshold=settings.search_index_flush_threshold,
+)
+_summaries_indexed = set()
+
+news_broadcaster = Broadcaster(
+    buffer_size=settings.stream_buffer_size,
+    replay_size=settings.stream_replay_size,
+    max_subscribers=settings.stream_max_clients,
+)
+
+article_list = TypeAdapter(List[Article])
+
+async def archive_and_index(articles: List[Article]):
+    added = await article_archive.ingest(articles)
+    for article in added:
+        search_index.add(article)
+    search_index.maybe_flush()
+    if added:
+        # One frame per refresh, so a burst of new articles takes a single
+        # slot in each client's buffer.
+        news_broadcaster.publish("articles", article_list.dump_json(added).decode("utf-8"))
+
+news_ingestion.add_listener(archive_and_index)
+
+# Keyed by archive version, so a feed refresh that adds articles retires
+# every cached page at once.
+news_response_cache = ResponseCache(max_entries=settings.news_response_cache_size)
+
+def rebuild_search_index():
+    # The on-disk index may lag the archive if the process stopped before a
+    # flush; index whatever it is missing.
+    for article in article_archive.articles():
+        if article.id not in search_index:
+            search_index.add(article)
+    search_index.maybe_flush()
+
+def summary_ready(article: Article, summary: str):
+    if article.id in _summaries_indexed or article_archive.get(article.id) is None:
+        return
+    _summaries_indexed.add(article.id)
+    search_index.add(article.model_copy(update={"ai_summary": summary}))
+    news_broadcaster.publish_json("summary", {"id": article.id, "summary": summary})
+
+async def fetch_news() -> List[Article]:
+    return await news_ingestion.get_articles()
+
+SUMMARY_DB_PATH = settings.summary_db_path
+
+summary_store = SummaryStore(
+    max_entries=settings.summary_cache_size,
+    backend=SqliteSummaryBackend(SUMMARY_DB_PATH) if SUMMARY_DB_PATH else None,
+    cost_per_summary=settings.summary_cost_usd,
+)
+
+llm_gateway = LLMGateway(
+    openai_client,
+    max_concurrency=settings.openai_max_concurrency,
+    per_user_concurrency=settings.openai_per_user_concurrency,
+    timeout=settings.openai_timeout_seconds,
+    max_attempts=settings.openai_max_attempts,
+    retry_budget=RetryBudget(ratio=settings.openai_retry_budget_ratio),
+    breaker=CircuitBreaker(
+        failure_threshold=settings.openai_breaker_threshold,
+        reset_timeout=settings.openai_breaker_reset_seconds,
+    ),
+)
+
+async def generate_summary(content: str, user_id: Optional[str] = None) -> str:
+    response = await llm_gateway.chat_completion(
+        user_id=user_id,
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant that summarizes financial news articles concisely. Keep summaries to 2-3 sentences."},
+            {"role": "user", "content": f"Summarize this article:\n\n{content}"}
+        ],
+        max_tokens=150,
+        temperature=0.7
+    )
+    return response.choices[0].message.content
+
+presummarizer = Presummarizer(
+    summary_store,
+    generate_summary,
+    workers=settings.presummarize_workers,
+    rate_per_second=settings.presummarize_rate_per_second,
+    max_queue=settings.presummarize_max_queue,
+    on_summary=summary_ready,
+)
+news_ingestion.add_listener(presummarizer.enqueue_missing)
 
 def create_stripe_checkout_session(customer_email: str, customer_id: Optional[str] = None):
-    price_id = os.getenv("STRIPE_PRICE_ID")
+    price_id = settings.stripe_price_id
     
     session_params = {
         "payment_method_types": ["card"],
@@ -55,8 +133,8 @@ def create_stripe_checkout_session(customer_email: str, customer_id: Optional[st
             }
         ],
         "mode": "subscription",
-        "success_url": os.getenv("FRONTEND_URL", "http://localhost:5173") + "/success?session_id={CHECKOUT_SESSION_ID}",
-        "cancel_url": os.getenv("FRONTEND_URL", "http://localhost:5173") + "/cancel",
+        "success_url": settings.frontend_url + "/success?session_id={CHECKOUT_SESSION_ID}",
+        "cancel_url": settings.frontend_url + "/cancel",
         "customer_email": customer_email,
     }
     
@@ -64,12 +142,14 @@ def create_stripe_checkout_session(customer_email: str, customer_id: Optional[st
         session_params["customer"] = customer_id
         del session_params["customer_email"]
     
-    session = stripe.checkout.Session.create(**session_params)
+    with timed("stripe", "checkout.session.create"):
+        session = stripe_api().checkout.Session.create(**session_params)
     return session
 
 def create_stripe_portal_session(customer_id: str):
-    session = stripe.billing_portal.Session.create(
-        customer=customer_id,
-        return_url=os.getenv("FRONTEND_URL", "http://localhost:5173") + "/dashboard",
-    )
+    with timed("stripe", "billing_portal.session.create"):
+        session = stripe_api().billing_portal.Session.create(
+            customer=customer_id,
+            return_url=settings.frontend_url + "/dashboard",
+        )
     return session
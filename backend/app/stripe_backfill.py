@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from app.clients import stripe_api
+from app.config import get_settings
+from app.metrics import timed
+from app.rate_limit import Limit, MemoryBucketStore
+from app.webhooks import _current_period_end, _plan, _stripe_time
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATUSES = ("active", "trialing")
+KINDS = ("customers", "subscriptions")
+
+
+@dataclass
+class Shard:
+    # One created-time range of one object type. Stripe lists are paged with
+    # a cursor, so a single listing is sequential; ranges are what can be
+    # paged concurrently. starting_after is the resume point.
+    kind: str
+    gte: int
+    lt: int
+    starting_after: Optional[str] = None
+    done: bool = False
+
+
+def plan_shards(since: int, until: int, shards: int) -> List[Shard]:
+    step = max(1, -(-(until - since) // shards))
+    return [Shard(kind, start, min(start + step, until)) for kind in KINDS for start in range(since, until, step)]
+
+
+def parse_since(value: str) -> int:
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def subscription_row(subscription) -> Optional[tuple]:
+    customer = subscription["customer"]
+    email = None if isinstance(customer, str) else customer.get("email")
+    period_end = _current_period_end(subscription)
+    if not email or not period_end:
+        return None
+    return (email, customer["id"], subscription["id"], subscription["status"], _stripe_time(period_end), _plan(subscription))
+
+
+@dataclass
+class BackfillStats:
+    pages: int = 0
+    customers: int = 0
+    subscriptions: int = 0
+    users_updated: int = 0
+    rate_limited: int = 0
+    retries: int = 0
+    elapsed_seconds: float = 0.0
+
+
+class StripeBackfill:
+    def __init__(
+        self,
+        repository,
+        shards: List[Shard],
+        checkpoint_path: Optional[str] = None,
+        concurrency: int = 4,
+        requests_per_second: float = 20.0,
+        page_size: int = 100,
+        max_retries: int = 8,
+        progress_interval: float = 10.0,
+        on_user_changed: Optional[Callable[[str], None]] = None,
+    ):
+        self.repository = repository
+        self.shards = shards
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self.on_user_changed = on_user_changed
+        self.stats = BackfillStats()
+        self.running = False
+        self.error: Optional[str] = None
+        # Requests are paced below Stripe's limit up front; a 429 that gets
+        # through anyway is retried with backoff.
+        self._pace = Limit(rate=requests_per_second, burst=max(1.0, requests_per_second))
+        self._pacer = MemoryBucketStore()
+        self._elapsed_before = 0.0
+        self._started = 0.0
+
+    @classmethod
+    def resume(cls, repository, checkpoint_path: str, **kwargs) -> "StripeBackfill":
+        with open(checkpoint_path) as f:
+            data = json.load(f)
+        backfill = cls(repository, [Shard(**shard) for shard in data["shards"]], checkpoint_path, **kwargs)
+        backfill.stats = BackfillStats(**data["stats"])
+        backfill._elapsed_before = backfill.stats.elapsed_seconds
+        return backfill
+
+    def _elapsed(self) -> float:
+        return self._elapsed_before + (time.monotonic() - self._started if self.running else 0.0)
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        self.stats.elapsed_seconds = self._elapsed()
+        data = {"shards": [asdict(shard) for shard in self.shards], "stats": asdict(self.stats)}
+        partial = f"{self.checkpoint_path}.tmp"
+        with open(partial, "w") as f:
+            json.dump(data, f)
+        os.replace(partial, self.checkpoint_path)
+
+    async def _wait_for_turn(self):
+        while True:
+            wait = self._pacer.take("stripe", self._pace)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _fetch_page(self, shard: Shard):
+        stripe = stripe_api()
+        params = {"limit": self.page_size, "created": {"gte": shard.gte, "lt": shard.lt}}
+        if shard.starting_after:
+            params["starting_after"] = shard.starting_after
+        if shard.kind == "subscriptions":
+            # Expanding the customer brings the email along, so one pass
+            # links users and their subscriptions.
+            params.update(status="all", expand=["data.customer"])
+            list_page = stripe.Subscription.list
+        else:
+            list_page = stripe.Customer.list
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_turn()
+            try:
+                with timed("stripe", f"{shard.kind}.list"):
+                    return await asyncio.to_thread(list_page, **params)
+            except stripe.RateLimitError as e:
+                self.stats.rate_limited += 1
+                error = e
+            except (stripe.APIConnectionError, stripe.APIError) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            self.stats.retries += 1
+            await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    async def _apply(self, shard: Shard, objects: list) -> List[str]:
+        # Stripe lists newest first, so the first object seen for an email is
+        # its latest; a live subscription still beats a newer ended one.
+        if shard.kind == "customers":
+            self.stats.customers += len(objects)
+            customers: Dict[str, tuple] = {}
+            for customer in objects:
+                if customer.get("email"):
+                    customers.setdefault(customer["email"], (customer["email"], customer["id"]))
+            return await self.repository.link_stripe_customers(list(customers.values()))
+        self.stats.subscriptions += len(objects)
+        rows: Dict[str, tuple] = {}
+        for subscription in objects:
+            row = subscription_row(subscription)
+            if row is None:
+                continue
+            kept = rows.get(row[0])
+            if kept is None or (row[3] in LIVE_STATUSES and kept[3] not in LIVE_STATUSES):
+                rows[row[0]] = row
+        return await self.repository.upsert_stripe_subscriptions(list(rows.values()))
+
+    async def _work(self, pending: "asyncio.Queue[Shard]"):
+        while not pending.empty():
+            shard = pending.get_nowait()
+            while not shard.done:
+                page = await self._fetch_page(shard)
+                changed = await self._apply(shard, page["data"])
+                self.stats.pages += 1
+                self.stats.users_updated += len(changed)
+                if self.on_user_changed is not None:
+                    for user_id in changed:
+                        self.on_user_changed(user_id)
+                if page["data"]:
+                    shard.starting_after = page["data"][-1]["id"]
+                shard.done = not page["has_more"]
+                self._save_checkpoint()
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            progress = self.progress()
+            logger.info(
+                "Stripe backfill: %d/%d shards, %d customers, %d subscriptions, %.0f objects/s",
+                progress["shards_done"], progress["shards"], self.stats.customers, self.stats.subscriptions,
+                progress["objects_per_second"],
+            )
+
+    async def run(self) -> dict:
+        pending: "asyncio.Queue[Shard]" = asyncio.Queue()
+        for shard in self.shards:
+            if not shard.done:
+                pending.put_nowait(shard)
+        self.running = True
+        self._started = time.monotonic()
+        reporter = asyncio.create_task(self._report_progress())
+        workers = [asyncio.create_task(self._work(pending)) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except Exception as e:
+            # Left to the caller to log, along with whatever it was doing.
+            self.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            for task in [reporter, *workers]:
+                task.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+            self._save_checkpoint()
+            self.stats.elapsed_seconds = self._elapsed()
+            self._elapsed_before = self.stats.elapsed_seconds
+            self.running = False
+        logger.info(
+            "Stripe backfill finished: %d customers, %d subscriptions, %d users updated in %.1f s",
+            self.stats.customers, self.stats.subscriptions, self.stats.users_updated, self.stats.elapsed_seconds,
+        )
+        return self.progress()
+
+    def progress(self) -> dict:
+        elapsed = self._elapsed()
+        data = asdict(self.stats)
+        data["elapsed_seconds"] = elapsed
+        data["running"] = self.running
+        data["error"] = self.error
+        data["shards"] = len(self.shards)
+        data["shards_done"] = sum(1 for shard in self.shards if shard.done)
+        data["objects_per_second"] = (self.stats.customers + self.stats.subscriptions) / elapsed if elapsed else 0.0
+        return data
+
+
+def create_backfill(repository, **kwargs) -> StripeBackfill:
+    settings = get_settings()
+    shards = plan_shards(parse_since(settings.stripe_backfill_since), int(time.time()) + 1, settings.stripe_backfill_shards)
+    return StripeBackfill(
+        repository,
+        shards,
+        concurrency=settings.stripe_backfill_concurrency,
+        requests_per_second=settings.stripe_backfill_rps,
+        **kwargs,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild user/Stripe links and subscriptions from the Stripe API.")
+    parser.add_argument("--since", default="2011-01-01", help="earliest object creation date to list (YYYY-MM-DD)")
+    parser.add_argument("--shards", type=int, default=8, help="created-time ranges per object type")
+    parser.add_argument("--concurrency", type=int, default=4, help="shards paged at once")
+    parser.add_argument("--rps", type=float, default=20.0, help="Stripe requests per second")
+    parser.add_argument("--checkpoint", default="stripe-backfill.json")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    args = parser.parse_args()
+
+    from app.log_config import configure_logging
+    from app.repository import repository, MemoryRepository
+
+    configure_logging()
+    if isinstance(repository, MemoryRepository):
+        parser.error("DATABASE_URL is not set; for the in-memory store use POST /api/admin/stripe-backfill on the API")
+    options = {"concurrency": args.concurrency, "requests_per_second": args.rps}
+    if args.resume:
+        backfill = StripeBackfill.resume(repository, args.checkpoint, **options)
+    else:
+        shards = plan_shards(parse_since(args.since), int(time.time()) + 1, args.shards)
+        backfill = StripeBackfill(repository, shards, args.checkpoint, **options)
+    await repository.open()
+    try:
+        print(json.dumps(await backfill.run(), indent=2))
+    finally:
+        await repository.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
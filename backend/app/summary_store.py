@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def summary_key(link: str, content: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(link.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SqliteSummaryBackend:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS article_summaries ("
+                "key TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM article_summaries WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, summary: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO article_summaries (key, summary, created_at) VALUES (?, ?, ?)",
+                (key, summary, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class SummaryStoreStats:
+    hits: int = 0
+    durable_hits: int = 0
+    coalesced: int = 0
+    misses: int = 0
+    generated: int = 0
+    errors: int = 0
+    evictions: int = 0
+
+
+class SummaryStore:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        backend: Optional[SqliteSummaryBackend] = None,
+        cost_per_summary: float = 0.0,
+    ):
+        self.max_entries = max_entries
+        self.backend = backend
+        self.cost_per_summary = cost_per_summary
+        self.stats = SummaryStoreStats()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _remember(self, key: str, summary: str):
+        self._entries[key] = summary
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def peek(self, key: str) -> Optional[str]:
+        summary = self._entries.get(key)
+        if summary is not None:
+            self._entries.move_to_end(key)
+        return summary
+
+    async def get(self, key: str) -> Optional[str]:
+        summary = self.peek(key)
+        if summary is not None or self.backend is None:
+            return summary
+        summary = await asyncio.to_thread(self.backend.get, key)
+        if summary is not None:
+            self._remember(key, summary)
+        return summary
+
+    async def put(self, key: str, summary: str):
+        self._remember(key, summary)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.put, key, summary)
+
+    async def get_or_create(self, key: str, producer: Callable[[], Awaitable[str]]) -> str:
+        while True:
+            summary = self.peek(key)
+            if summary is not None:
+                self.stats.hits += 1
+                return summary
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.stats.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only the caller producing the summary was cancelled, not
+                # this one: go round again and produce it here instead.
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        # Register the in-flight future before the first await so that every
+        # concurrent caller for this key from here on waits on the same result.
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            summary = await self.get(key)
+            if summary is not None:
+                self.stats.durable_hits += 1
+            else:
+                self.stats.misses += 1
+                summary = await producer()
+                self.stats.generated += 1
+                await self.put(key, summary)
+            future.set_result(summary)
+            return summary
+        except Exception as e:
+            self.stats.errors += 1
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                # The producer was cancelled; wake the waiters rather than
+                # leave them awaiting a result that will never come.
+                future.cancel()
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        served = self.stats.hits + self.stats.durable_hits + self.stats.coalesced
+        requests = served + self.stats.misses
+        data["entries"] = len(self._entries)
+        data["inflight"] = len(self._inflight)
+        data["hit_rate"] = served / requests if requests else 0.0
+        data["cost_saved_usd"] = round(served * self.cost_per_summary, 6)
+        return data
@@ -0,0 +1,104 @@
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Iterator, List, Optional
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "started", "duration")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.started = time.time()
+        self.duration = 0.0
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def as_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.started,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+class Tracer:
+    # Sampling is decided once per root span; inside an unsampled trace
+    # every span() call is a context-variable read and nothing else.
+    def __init__(self, sample_rate: float = 0.01, max_traces: int = 200):
+        self.sample_rate = sample_rate
+        self.finished: Deque[dict] = deque(maxlen=max_traces)
+        self.sampled = 0
+
+    def should_sample(self) -> bool:
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    @contextmanager
+    def trace(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        # Callers on a hot path check should_sample() first and skip the
+        # context manager entirely for unsampled work.
+        if _current_span.get() is not None:
+            with self.span(name, **attributes) as span:
+                yield span
+            return
+        self.sampled += 1
+        trace = Trace()
+        with self._record(trace, name, None, attributes) as span:
+            yield span
+        self.finished.append({
+            "trace_id": trace.trace_id,
+            "spans": [recorded.as_dict() for recorded in trace.spans],
+        })
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        with self._record(parent.trace, name, parent.span_id, attributes) as span:
+            yield span
+
+    @contextmanager
+    def _record(self, trace: Trace, name: str, parent_id: Optional[str], attributes: dict) -> Iterator[Span]:
+        span = Span(trace, name, parent_id, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.set("error", type(e).__name__)
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            _current_span.reset(token)
+            trace.spans.append(span)
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        return list(self.finished)[-limit:][::-1]
@@ -0,0 +1,304 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from app.clients import stripe_api
+from app.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_EVENT_ORDER = {
+    "customer.subscription.created": 0,
+    "customer.subscription.updated": 1,
+    "customer.subscription.deleted": 2,
+}
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    # Produces a Stripe-Signature header value, so tests can post locally
+    # signed fake events through stripe.Webhook.construct_event.
+    timestamp = timestamp if timestamp is not None else int(time.time())
+    signed = f"{timestamp}.".encode("utf-8") + payload
+    signature = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def _ordering_key(event: dict) -> str:
+    obj = event["data"]["object"]
+    return obj.get("customer") or obj.get("id") or event["id"]
+
+
+def _stripe_time(timestamp: int) -> datetime:
+    # Stripe sends Unix timestamps; the store compares naive UTC datetimes
+    # (datetime.utcnow()), so they must not be read as local time.
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _current_period_end(subscription: dict) -> Optional[int]:
+    if subscription.get("current_period_end"):
+        return subscription["current_period_end"]
+    items = subscription.get("items", {}).get("data", [])
+    if items and items[0].get("current_period_end"):
+        return items[0]["current_period_end"]
+    return None
+
+
+def _plan(subscription: dict) -> str:
+    # An explicit "plan" in the subscription metadata wins; otherwise the
+    # price's lookup key (e.g. "pro") names it.
+    plan = (subscription.get("metadata") or {}).get("plan")
+    if plan:
+        return plan
+    items = subscription.get("items", {}).get("data", [])
+    if items and (items[0].get("price") or {}).get("lookup_key"):
+        return items[0]["price"]["lookup_key"]
+    return "standard"
+
+
+@dataclass
+class WebhookQueueStats:
+    received: int = 0
+    duplicates: int = 0
+    processed: int = 0
+    stale_skipped: int = 0
+    parked: int = 0
+    recovered: int = 0
+    pruned: int = 0
+    failed: int = 0
+    last_lag_seconds: float = 0.0
+    max_lag_seconds: float = 0.0
+
+
+class WebhookQueue:
+    def __init__(
+        self,
+        repository,
+        workers: int = 4,
+        max_parked_customers: int = 1000,
+        claim_timeout: float = 300.0,
+        dedup_window: float = 259200.0,
+        on_user_changed: Optional[Callable[[str], None]] = None,
+    ):
+        self.repository = repository
+        self.on_user_changed = on_user_changed
+        self.stats = WebhookQueueStats()
+        self.max_parked_customers = max_parked_customers
+        self.claim_timeout = claim_timeout
+        self.dedup_window = dedup_window
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(max(1, workers))]
+        self._tasks: List[asyncio.Task] = []
+        self._parked: "OrderedDict[str, List[dict]]" = OrderedDict()
+
+    async def submit(self, event: dict, payload: str) -> bool:
+        self.stats.received += 1
+        if not await self.repository.record_webhook_event(event["id"], event["type"], payload):
+            self.stats.duplicates += 1
+            return False
+        self._enqueue(event)
+        return True
+
+    def _enqueue(self, event: dict):
+        # Events for the same customer always land on the same worker so they
+        # are applied in arrival order relative to each other.
+        shard = zlib.crc32(_ordering_key(event).encode("utf-8")) % len(self._queues)
+        self._queues[shard].put_nowait(event)
+
+    def _park(self, customer_id: str, event: dict):
+        parked = self._parked.setdefault(customer_id, [])
+        if any(waiting["id"] == event["id"] for waiting in parked):
+            # Reclaimed by recover() while it was already waiting here.
+            return
+        parked.append(event)
+        self._parked.move_to_end(customer_id)
+        self.stats.parked += 1
+        while len(self._parked) > self.max_parked_customers:
+            dropped_customer, dropped = self._parked.popitem(last=False)
+            logger.warning("Dropped %d parked webhook events for Stripe customer %s", len(dropped), dropped_customer)
+
+    def _release_parked(self, customer_id: str):
+        for event in self._parked.pop(customer_id, []):
+            self._enqueue(event)
+
+    def _user_changed(self, user_id: str):
+        if self.on_user_changed is not None:
+            self.on_user_changed(user_id)
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            event = await queue.get()
+            try:
+                if await self.apply(event):
+                    await self.repository.mark_webhook_event_processed(event["id"])
+                    self.stats.processed += 1
+                    lag = max(0.0, time.time() - event.get("created", time.time()))
+                    self.stats.last_lag_seconds = lag
+                    self.stats.max_lag_seconds = max(self.stats.max_lag_seconds, lag)
+            except Exception as e:
+                self.stats.failed += 1
+                logger.error(
+                    "Error processing webhook event %s %s: %s", event["type"], event["id"], e,
+                    exc_info=True, extra={"event_id": event["id"]},
+                )
+            finally:
+                queue.task_done()
+
+    async def apply(self, event: dict) -> bool:
+        event_type = event["type"]
+        if event_type == "checkout.session.completed":
+            await self._checkout_session_completed(event["data"]["object"])
+            return True
+        if event_type in SUBSCRIPTION_EVENT_ORDER:
+            return await self._subscription_event(event)
+        return True
+
+    async def _checkout_session_completed(self, session: dict):
+        customer_id = session["customer"]
+        subscription_id = session.get("subscription")
+
+        customer_email = session.get("customer_email") or session.get("customer_details", {}).get("email")
+        logger.debug("Processing checkout.session.completed for %s, subscription %s", customer_email, subscription_id)
+
+        if not customer_email:
+            logger.warning("No customer email in checkout session %s", session.get("id"))
+            return
+
+        user = await self.repository.get_user_by_email(customer_email)
+        if not user:
+            logger.warning("No user found for email %s", customer_email)
+            return
+
+        await self.repository.update_user_stripe_customer(user.id, customer_id)
+        self._user_changed(user.id)
+        logger.info("Updated user %s with Stripe customer %s", user.id, customer_id)
+
+        if subscription_id:
+            try:
+                with timed("stripe", "subscription.retrieve"):
+                    subscription = await asyncio.to_thread(stripe_api().Subscription.retrieve, subscription_id)
+                await self.repository.create_subscription(
+                    user_id=user.id,
+                    stripe_subscription_id=subscription_id,
+                    status=subscription["status"],
+                    current_period_end=_stripe_time(_current_period_end(subscription)),
+                    plan=_plan(subscription)
+                )
+                self._user_changed(user.id)
+                logger.info("Created subscription %s for user %s from checkout.session.completed", subscription_id, user.id)
+            except Exception as e:
+                logger.error("Failed to retrieve/create subscription %s: %s", subscription_id, e, exc_info=True)
+        else:
+            logger.warning("No subscription ID in checkout session for user %s", user.id)
+
+        self._release_parked(customer_id)
+
+    async def _subscription_event(self, event: dict) -> bool:
+        event_type = event["type"]
+        subscription = event["data"]["object"]
+        customer_id = subscription["customer"]
+        subscription_id = subscription["id"]
+        logger.debug("Processing %s for customer %s", event_type, customer_id)
+
+        user = await self.repository.get_user_by_stripe_customer_id(customer_id)
+        if not user:
+            # The customer is linked to a user by checkout.session.completed,
+            # which Stripe may deliver after the subscription events.
+            logger.warning("No user found for Stripe customer %s; parking %s", customer_id, event_type)
+            self._park(customer_id, event)
+            return False
+
+        current_period_end = _current_period_end(subscription)
+        if not current_period_end:
+            raise ValueError("current_period_end field missing from subscription")
+
+        # The newest applied version is kept in the store, so the check holds
+        # across workers and restarts.
+        version = (event.get("created", 0), SUBSCRIPTION_EVENT_ORDER[event_type])
+        if not await self.repository.claim_subscription_event(subscription_id, version):
+            self.stats.stale_skipped += 1
+            logger.info("Skipping stale %s %s for subscription %s", event_type, event["id"], subscription_id)
+            return True
+
+        status = "canceled" if event_type == "customer.subscription.deleted" else subscription["status"]
+        existing_subscription = await self.repository.get_subscription_by_user_id(user.id)
+        if existing_subscription and existing_subscription.stripe_subscription_id != subscription_id:
+            # A late event about a previous subscription must not replace the
+            # user's current one unless it is itself live.
+            if status not in ("active", "trialing"):
+                logger.info("Ignoring %s for superseded subscription %s", event_type, subscription_id)
+                return True
+            existing_subscription = None
+
+        if existing_subscription:
+            await self.repository.update_subscription(
+                user_id=user.id,
+                status=status,
+                current_period_end=_stripe_time(current_period_end),
+                plan=_plan(subscription)
+            )
+        else:
+            await self.repository.create_subscription(
+                user_id=user.id,
+                stripe_subscription_id=subscription_id,
+                status=status,
+                current_period_end=_stripe_time(current_period_end),
+                plan=_plan(subscription)
+            )
+        self._user_changed(user.id)
+        logger.info("Applied %s for user %s: %s is %s", event_type, user.id, subscription_id, status)
+        return True
+
+    async def recover(self) -> int:
+        # Takes over unprocessed events that no worker has claimed within
+        # claim_timeout: those left by a crash or by a worker that never
+        # finished them. Each one is claimed by exactly one worker.
+        stale_before = datetime.utcnow() - timedelta(seconds=self.claim_timeout)
+        events = await self.repository.claim_pending_webhook_events(stale_before)
+        for event in events:
+            self._enqueue(event)
+        self.stats.recovered += len(events)
+        return len(events)
+
+    async def prune(self) -> int:
+        # Processed events only matter for spotting Stripe's retries, which
+        # stop after the dedup window.
+        pruned = await self.repository.prune_webhook_events(datetime.utcnow() - timedelta(seconds=self.dedup_window))
+        self.stats.pruned += pruned
+        return pruned
+
+    async def _recover_periodically(self):
+        while True:
+            await asyncio.sleep(self.claim_timeout)
+            try:
+                await self.recover()
+                await self.prune()
+            except Exception as e:
+                logger.error("Recovering pending webhook events failed: %s", e, exc_info=True)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+            if self.claim_timeout > 0:
+                self._tasks.append(asyncio.create_task(self._recover_periodically()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self):
+        for queue in self._queues:
+            await queue.join()
+
+    def metrics(self) -> dict:
+        data = asdict(self.stats)
+        data["backlog"] = sum(queue.qsize() for queue in self._queues)
+        data["parked_customers"] = len(self._parked)
+        return data
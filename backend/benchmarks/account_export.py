@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app import database
+from app.account_export import export_accounts
+from app.repository import MemoryRepository
+
+
+def populate(users: int):
+    now = datetime.utcnow()
+    for i in range(users):
+        user = database.create_user(f"user{i}@example.com", "x")
+        if i % 4:
+            status = "active" if i % 5 else "canceled"
+            database.create_subscription(user.id, f"sub_{i}", status, now + timedelta(hours=i % (24 * 60)))
+
+
+def full_snapshot() -> int:
+    # What /api/debug/database-state did: everything in lists, one document.
+    users = list(database.users_db.values())
+    subscriptions = list(database.subscriptions_db.values())
+    body = json.dumps({
+        "users": [
+            {"id": u.id, "email": u.email, "stripe_customer_id": u.stripe_customer_id, "created_at": u.created_at.isoformat()}
+            for u in users
+        ],
+        "subscriptions": [
+            {"user_id": s.user_id, "stripe_subscription_id": s.stripe_subscription_id, "status": s.status,
+             "current_period_end": s.current_period_end.isoformat(), "created_at": s.created_at.isoformat()}
+            for s in subscriptions
+        ],
+        "email_to_user_id_mapping": {u.email: u.id for u in users},
+    }).encode()
+    return len(body)
+
+
+async def streamed(page_size: int) -> int:
+    repository = MemoryRepository()
+    sent = 0
+    async for chunk in export_accounts(repository, await repository.list_accounts_page(None, page_size), page_size):
+        sent += len(chunk)
+    return sent
+
+
+def measure(run) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 2), "peak_mb": round(peak / 2**20, 1), "bytes": size}
+
+
+def scanned_stats(now: datetime, days: int) -> dict:
+    statuses = {}
+    expiring = 0
+    for subscription in database.subscriptions_db.values():
+        statuses[subscription.status] = statuses.get(subscription.status, 0) + 1
+        if subscription.status in database.LIVE_STATUSES and now <= subscription.current_period_end < now + timedelta(days=days):
+            expiring += 1
+    return {"users": len(database.users_db), "subscriptions": statuses, "expiring": expiring}
+
+
+def per_call_us(call, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return round((time.perf_counter() - started) / calls * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of a full JSON dump vs the NDJSON export, and counter vs scan stats.")
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    populate(args.users)
+    now = datetime.utcnow()
+    assert database.account_stats(now, args.days) == scanned_stats(now, args.days)
+    results = {
+        "users": args.users,
+        "full_snapshot": measure(full_snapshot),
+        "ndjson_export": measure(lambda: asyncio.run(streamed(args.page_size))),
+        "stats_us": {
+            "scan": per_call_us(lambda: scanned_stats(now, args.days), 3),
+            "counters": per_call_us(lambda: database.account_stats(now, args.days), 20),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
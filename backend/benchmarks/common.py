@@ -0,0 +1,54 @@
+import os
+import tempfile
+from email.utils import formatdate
+from xml.sax.saxutils import escape
+
+WORDS = (
+    "consumer duty firms conduct authority market abuse anti money laundering "
+    "redress enforcement fine guidance consultation payments crypto pensions "
+    "mortgage insurance disclosure governance remuneration prudential liquidity"
+).split()
+
+
+def sample_feed_xml(items: int = 20, offset: int = 0) -> str:
+    entries = []
+    for i in range(offset, offset + items):
+        words = " ".join(WORDS[(i + j) % len(WORDS)] for j in range(40))
+        entries.append(
+            "<item>"
+            f"<title>FCA notice {i}: {escape(WORDS[i % len(WORDS)])} update</title>"
+            f"<link>https://www.fca.org.uk/news/notice-{i}</link>"
+            f"<guid>https://www.fca.org.uk/news/notice-{i}</guid>"
+            f"<pubDate>{formatdate(1_700_000_000 + i * 3600, usegmt=True)}</pubDate>"
+            f"<description>{escape(words)}</description>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0"?><rss version="2.0"><channel><title>FCA news</title>'
+        + "".join(entries)
+        + "</channel></rss>"
+    )
+
+
+def write_sample_feed(items: int = 20) -> str:
+    fd, path = tempfile.mkstemp(suffix=".xml")
+    with os.fdopen(fd, "w") as f:
+        f.write(sample_feed_xml(items))
+    return path
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def latency_summary(latencies) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
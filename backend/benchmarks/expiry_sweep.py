@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+from app import database
+from app.clients import stripe_api
+from app.expiry_sweeper import ExpirySweeper
+from app.repository import MemoryRepository
+from benchmarks.fakes import BackgroundServer, stripe_app, stripe_subscription
+
+
+def reset():
+    for table in (database.users_db, database.subscriptions_db, database.email_to_user_id,
+                  database.stripe_customer_to_user_id, database.stripe_subscription_to_user_id,
+                  database.subscription_status_counts, database.expiry_index):
+        table.clear()
+    database.user_order.clear()
+    database.expiry_days.clear()
+
+
+def populate(stub, subscriptions: int, overdue: int):
+    # The overdue ones lost their last webhook: a third renewed in Stripe, a
+    # third were canceled, and a third no longer exist there.
+    now = datetime.utcnow()
+    stub.state.subscriptions.clear()
+    stub.state.missing.clear()
+    for i in range(subscriptions):
+        user = database.create_user(f"user{i}@example.com", "x")
+        subscription_id = f"sub_{i}"
+        if i < overdue:
+            period_end = now - timedelta(days=1 + i % 30)
+            if i % 3 == 1:
+                canceled = stripe_subscription(subscription_id, f"cus_{i}", "canceled")
+                canceled["current_period_end"] = int(period_end.timestamp())
+                stub.state.subscriptions[subscription_id] = canceled
+            elif i % 3 == 2:
+                stub.state.missing.add(subscription_id)
+        else:
+            period_end = now + timedelta(days=1 + i % 365)
+        database.create_subscription(user.id, subscription_id, "active", period_end)
+
+
+def scan_for_due(before: datetime) -> int:
+    return sum(
+        1 for subscription in database.subscriptions_db.values()
+        if subscription.status in database.LIVE_STATUSES and subscription.current_period_end < before
+    )
+
+
+async def sweep(stub, concurrency: int, batch_size: int) -> dict:
+    sweeper = ExpirySweeper(MemoryRepository(), grace=0, batch_size=batch_size, max_per_tick=batch_size * 5, concurrency=concurrency)
+    requests = stub.state.requests
+    ticks = []
+    started = time.perf_counter()
+    while await sweeper.sweep_once():
+        ticks.append(sweeper.stats.last_tick_processed)
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "per_second": round(sum(ticks) / elapsed, 1),
+        "processed_per_tick": ticks,
+        "stripe_requests": stub.state.requests - requests,
+        **{key: value for key, value in sweeper.metrics().items() if key in ("renewed", "ended", "unchanged", "errors")},
+        "still_due": scan_for_due(datetime.utcnow()),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Finding due subscriptions by index vs scan, and sweep throughput against a Stripe stub.")
+    parser.add_argument("--subscriptions", type=int, default=200_000)
+    parser.add_argument("--overdue", type=int, default=600)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--stripe-latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    stub = stripe_app(latency=args.stripe_latency)
+    server = BackgroundServer(stub).start()
+    stripe = stripe_api()
+    stripe.api_key = "sk_test_sweep"
+    stripe.api_base = server.url
+    results = {"subscriptions": args.subscriptions, "overdue": args.overdue, "sweeps": []}
+    try:
+        for concurrency in args.concurrency:
+            reset()
+            populate(stub, args.subscriptions, args.overdue)
+            now = datetime.utcnow()
+            if "find_due_ms" not in results:
+                started = time.perf_counter()
+                scanned = scan_for_due(now)
+                scan_seconds = time.perf_counter() - started
+                started = time.perf_counter()
+                indexed = len(database.due_subscriptions(now, args.subscriptions))
+                index_seconds = time.perf_counter() - started
+                assert scanned == indexed == args.overdue
+                results["find_due_ms"] = {"scan": round(scan_seconds * 1000, 2), "index": round(index_seconds * 1000, 2)}
+            results["sweeps"].append(await sweep(stub, concurrency, args.batch_size))
+        results["consistency_problems"] = len(database.check_index_consistency())
+    finally:
+        server.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
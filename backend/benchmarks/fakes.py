@@ -0,0 +1,227 @@
+import asyncio
+import bisect
+import hashlib
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from benchmarks.common import sample_feed_xml
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BackgroundServer:
+    def __init__(self, app, port: int = 0):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self) -> "BackgroundServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def rss_app(items: int = 20) -> FastAPI:
+    app = FastAPI()
+    app.state.feed = sample_feed_xml(items)
+    app.state.requests = 0
+
+    @app.get("/news/rss.xml")
+    async def feed(request: Request):
+        app.state.requests += 1
+        etag = '"' + hashlib.sha256(app.state.feed.encode("utf-8")).hexdigest()[:16] + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(app.state.feed, media_type="application/rss+xml", headers={"ETag": etag})
+
+    return app
+
+
+def feeds_app(sources: int, items: int = 20, overlap: int = 5, latency: float = 0.2) -> FastAPI:
+    # Many regulator feeds on one host; neighbouring feeds cross-post
+    # `overlap` items, as PRA notices also appear in Bank of England feeds.
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.requests = 0
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    feeds = [sample_feed_xml(items, offset=n * (items - overlap)) for n in range(sources)]
+
+    @app.get("/feeds/{number}.xml")
+    async def feed(number: int):
+        app.state.requests += 1
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            await asyncio.sleep(app.state.latency)
+        finally:
+            app.state.in_flight -= 1
+        return Response(feeds[number], media_type="application/rss+xml")
+
+    return app
+
+
+def openai_app(latency: float = 0.5) -> FastAPI:
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        await asyncio.sleep(app.state.latency)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "The FCA published a notice. Firms should review it."},
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+        }
+
+    return app
+
+
+def stripe_subscription(subscription_id: str, customer_id: str, status: str = "active") -> dict:
+    period_end = int(time.time()) + 30 * 86400
+    return {
+        "id": subscription_id,
+        "object": "subscription",
+        "customer": customer_id,
+        "status": status,
+        "created": int(time.time()),
+        "current_period_end": period_end,
+        "items": {"object": "list", "data": [{"id": f"si_{subscription_id}", "current_period_end": period_end}]},
+    }
+
+
+def stripe_customer(customer_id: str, email: str, created: Optional[int] = None) -> dict:
+    return {"id": customer_id, "object": "customer", "email": email, "created": created or int(time.time())}
+
+
+def stripe_error(status_code: int, error_type: str, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"error": {"type": error_type, "message": message}})
+
+
+def stripe_app(latency: float = 0.0, rate_limit: int = 0) -> FastAPI:
+    # rate_limit caps requests per wall-clock second, answering the excess
+    # with Stripe's 429 rate_limit_error.
+    app = FastAPI()
+    app.state.customers = {}
+    app.state.subscriptions = {}
+    app.state.missing = set()
+    app.state.requests = 0
+    app.state.rate_limited = 0
+    app.state.listings = {}
+    window = [0, 0]
+
+    @app.middleware("http")
+    async def count(request: Request, call_next):
+        app.state.requests += 1
+        if rate_limit:
+            second = int(time.time())
+            if window[0] != second:
+                window[:] = [second, 0]
+            window[1] += 1
+            if window[1] > rate_limit:
+                app.state.rate_limited += 1
+                return stripe_error(429, "rate_limit_error", "Too many requests hit the API too quickly.")
+        if latency:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    def listing(kind: str):
+        # Newest first, as Stripe lists; rebuilt only when objects were added,
+        # so populate the stub before paging through it.
+        objects = getattr(app.state, kind)
+        cached = app.state.listings.get(kind)
+        if cached is None or cached[0] != len(objects):
+            ordered = sorted(objects.values(), key=lambda o: (o["created"], o["id"]), reverse=True)
+            cached = (len(objects), ordered, [-o["created"] for o in ordered], {o["id"]: i for i, o in enumerate(ordered)})
+            app.state.listings[kind] = cached
+        return cached[1:]
+
+    def list_page(kind: str, request: Request, matches=lambda obj: True) -> dict:
+        params = request.query_params
+        limit = min(int(params.get("limit", 10)), 100)
+        gte = int(params.get("created[gte]", 0))
+        lt = int(params.get("created[lt]", 2 ** 62))
+        ordered, keys, positions = listing(kind)
+        after = params.get("starting_after")
+        position = positions[after] + 1 if after else bisect.bisect_right(keys, -lt)
+        page = []
+        has_more = False
+        while position < len(ordered) and ordered[position]["created"] >= gte:
+            obj = ordered[position]
+            position += 1
+            if not matches(obj):
+                continue
+            if len(page) == limit:
+                has_more = True
+                break
+            page.append(obj)
+        # The Stripe SDK sends lists as expand[0]=..., expand[1]=...
+        if "data.customer" in [value for key, value in params.multi_items() if key.startswith("expand[")]:
+            page = [{**obj, "customer": app.state.customers.get(obj["customer"], obj["customer"])} for obj in page]
+        return {"object": "list", "url": f"/v1/{kind}", "has_more": has_more, "data": page}
+
+    @app.get("/v1/customers")
+    async def list_customers(request: Request):
+        return list_page("customers", request)
+
+    @app.get("/v1/subscriptions")
+    async def list_subscriptions(request: Request):
+        status = request.query_params.get("status")
+        if status in (None, "all"):
+            return list_page("subscriptions", request)
+        return list_page("subscriptions", request, lambda obj: obj["status"] == status)
+
+    @app.get("/v1/subscriptions/{subscription_id}")
+    async def retrieve_subscription(subscription_id: str):
+        if subscription_id in app.state.missing:
+            return stripe_error(404, "invalid_request_error", f"No such subscription: '{subscription_id}'")
+        return app.state.subscriptions.get(subscription_id) or stripe_subscription(subscription_id, "cus_unknown")
+
+    @app.post("/v1/checkout/sessions")
+    async def create_checkout_session():
+        session_id = f"cs_{uuid.uuid4().hex}"
+        return {"id": session_id, "object": "checkout.session", "url": f"https://checkout.stripe.test/{session_id}"}
+
+    @app.post("/v1/billing_portal/sessions")
+    async def create_portal_session():
+        session_id = f"bps_{uuid.uuid4().hex}"
+        return {"id": session_id, "object": "billing_portal.session", "url": f"https://billing.stripe.test/{session_id}"}
+
+    return app
+
+
+def stripe_event(event_type: str, obj: dict) -> dict:
+    return {
+        "id": f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {"object": obj},
+    }
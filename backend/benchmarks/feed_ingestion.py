@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import json
+import time
+
+from typing import Optional
+
+from app.feed_cache import FeedFetcher, FeedResponse
+from app.feed_registry import FeedSource
+from app.ingestion import IngestionEngine, entry_to_article, load_parser
+from benchmarks.common import latency_summary
+from benchmarks.fakes import BackgroundServer, feeds_app
+
+
+def feedparser_fetcher(url: str) -> FeedFetcher:
+    # The pre-engine fetcher: feedparser downloads and parses on a thread,
+    # with no per-host cap and no worker processes.
+    async def fetch(etag: Optional[str], modified: Optional[str]) -> FeedResponse:
+        import feedparser
+
+        feed = await asyncio.to_thread(feedparser.parse, url, etag=etag, modified=modified)
+        if feed.get("status") == 304:
+            return FeedResponse(etag=etag, modified=modified, not_modified=True)
+        if feed.get("bozo") and not feed.entries:
+            raise feed.get("bozo_exception") or ValueError(f"Could not parse feed {url}")
+        return FeedResponse(
+            entries=feed.entries,
+            etag=feed.get("etag"),
+            modified=feed.get("modified"),
+        )
+    return fetch
+
+
+class LoopLag:
+    # Samples how late a 5 ms timer fires: the delay every other request on
+    # the event loop would see.
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - expected))
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def summary(self) -> dict:
+        data = latency_summary(self.lags)
+        data["max_ms"] = round(max(self.lags, default=0.0) * 1000, 3)
+        return data
+
+
+async def serial(sources) -> dict:
+    # One source after another, as fetch_fca_news would have done repeated
+    # once per regulator.
+    articles = []
+    with LoopLag() as lag:
+        started = time.perf_counter()
+        for source in sources:
+            response = await feedparser_fetcher(source.url)(None, None)
+            articles.extend(entry_to_article(entry, source.name) for entry in response.entries[:source.max_items])
+        elapsed = time.perf_counter() - started
+    return {"seconds": round(elapsed, 3), "articles": len(articles), "loop_lag": lag.summary()}
+
+
+async def engine(sources, stub_apps, per_host: int, parse_workers: int) -> dict:
+    for stub_app in stub_apps:
+        stub_app.state.max_in_flight = 0
+    ingestion = IngestionEngine(sources, max_per_host=per_host, parse_workers=parse_workers)
+    try:
+        # Start the worker processes outside the timed section; spawned
+        # workers take a moment to import feedparser.
+        if parse_workers:
+            await asyncio.get_running_loop().run_in_executor(ingestion._executor(), load_parser)
+        with LoopLag() as lag:
+            started = time.perf_counter()
+            articles = await ingestion.get_articles()
+            elapsed = time.perf_counter() - started
+        await asyncio.gather(*(cache.refresh() for cache in ingestion.caches.values()))
+        metrics = ingestion.metrics()
+    finally:
+        await ingestion.stop()
+    per_source = metrics["sources"].values()
+    return {
+        "parse_workers": parse_workers,
+        "seconds": round(elapsed, 3),
+        "unique_articles": len(articles),
+        "duplicates_dropped": metrics["duplicates"],
+        "max_in_flight_per_host": max(stub_app.state.max_in_flight for stub_app in stub_apps),
+        "bytes": sum(source["bytes_fetched"] for source in per_source),
+        "parse_seconds": round(sum(source["total_parse_seconds"] for source in per_source), 3),
+        "loop_lag": lag.summary(),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Ingest many regulator feeds serially and through the ingestion engine.")
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--feeds-per-host", type=int, default=10)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--per-host", type=int, default=2)
+    parser.add_argument("--parse-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    stub_apps = [feeds_app(args.feeds_per_host, args.items, args.overlap, args.latency) for _ in range(args.hosts)]
+    stubs = [BackgroundServer(stub_app).start() for stub_app in stub_apps]
+    sources = [
+        FeedSource(f"host{h}-feed{n}", f"{stub.url}/feeds/{n}.xml", max_items=args.items)
+        for h, stub in enumerate(stubs)
+        for n in range(args.feeds_per_host)
+    ]
+    try:
+        results = {
+            "sources": len(sources),
+            "serial": await serial(sources),
+            "engine_threads": await engine(sources, stub_apps, args.per_host, 0),
+            "engine_processes": await engine(sources, stub_apps, args.per_host, args.parse_workers),
+        }
+    finally:
+        for stub in stubs:
+            stub.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
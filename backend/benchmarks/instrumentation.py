@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import write_sample_feed
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["FCA_FEED_URL"] = write_sample_feed()
+
+from app import auth, database
+from app.article_archive import article_id
+from app.log_config import DeferredQueueHandler, JsonFormatter
+from app.main import app
+from app.metrics import metrics_registry, tracer
+from app.models import Article
+from app.services import article_archive
+
+MODES = {
+    "off": (False, 0.0),
+    "metrics": (True, 0.0),
+    "metrics_trace_1pct": (True, 0.01),
+    "metrics_trace_all": (True, 1.0),
+}
+
+
+async def asgi_get(path: str, headers: list) -> int:
+    # Drives the ASGI app directly so the client's own cost does not swamp
+    # the few microseconds being measured.
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": headers, "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    status = [0]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status[0] = message["status"]
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def per_request_us(path: str, headers: list, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        await asgi_get(path, headers)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def per_call_ns(call, calls: int = 200_000) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return round((time.perf_counter() - started) / calls * 1e9, 1)
+
+
+def logging_costs() -> dict:
+    # Cost on the calling thread, which is the event loop in the app.
+    logger = logging.getLogger("benchmark.instrumentation")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    event = {"type": "customer.subscription.updated", "id": "evt_123"}
+    results = {
+        "debug_disabled_fstring_ns": per_call_ns(lambda: logger.debug(f"Processing {event['type']} for {event['id']}")),
+        "debug_disabled_lazy_ns": per_call_ns(lambda: logger.debug("Processing %s for %s", event["type"], event["id"])),
+    }
+    with tempfile.TemporaryFile("w") as sink:
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(JsonFormatter())
+        logger.handlers[:] = [handler]
+        results["info_sync_json_handler_ns"] = per_call_ns(lambda: logger.info("Applied %s", event["id"]), 50_000)
+    logger.handlers[:] = [DeferredQueueHandler(queue.SimpleQueue())]
+    results["info_queue_handler_ns"] = per_call_ns(lambda: logger.info("Applied %s", event["id"]), 50_000)
+    logger.handlers[:] = []
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-request cost of the metrics middleware, tracing and logging.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    await article_archive.ingest([
+        Article(
+            id=article_id(f"https://www.fca.org.uk/news/instrumented-{i}"),
+            title=f"FCA notice {i}",
+            link=f"https://www.fca.org.uk/news/instrumented-{i}",
+            published="",
+            published_at=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=i),
+            summary="Consumer duty update",
+        )
+        for i in range(50)
+    ])
+    user = database.create_user("bench@example.com", "x")
+    database.create_subscription(user.id, "sub_bench", "active", datetime.utcnow() + timedelta(days=30))
+    token = auth.create_access_token({"sub": user.email}, timedelta(minutes=30))
+    news_headers = [(b"authorization", f"Bearer {token}".encode())]
+    assert await asgi_get("/api/news", news_headers) == 200
+
+    routes = {"/healthz": [], "/api/news": news_headers}
+    # Modes are interleaved within each repeat so drift (GC, CPU frequency)
+    # lands on all of them alike.
+    samples = {mode: {path: [] for path in routes} for mode in MODES}
+    for _ in range(args.repeats):
+        for mode, (enabled, sample_rate) in MODES.items():
+            metrics_registry.enabled = enabled
+            tracer.sample_rate = sample_rate
+            for path, headers in routes.items():
+                samples[mode][path].append(await per_request_us(path, headers, args.requests))
+    results = {
+        mode: {path: round(statistics.median(runs), 2) for path, runs in by_path.items()}
+        for mode, by_path in samples.items()
+    }
+    for path in routes:
+        baseline = results["off"][path]
+        results[f"overhead_us {path}"] = {mode: round(results[mode][path] - baseline, 2) for mode in MODES if mode != "off"}
+
+    started = time.perf_counter()
+    body = metrics_registry.render()
+    results["scrape"] = {"ms": round((time.perf_counter() - started) * 1000, 3), "lines": body.count("\n")}
+    results["logging"] = logging_costs()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
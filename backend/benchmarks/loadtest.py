@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from app.webhooks import sign_payload
+from benchmarks.common import latency_summary
+from benchmarks.fakes import (
+    BackgroundServer,
+    free_port,
+    openai_app,
+    rss_app,
+    stripe_app,
+    stripe_event,
+    stripe_subscription,
+)
+
+WEBHOOK_SECRET = "whsec_loadtest"
+DEFAULT_MIX = "news=50,summary=15,me=10,login=10,register=5,webhook=10"
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, stripe_stub, users: int, articles: int):
+        self.client = client
+        self.stripe_stub = stripe_stub
+        self.users = users
+        self.articles = articles
+        self.accounts = []
+        self.latencies = {}
+        self.errors = {}
+
+    async def timed(self, name: str, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    async def post_webhook(self, event: dict) -> httpx.Response:
+        body = json.dumps(event).encode("utf-8")
+        return await self.client.post(
+            "/api/stripe/webhook", content=body, headers={"stripe-signature": sign_payload(body, WEBHOOK_SECRET)}
+        )
+
+    async def subscribe(self, email: str):
+        customer_id = f"cus_{uuid.uuid4().hex[:14]}"
+        subscription_id = f"sub_{uuid.uuid4().hex[:14]}"
+        self.stripe_stub.state.subscriptions[subscription_id] = stripe_subscription(subscription_id, customer_id)
+        session = {"id": f"cs_{uuid.uuid4().hex}", "customer": customer_id, "subscription": subscription_id, "customer_email": email}
+        await self.post_webhook(stripe_event("checkout.session.completed", session))
+        return customer_id, subscription_id
+
+    async def setup(self):
+        for i in range(self.users):
+            email = f"load-{i}-{uuid.uuid4().hex[:6]}@example.com"
+            password = "load-test-password"
+            response = await self.client.post("/api/auth/register", json={"email": email, "password": password})
+            response.raise_for_status()
+            customer_id, subscription_id = await self.subscribe(email)
+            self.accounts.append({
+                "email": email,
+                "password": password,
+                "token": response.json()["access_token"],
+                "customer_id": customer_id,
+                "subscription_id": subscription_id,
+            })
+        # Give the webhook workers a moment to apply the checkout events.
+        for _ in range(100):
+            response = await self.client.get("/api/news", headers=self.headers(self.accounts[-1]))
+            if response.status_code == 200:
+                return
+            await asyncio.sleep(0.1)
+        raise RuntimeError(f"Subscriptions never became active: {response.status_code} {response.text}")
+
+    def headers(self, account: dict) -> dict:
+        return {"Authorization": f"Bearer {account['token']}"}
+
+    def request(self, name: str):
+        account = random.choice(self.accounts)
+        if name == "news":
+            return self.client.get("/api/news", headers=self.headers(account))
+        if name == "summary":
+            return self.client.get(f"/api/news/{random.randrange(self.articles)}/summary", headers=self.headers(account))
+        if name == "me":
+            return self.client.get("/api/auth/me", headers=self.headers(account))
+        if name == "login":
+            return self.client.post("/api/auth/login", json={"email": account["email"], "password": account["password"]})
+        if name == "register":
+            email = f"new-{uuid.uuid4().hex}@example.com"
+            return self.client.post("/api/auth/register", json={"email": email, "password": "load-test-password"})
+        if name == "webhook":
+            subscription = stripe_subscription(account["subscription_id"], account["customer_id"])
+            return self.post_webhook(stripe_event("customer.subscription.updated", subscription))
+        raise ValueError(f"Unknown request type {name}")
+
+    async def run(self, mix: dict, concurrency: int, duration: float) -> float:
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                name = random.choices(names, weights)[0]
+                await self.timed(name, self.request(name))
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, latencies in sorted(self.latencies.items()):
+            summary = latency_summary(latencies)
+            summary["throughput_rps"] = round(len(latencies) / elapsed, 1)
+            summary["errors"] = self.errors.get(name, 0)
+            endpoints[name] = summary
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {"elapsed_seconds": round(elapsed, 2), "total_rps": round(total / elapsed, 1), "endpoints": endpoints}
+
+
+def boot_app(port: int, env: dict) -> subprocess.Popen:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir,
+        env={**os.environ, **env},
+    )
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/healthz")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("app did not become healthy")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Drive app.main:app against local FCA, OpenAI and Stripe stand-ins.")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma separated name=weight pairs")
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    rss_stub_app = rss_app(args.articles)
+    openai_stub_app = openai_app(args.openai_latency)
+    rss = BackgroundServer(rss_stub_app).start()
+    openai_stub = BackgroundServer(openai_stub_app).start()
+    stripe_stub_app = stripe_app()
+    stripe_stub = BackgroundServer(stripe_stub_app).start()
+
+    port = free_port()
+    process = boot_app(port, {
+        "FCA_FEED_URL": f"{rss.url}/news/rss.xml",
+        "OPENAI_API_KEY": "sk-loadtest",
+        "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+        "STRIPE_SECRET_KEY": "sk_test_loadtest",
+        "STRIPE_API_BASE": stripe_stub.url,
+        "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "RATE_LIMITS_ENABLED": "0",
+    })
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            await wait_until_healthy(client)
+            load_test = LoadTest(client, stripe_stub_app, args.users, args.articles)
+            await load_test.setup()
+            elapsed = await load_test.run(parse_mix(args.mix), args.concurrency, args.duration)
+            results = load_test.report(elapsed)
+            results["config"] = vars(args)
+            results["upstream_requests"] = {
+                "rss": rss_stub_app.state.requests,
+                "openai": openai_stub_app.state.requests,
+                "stripe": stripe_stub_app.state.requests,
+            }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        for server in (rss, openai_stub, stripe_stub):
+            server.stop()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
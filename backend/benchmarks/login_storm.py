@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import latency_summary, write_sample_feed
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["FCA_FEED_URL"] = write_sample_feed()
+# The storm is one account from one address; measure bcrypt, not the limiter.
+os.environ["RATE_LIMITS_ENABLED"] = "0"
+
+import httpx
+
+from app import auth, database
+from app.main import app
+from app.password_pool import password_pool
+
+
+async def probe(client: httpx.AsyncClient, path: str, headers: dict, stop: asyncio.Event, latencies: list):
+    # Latency is measured from when the probe was due, so time spent waiting
+    # for a blocked event loop to run it is counted too.
+    while not stop.is_set():
+        due = time.perf_counter() + 0.01
+        await asyncio.sleep(0.01)
+        await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - due)
+
+
+async def storm(client: httpx.AsyncClient, logins: int, concurrency: int) -> dict:
+    statuses = {}
+    remaining = [logins]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            response = await client.post(
+                "/api/auth/login", json={"email": "storm@example.com", "password": "correct horse"}
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return statuses
+
+
+async def measure(client: httpx.AsyncClient, headers: dict, logins: int, concurrency: int) -> dict:
+    stop = asyncio.Event()
+    health, news = [], []
+    probes = [
+        asyncio.create_task(probe(client, "/healthz", {}, stop, health)),
+        asyncio.create_task(probe(client, "/api/news", headers, stop, news)),
+    ]
+    statuses = await storm(client, logins, concurrency)
+    stop.set()
+    await asyncio.gather(*probes)
+    return {"login_statuses": statuses, "healthz": latency_summary(health), "news": latency_summary(news)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Probe latency of /healthz and /api/news during a login storm.")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--inline", action="store_true", help="hash on the event loop, as before the worker pool")
+    args = parser.parse_args()
+
+    user = database.create_user("storm@example.com", auth.get_password_hash("correct horse"))
+    database.create_subscription(user.id, "sub_storm", "active", datetime.utcnow() + timedelta(days=30))
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': user.email}, timedelta(minutes=30))}"}
+
+    if args.inline:
+        async def run_inline(fn, *fn_args):
+            return fn(*fn_args)
+        password_pool.run = run_inline
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.get("/api/news", headers=headers)
+        result = await measure(client, headers, args.logins, args.concurrency)
+
+    result["mode"] = "inline" if args.inline else "pool"
+    result["bcrypt_rounds"] = auth.BCRYPT_ROUNDS
+    result["password_pool"] = password_pool.metrics()
+    print(result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+
+from app.diagnostics import SamplingProfiler, StallDetector
+
+
+def hidden_sync_call(seconds: float):
+    # Stands in for feedparser.parse or a sync SDK call inside an async def.
+    time.sleep(seconds)
+
+
+def hash_burst(rounds: int) -> bytes:
+    digest = b""
+    for _ in range(rounds):
+        digest = hashlib.sha256(digest).digest()
+    return digest
+
+
+async def busy_handlers(tasks: int, steps: int) -> float:
+    # Many small coroutines that yield often, like request handlers.
+    async def handler():
+        for _ in range(steps):
+            hash_burst(20)
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[handler() for _ in range(tasks)])
+    return tasks * steps / (time.perf_counter() - started)
+
+
+async def detection(threshold: float, stall: float) -> dict:
+    detector = StallDetector(threshold)
+    detector.start()
+    try:
+        await asyncio.sleep(threshold)
+        hidden_sync_call(stall)
+        await asyncio.sleep(threshold)
+    finally:
+        detector.stop()
+    report = detector.reports[-1] if detector.reports else None
+    return {
+        "stalls": detector.stats.stalls,
+        "measured_ms": round(detector.stats.max_stall_seconds * 1000, 1),
+        "culprit_captured": bool(report and any("hidden_sync_call" in line for line in report.stack)),
+        "innermost_frame": report.stack[-1] if report else None,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Stall detection accuracy and the cost of the watchdog and sampling profiler.")
+    parser.add_argument("--threshold-ms", type=float, default=100)
+    parser.add_argument("--stall-ms", type=float, default=300)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--profile-interval-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    results = {"detection": await detection(args.threshold_ms / 1000, args.stall_ms / 1000)}
+
+    baseline = await busy_handlers(args.tasks, args.steps)
+    detector = StallDetector(args.threshold_ms / 1000)
+    detector.start()
+    watched = await busy_handlers(args.tasks, args.steps)
+
+    # Profile the loop for as long as the workload took unprofiled.
+    profiler = SamplingProfiler()
+    profiling = asyncio.create_task(profiler.profile(args.tasks * args.steps / baseline, args.profile_interval_ms / 1000))
+    profiled = await busy_handlers(args.tasks, args.steps)
+    stacks = await profiling
+    detector.stop()
+
+    total = sum(stacks.values())
+    in_workload = sum(count for stack, count in stacks.items() if "hash_burst" in stack)
+    results["handler_steps_per_second"] = {
+        "baseline": round(baseline),
+        "stall_detector": round(watched),
+        "stall_detector_and_profiler": round(profiled),
+    }
+    results["profile"] = {
+        "samples": total,
+        "distinct_stacks": len(stacks),
+        "share_in_hash_burst": round(in_workload / total, 2) if total else 0.0,
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
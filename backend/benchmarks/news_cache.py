@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import gzip
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import WORDS, write_sample_feed
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["FCA_FEED_URL"] = write_sample_feed()
+
+from typing import List
+
+import httpx
+from fastapi import Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import auth, database
+from app.article_archive import article_id
+from app.main import app
+from app.models import Article
+from app.principal import require_active_subscription
+from app.response_cache import brotli
+from app.services import article_archive, article_list, news_response_cache
+
+
+def archive_articles(count: int) -> list:
+    started_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    articles = []
+    for i in range(count):
+        body = " ".join(WORDS[(i + j) % len(WORDS)] for j in range(80))
+        link = f"https://www.fca.org.uk/news/cached-{i}"
+        articles.append(Article(
+            id=article_id(link),
+            title=f"FCA notice {i}: {WORDS[i % len(WORDS)]} update",
+            link=link,
+            published="",
+            published_at=started_at + timedelta(hours=i),
+            summary=body[:200],
+            full_content=body,
+        ))
+    return articles
+
+
+@app.get("/benchmark/news-uncached", response_model=List[Article], dependencies=[Depends(require_active_subscription)])
+async def news_uncached(limit: int = 20):
+    # The handler as it was before the response cache: FastAPI validates and
+    # serializes the page through response_model on every request.
+    return article_archive.page(limit=limit)[0]
+
+
+def check_byte_identity(limit: int):
+    # The cached bytes must match what FastAPI would have rendered through
+    # response_model, and every encoded variant must decode back to them.
+    articles, _ = article_archive.page(limit=limit)
+    expected = JSONResponse(content=jsonable_encoder(article_list.validate_python(articles))).body
+    payload = news_response_cache.get_or_build(("identity-check", limit), lambda: (article_list.dump_json(articles), {}))
+    assert payload.body == expected, "cached body differs from the response_model rendering"
+    assert gzip.decompress(payload.encode("gzip")) == expected, "gzip variant does not round-trip"
+    if brotli is not None:
+        assert brotli.decompress(payload.encode("br")) == expected, "br variant does not round-trip"
+    return {"identity": len(payload.body), **{encoding: len(body) for encoding, body in payload.encoded.items()}}
+
+
+async def run(client: httpx.AsyncClient, path: str, headers: dict, params: dict, requests: int, concurrency: int) -> float:
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            response = await client.get(path, headers=headers, params=params)
+            if response.status_code not in (200, 304):
+                response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return requests / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Requests/sec on /api/news with and without the serialized response cache.")
+    parser.add_argument("--articles", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    await article_archive.ingest(archive_articles(args.articles))
+    user = database.create_user("bench@example.com", "x")
+    database.create_subscription(user.id, "sub_bench", "active", datetime.utcnow() + timedelta(days=30))
+    token = auth.create_access_token({"sub": user.email}, timedelta(minutes=30))
+    auth_header = {"Authorization": f"Bearer {token}"}
+    params = {"limit": args.limit}
+    sizes = check_byte_identity(args.limit)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        identity = {**auth_header, "Accept-Encoding": "identity"}
+        cached_response = await client.get("/api/news", headers=identity, params=params)
+        uncached_response = await client.get("/benchmark/news-uncached", headers=identity, params=params)
+        assert cached_response.content == uncached_response.content, "cached /api/news differs from the uncached handler"
+        etag = cached_response.headers["etag"]
+
+        uncached = await run(client, "/benchmark/news-uncached", identity, params, args.requests, args.concurrency)
+        cached = await run(client, "/api/news", identity, params, args.requests, args.concurrency)
+        compressed = await run(
+            client, "/api/news", {**auth_header, "Accept-Encoding": "gzip, br"}, params, args.requests, args.concurrency
+        )
+        conditional = await run(
+            client, "/api/news", {**identity, "If-None-Match": etag}, params, args.requests, args.concurrency
+        )
+
+    print({
+        "limit": args.limit,
+        "response_bytes": sizes,
+        "byte_identity": "ok",
+        "uncached_rps": round(uncached),
+        "cached_rps": round(cached),
+        "cached_compressed_rps": round(compressed),
+        "not_modified_rps": round(conditional),
+        "speedup": round(cached / uncached, 2),
+    })
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
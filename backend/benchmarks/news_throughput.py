@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import functools
+import os
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import write_sample_feed
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["FCA_FEED_URL"] = write_sample_feed()
+
+import httpx
+
+from app import auth, database
+from app.main import app
+from app.principal import principal_cache
+from app.repository import repository
+
+
+def add_store_latency(seconds: float):
+    # Approximates a remote store by delaying every repository lookup.
+    for name in ("get_user_by_email", "get_subscription_by_user_id"):
+        original = getattr(repository, name)
+
+        @functools.wraps(original)
+        async def delayed(*args, _original=original, **kwargs):
+            await asyncio.sleep(seconds)
+            return await _original(*args, **kwargs)
+
+        setattr(repository, name, delayed)
+
+
+async def run(client: httpx.AsyncClient, headers: dict, requests: int, concurrency: int) -> float:
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            response = await client.get("/api/news", headers=headers)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return requests / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Requests/sec on /api/news with and without principal caching.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--store-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    user = database.create_user("bench@example.com", "x")
+    database.create_subscription(user.id, "sub_bench", "active", datetime.utcnow() + timedelta(days=30))
+    token = auth.create_access_token({"sub": user.email}, timedelta(minutes=30))
+    headers = {"Authorization": f"Bearer {token}"}
+    if args.store_latency_ms:
+        add_store_latency(args.store_latency_ms / 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/news", headers=headers)
+
+        token_ttl, principal_ttl = auth.TOKEN_CACHE_TTL_SECONDS, principal_cache.ttl
+        auth.TOKEN_CACHE_TTL_SECONDS, principal_cache.ttl = 0, 0
+        auth._verified_tokens.clear()
+        principal_cache._entries.clear()
+        uncached = await run(client, headers, args.requests, args.concurrency)
+
+        auth.TOKEN_CACHE_TTL_SECONDS, principal_cache.ttl = token_ttl or 60, principal_ttl or 30
+        cached = await run(client, headers, args.requests, args.concurrency)
+
+    print({
+        "store_latency_ms": args.store_latency_ms,
+        "uncached_rps": round(uncached),
+        "cached_rps": round(cached),
+        "speedup": round(cached / uncached, 2),
+    })
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.rate_limit import Limit, MemoryBucketStore, PostgresBucketStore, RateLimiter, RateLimitExceeded, load_limits
+
+
+def per_check_ns(store: MemoryBucketStore, keys: list, limit: Limit, checks: int) -> float:
+    take = store.take
+    count = len(keys)
+    started = time.perf_counter()
+    for i in range(checks):
+        take(keys[i % count], limit)
+    return round((time.perf_counter() - started) / checks * 1e9, 1)
+
+
+def memory_costs(checks: int, clients: int) -> dict:
+    generous = Limit.parse("1000000/second")
+    exhausted = Limit.parse("1/day")
+    many = [f"summary:user-{i}" for i in range(clients)]
+    store = MemoryBucketStore()
+    store.take("summary:exhausted", exhausted)
+    return {
+        "allowed_one_client_ns": per_check_ns(store, ["summary:hot"], generous, checks),
+        f"allowed_{clients}_clients_ns": per_check_ns(store, many, generous, checks),
+        "rejected_ns": per_check_ns(store, ["summary:exhausted"], exhausted, checks),
+    }
+
+
+async def limiter_cost(checks: int) -> dict:
+    # What a request pays end to end in the dependency, coroutine included.
+    limiter = RateLimiter(load_limits(json.dumps({"summary": {"standard": "1000000/second", "pro": "1000000/second"}})))
+    started = time.perf_counter()
+    for _ in range(checks):
+        await limiter.hit("summary", "user-1", "pro")
+    return {"hit_ns": round((time.perf_counter() - started) / checks * 1e9, 1)}
+
+
+async def burst_accuracy(limiter: RateLimiter, requests: int) -> dict:
+    # Fired concurrently, exactly `burst` of these may get through.
+    async def attempt():
+        try:
+            await limiter.hit("login_account", "burst@example.com")
+            return 0.0
+        except RateLimitExceeded as e:
+            return float(e.headers["Retry-After"])
+
+    outcomes = await asyncio.gather(*[attempt() for _ in range(requests)])
+    return {
+        "burst": limiter.limit_for("login_account").burst,
+        "allowed": outcomes.count(0.0),
+        "max_retry_after_seconds": max(outcomes),
+    }
+
+
+async def postgres_costs(database_url: str, checks: int, concurrency: int) -> dict:
+    from app.postgres_repository import PostgresRepository
+
+    repository = PostgresRepository(database_url, max_size=concurrency)
+    await repository.open()
+    try:
+        store = PostgresBucketStore(repository)
+        generous = Limit.parse("1000000/second")
+        latencies = []
+        for i in range(checks):
+            started = time.perf_counter()
+            await store.take(f"bench:{i % 100}", generous)
+            latencies.append(time.perf_counter() - started)
+        limiter = RateLimiter(load_limits(), shared=store)
+        async with repository.pool.connection() as conn:
+            await conn.execute("DELETE FROM rate_limit_buckets WHERE key LIKE 'login_account:%'")
+        return {
+            "check_p50_us": round(statistics.median(latencies) * 1e6, 1),
+            "burst": await burst_accuracy(limiter, concurrency * 5),
+        }
+    finally:
+        await repository.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Cost per rate limit check and burst accuracy, in-process and shared.")
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    parser.add_argument("--clients", type=int, default=50_000)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {
+        "memory": memory_costs(args.checks, args.clients),
+        "limiter": await limiter_cost(args.checks // 10),
+        "memory_burst": await burst_accuracy(RateLimiter(load_limits()), 50),
+    }
+    if args.database_url:
+        results["postgres"] = await postgres_costs(args.database_url, args.checks // 100, args.concurrency)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
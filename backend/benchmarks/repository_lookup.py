@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from app.repository import MemoryRepository, create_repository
+
+
+async def run(repository, users: int, lookups: int, concurrency: int) -> dict:
+    await repository.open()
+    try:
+        emails = [f"bench-{i}-{time.time_ns()}@example.com" for i in range(users)]
+        for email in emails:
+            await repository.create_user(email, "x")
+
+        latencies = []
+        queue = [random.choice(emails) for _ in range(lookups)]
+
+        async def worker():
+            while queue:
+                email = queue.pop()
+                started = time.perf_counter()
+                await repository.get_user_by_email(email)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    finally:
+        await repository.close()
+
+    latencies.sort()
+    return {
+        "backend": type(repository).__name__,
+        "lookups_per_second": round(lookups / elapsed),
+        "p50_us": round(statistics.median(latencies) * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99) - 1] * 1e6, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare get_user_by_email latency across repository backends.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    backends = [MemoryRepository()]
+    if os.getenv("DATABASE_URL"):
+        backends.append(create_repository())
+    for repository in backends:
+        print(await run(repository, args.users, args.lookups, args.concurrency))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
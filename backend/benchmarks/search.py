@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.article_archive import article_id
+from app.models import Article
+from app.search_index import SearchIndex
+from benchmarks.common import WORDS, latency_summary
+
+
+def vocabulary(size: int, seed: int) -> list:
+    # The real FCA words at the head of the distribution, pronounceable
+    # made-up words in the long tail so prefixes spread like real text.
+    rng = random.Random(seed)
+    words, seen = list(WORDS), set(WORDS)
+    while len(words) < size:
+        word = "".join(rng.choice("bcdfghjklmnprstvw") + rng.choice("aeiou") for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_weights(size: int, offset: int) -> list:
+    # Word ranks start after `offset` because the most frequent English words
+    # are stopwords that never reach the index.
+    return list(itertools.accumulate(1 / rank for rank in range(offset + 1, offset + size + 1)))
+
+
+def synthetic_articles(count: int, vocab: list, words_per_article: int, offset: int, seed: int) -> list:
+    rng = random.Random(seed)
+    cum_weights = zipf_weights(len(vocab), offset)
+    started_at = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    articles = []
+    for i in range(count):
+        words = rng.choices(vocab, cum_weights=cum_weights, k=words_per_article + 8)
+        articles.append(Article(
+            id=article_id(f"https://www.fca.org.uk/news/bench-{i}"),
+            title=" ".join(words[:8]),
+            link=f"https://www.fca.org.uk/news/bench-{i}",
+            published="",
+            published_at=started_at + timedelta(hours=i),
+            summary=" ".join(words[8:40]),
+            full_content=" ".join(words[8:]),
+        ))
+    return articles
+
+
+def queries(vocab: list, count: int, offset: int, seed: int) -> list:
+    rng = random.Random(seed)
+    cum_weights = zipf_weights(len(vocab), offset)
+    result = []
+    for _ in range(count):
+        words = rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(1, 3))
+        if rng.random() < 0.3:
+            words[-1] = words[-1][:max(3, len(words[-1]) // 2)]
+        result.append(" ".join(words))
+    return result
+
+
+def measure(index: SearchIndex, query_list: list, limit: int) -> dict:
+    latencies = []
+    for query in query_list:
+        started = time.perf_counter()
+        index.search(query, limit)
+        latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure /api/news/search index latency on a synthetic archive.")
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=120, help="body words per article")
+    parser.add_argument("--zipf-offset", type=int, default=50, help="word ranks taken by stopwords")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    vocab = vocabulary(args.vocabulary, args.seed)
+    articles = synthetic_articles(args.articles, vocab, args.words, args.zipf_offset, args.seed)
+    query_list = queries(vocab, args.queries, args.zipf_offset, args.seed + 1)
+    path = os.path.join(tempfile.mkdtemp(), "search.idx")
+
+    index = SearchIndex(path, flush_threshold=len(articles) + 1)
+    started = time.perf_counter()
+    for article in articles:
+        index.add(article)
+    build_seconds = time.perf_counter() - started
+    in_memory = measure(index, query_list, args.limit)
+
+    started = time.perf_counter()
+    await index.flush()
+    flush_seconds = time.perf_counter() - started
+    flushed = measure(index, query_list, args.limit)
+    index.close()
+
+    started = time.perf_counter()
+    reloaded = SearchIndex(path)
+    load_seconds = time.perf_counter() - started
+    cold = measure(reloaded, query_list, args.limit)
+    reloaded.close()
+
+    print({
+        "articles": args.articles,
+        "index_bytes": os.path.getsize(path),
+        "build_seconds": round(build_seconds, 2),
+        "flush_seconds": round(flush_seconds, 2),
+        "load_seconds": round(load_seconds, 3),
+        "in_memory": in_memory,
+        "after_flush": flushed,
+        "reloaded": cold,
+    })
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import write_sample_feed
+
+# Modules the API should only load on first use, not while importing app.main.
+DEFERRED = ("stripe", "openai", "feedparser")
+
+READY_PROBE = """
+import time
+started = time.perf_counter()
+import asyncio, json
+from app.main import app
+imported = time.perf_counter()
+
+async def ready():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+print(json.dumps({"import": imported - started, "ready": asyncio.run(ready()) - started}))
+"""
+
+
+def environment() -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env["FCA_FEED_URL"] = write_sample_feed()
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_profile(env: dict) -> dict:
+    # Only for the breakdown, as -X importtime slows imports down itself. It
+    # writes "self | cumulative | name" in microseconds, with the name
+    # indented by nesting depth.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+
+def ready_times(env: dict) -> dict:
+    result = subprocess.run([sys.executable, "-c", READY_PROBE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def spread(values) -> dict:
+    return {"median": round(statistics.median(values), 1), "min": round(min(values), 1), "max": round(max(values), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start cost of the API: import time of app.main and time until the lifespan has started.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="fail if the median import of app.main takes longer")
+    args = parser.parse_args()
+
+    env = environment()
+    times = [ready_times(env) for _ in range(args.runs)]
+    profile = import_profile(env)
+
+    imported = [run["import"] * 1000 for run in times]
+    # Top-level packages and the app's own modules, by cumulative time.
+    heaviest = sorted(
+        ((name, ms) for name, ms in profile.items() if name != "app.main" and ("." not in name or name.startswith("app."))),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+    median_ms = statistics.median(imported)
+    results = {
+        "runs": args.runs,
+        "import_ms": spread(imported),
+        "ready_ms": spread([run["ready"] * 1000 for run in times]),
+        "heaviest_imports_ms": {name: round(ms, 1) for name, ms in heaviest},
+        "deferred": {name: name not in profile for name in DEFERRED},
+        "budget_ms": args.budget_ms,
+        "within_budget": median_ms <= args.budget_ms,
+    }
+    print(json.dumps(results, indent=2))
+    if not results["within_budget"]:
+        sys.exit(f"import app.main took {median_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
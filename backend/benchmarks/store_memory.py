@@ -0,0 +1,110 @@
+import argparse
+import gc
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from app import database
+from app.models import User, Subscription
+
+LAYOUTS = ("models", "records")
+
+
+def accounts(users: int, subscribed: float):
+    # Status and plan come out of webhook JSON, so each one is a fresh string.
+    now = int(time.time())
+    for i in range(users):
+        subscription = None
+        if i < users * subscribed:
+            status = json.loads('"active"' if i % 10 else '"past_due"')
+            subscription = (f"sub_{i:014d}", status, datetime.fromtimestamp(now + i % (30 * 86400)), json.loads('"standard"'))
+        yield f"user{i}@example.com", f"$2b$12${i:053d}", f"cus_{i:014d}", subscription
+
+
+def populate_models(users: int, subscribed: float):
+    # The layout database.py used before: pydantic models in dicts. Its
+    # expiry index and counters are left out, so this flatters it slightly.
+    users_db, subscriptions_db, email_to_user_id, customers, subscriptions, order = {}, {}, {}, {}, {}, []
+    for email, hashed_password, customer_id, subscription in accounts(users, subscribed):
+        user = User(id=str(uuid.uuid4()), email=email, hashed_password=hashed_password, created_at=datetime.utcnow())
+        users_db[user.id] = user
+        email_to_user_id[email] = user.id
+        order.append(user.id)
+        user.stripe_customer_id = customer_id
+        customers[customer_id] = user.id
+        if subscription:
+            subscription_id, status, period_end, plan = subscription
+            subscriptions_db[user.id] = Subscription(
+                user_id=user.id, stripe_subscription_id=subscription_id, status=status,
+                current_period_end=period_end, created_at=datetime.utcnow(), plan=plan,
+            )
+            subscriptions[subscription_id] = user.id
+    return lambda email: users_db.get(email_to_user_id.get(email)), (users_db, subscriptions_db, email_to_user_id, customers, subscriptions, order)
+
+
+def populate_records(users: int, subscribed: float):
+    for email, hashed_password, customer_id, subscription in accounts(users, subscribed):
+        user = database.create_user(email, hashed_password)
+        database.update_user_stripe_customer(user.id, customer_id)
+        if subscription:
+            subscription_id, status, period_end, plan = subscription
+            database.create_subscription(user.id, subscription_id, status, period_end, plan)
+    assert not database.check_index_consistency()
+    return database.get_user_by_email, None
+
+
+def max_rss_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(layout: str, users: int, subscribed: float, lookups: int) -> dict:
+    gc.collect()
+    before = max_rss_bytes()
+    started = time.perf_counter()
+    lookup, keep = (populate_models if layout == "models" else populate_records)(users, subscribed)
+    populate_seconds = time.perf_counter() - started
+    gc.collect()
+    grown = max_rss_bytes() - before
+
+    emails = [f"user{random.randrange(users)}@example.com" for _ in range(lookups)]
+    started = time.perf_counter()
+    for email in emails:
+        lookup(email)
+    lookup_seconds = time.perf_counter() - started
+    return {
+        "layout": layout,
+        "rss_mb": round(grown / 2**20),
+        "bytes_per_user": round(grown / users),
+        "populate_seconds": round(populate_seconds, 1),
+        "get_user_by_email_us": round(lookup_seconds / lookups * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per account of the in-memory store: pydantic models vs slotted records.")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--subscribed", type=float, default=0.6)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--layout", choices=LAYOUTS, help="measure one layout in this process")
+    args = parser.parse_args()
+
+    if args.layout:
+        print(json.dumps(measure(args.layout, args.users, args.subscribed, args.lookups)))
+        return
+    # Each layout gets a fresh process, so peak RSS is its own.
+    results = {"users": args.users, "subscribed": args.subscribed}
+    for layout in LAYOUTS:
+        command = [sys.executable, "-m", "benchmarks.store_memory", "--layout", layout,
+                   "--users", str(args.users), "--subscribed", str(args.subscribed), "--lookups", str(args.lookups)]
+        results[layout] = json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+    results["memory_saved"] = round(1 - results["records"]["bytes_per_user"] / results["models"]["bytes_per_user"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
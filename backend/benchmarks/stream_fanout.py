@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import json
+import socket
+import time
+
+import httpx
+
+from app.broadcaster import Broadcaster
+from benchmarks.common import latency_summary, sample_feed_xml
+from benchmarks.fakes import BackgroundServer, free_port, rss_app, stripe_app
+from benchmarks.loadtest import WEBHOOK_SECRET, LoadTest, boot_app, wait_until_healthy
+
+# Each pushed article is one object in an "articles" event.
+ARTICLE_MARKER = b'{"id":'
+# Subscriber counts come from the admin-only stats endpoint.
+ADMIN_EMAIL = "bench-admin@example.com"
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class StreamClient:
+    def __init__(self, port: int, token: str, read: bool = True):
+        self.port = port
+        self.token = token
+        self.read = read
+        self.articles = 0
+        self.arrivals = {}
+        self.reader = None
+        self.writer = None
+        self._task = None
+
+    async def connect(self):
+        sock = socket.socket()
+        if not self.read:
+            # A tiny receive window makes a stalled reader back up quickly.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", self.port))
+        self.reader, self.writer = await asyncio.open_connection(sock=sock)
+        self.writer.write(
+            f"GET /api/news/stream?access_token={self.token} HTTP/1.1\r\n"
+            "Host: bench\r\nAccept: text/event-stream\r\n\r\n".encode("ascii")
+        )
+        await self.writer.drain()
+        if self.read:
+            self._task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        tail = b""
+        while True:
+            chunk = await self.reader.read(65536)
+            if not chunk:
+                return
+            data = tail + chunk
+            found = data.count(ARTICLE_MARKER) - tail.count(ARTICLE_MARKER)
+            tail = data[-len(ARTICLE_MARKER):]
+            if found:
+                self.articles += found
+                self.arrivals[self.articles] = time.perf_counter()
+
+    def arrival(self, count: int):
+        return next((at for seen, at in sorted(self.arrivals.items()) if seen >= count), None)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+
+
+async def in_process(subscribers: int, slow: int, events: int, buffer: int) -> dict:
+    # The broadcaster alone: publish cost per event and eviction of stalled
+    # consumers, without sockets (the kernel buffers several MB per slow
+    # connection before the server-side queue ever fills).
+    broadcaster = Broadcaster(buffer_size=buffer, max_subscribers=subscribers + slow)
+    received = [0]
+
+    async def always_allowed() -> bool:
+        return True
+
+    async def consume(subscriber):
+        async for _ in broadcaster.stream(subscriber, 60, always_allowed):
+            received[0] += 1
+
+    consumers = [asyncio.create_task(consume(broadcaster.subscribe())) for _ in range(subscribers)]
+    stalled = [broadcaster.subscribe() for _ in range(slow)]
+    await asyncio.sleep(0)
+
+    publish_times, fan_out_times = [], []
+    started = time.perf_counter()
+    for event in range(1, events + 1):
+        publish_started = time.perf_counter()
+        broadcaster.publish("articles", json.dumps([{"id": str(event)}]))
+        publish_times.append(time.perf_counter() - publish_started)
+        deadline = publish_started + 10
+        while received[0] < subscribers * event and time.perf_counter() < deadline:
+            await asyncio.sleep(0.001)
+        fan_out_times.append(time.perf_counter() - publish_started)
+    elapsed = time.perf_counter() - started
+    broadcaster.close()
+    await asyncio.gather(*consumers)
+    return {
+        "subscribers": subscribers,
+        "publish": latency_summary(publish_times),
+        "fan_out": latency_summary(fan_out_times),
+        "deliveries_per_second": round(received[0] / elapsed),
+        "stalled": len(stalled),
+        "evicted": broadcaster.stats.evicted,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Hold many SSE clients on /api/news/stream and time fan-out of new articles.")
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--slow-clients", type=int, default=20, help="clients that connect but never read")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--items", type=int, default=20, help="new articles per feed refresh")
+    parser.add_argument("--buffer", type=int, default=4, help="STREAM_BUFFER_SIZE")
+    parser.add_argument("--refresh-seconds", type=float, default=0.5)
+    parser.add_argument("--in-process-subscribers", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(json.dumps(await in_process(args.in_process_subscribers, args.slow_clients, 50, args.buffer), indent=2))
+
+    rss_stub_app = rss_app(args.items)
+    stripe_stub_app = stripe_app()
+    rss = BackgroundServer(rss_stub_app).start()
+    stripe_stub = BackgroundServer(stripe_stub_app).start()
+    port = free_port()
+    process = boot_app(port, {
+        "FCA_FEED_URL": f"{rss.url}/news/rss.xml",
+        "FCA_FEED_REFRESH_SECONDS": str(args.refresh_seconds),
+        "OPENAI_API_KEY": "sk-benchmark",
+        "PRESUMMARIZE_WORKERS": "0",
+        "STRIPE_SECRET_KEY": "sk_test_benchmark",
+        "STRIPE_API_BASE": stripe_stub.url,
+        "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "STREAM_BUFFER_SIZE": str(args.buffer),
+        # Closed clients are noticed on the next write, so keep shutdown quick.
+        "STREAM_HEARTBEAT_SECONDS": "1",
+        "BCRYPT_ROUNDS": "4",
+        "ADMIN_EMAILS": ADMIN_EMAIL,
+    })
+    clients = []
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            await wait_until_healthy(client)
+            setup = LoadTest(client, stripe_stub_app, users=1, articles=args.items)
+            await setup.setup()
+            token = setup.accounts[0]["token"]
+            response = await client.post("/api/auth/register", json={"email": ADMIN_EMAIL, "password": "bench-admin-password"})
+            response.raise_for_status()
+            admin = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            idle_rss = rss_kb(process.pid)
+            started = time.perf_counter()
+            fast = [StreamClient(port, token) for _ in range(args.clients)]
+            slow = [StreamClient(port, token, read=False) for _ in range(args.slow_clients)]
+            clients = fast + slow
+            for batch in range(0, len(clients), 200):
+                await asyncio.gather(*[c.connect() for c in clients[batch:batch + 200]])
+            while (await client.get("/api/debug/cache-stats", headers=admin)).json()["news_stream"]["subscribers"] < len(clients):
+                await asyncio.sleep(0.1)
+            connect_seconds = time.perf_counter() - started
+            connected_rss = rss_kb(process.pid)
+
+            fan_out, lags, missing = [], [], 0
+            for round_no in range(1, args.rounds + 1):
+                rss_stub_app.state.feed = sample_feed_xml(args.items, offset=round_no * args.items)
+                expected = round_no * args.items
+                deadline = time.perf_counter() + args.refresh_seconds * 4 + 10
+                while time.perf_counter() < deadline and any(c.articles < expected for c in fast):
+                    await asyncio.sleep(0.05)
+                arrivals = [c.arrival(expected) for c in fast]
+                missing += sum(1 for at in arrivals if at is None)
+                arrivals = [at for at in arrivals if at is not None]
+                if arrivals:
+                    first = min(arrivals)
+                    fan_out.append(max(arrivals) - first)
+                    lags.extend(at - first for at in arrivals)
+
+            stats = (await client.get("/api/debug/cache-stats", headers=admin)).json()["news_stream"]
+    finally:
+        await asyncio.gather(*[stream_client.close() for stream_client in clients])
+        process.terminate()
+        await asyncio.to_thread(process.wait, 15)
+        rss.stop()
+        stripe_stub.stop()
+
+    print(json.dumps({
+        "clients": args.clients,
+        "slow_clients": args.slow_clients,
+        "connect_seconds": round(connect_seconds, 2),
+        "server_rss_kb_per_connection": round((connected_rss - idle_rss) / max(1, len(clients)), 1),
+        "fan_out_seconds_max": round(max(fan_out, default=0.0), 4),
+        "delivery_lag_after_first_client": latency_summary(lags),
+        "missed_deliveries": missing,
+        "evicted": stats["evicted"],
+        "subscribers_left": stats["subscribers"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
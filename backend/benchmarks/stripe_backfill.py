@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from app import database
+from app.clients import stripe_api
+from app.repository import MemoryRepository
+from app.stripe_backfill import StripeBackfill, plan_shards
+from benchmarks.expiry_sweep import reset
+from benchmarks.fakes import BackgroundServer, stripe_app, stripe_customer, stripe_subscription
+
+YEAR = 365 * 86400
+
+
+def populate_stripe(stub, customers: int, subscribed: float, now: int):
+    # Customers created evenly over five years; some resubscribed, so they
+    # have an older canceled subscription next to the current one.
+    stub.state.customers.clear()
+    stub.state.subscriptions.clear()
+    for i in range(customers):
+        created = now - 5 * YEAR + i * (5 * YEAR // customers)
+        customer_id = f"cus_{i}"
+        stub.state.customers[customer_id] = stripe_customer(customer_id, f"user{i}@example.com", created)
+        if i < customers * subscribed:
+            current = stripe_subscription(f"sub_{i}", customer_id, "active" if i % 10 else "past_due")
+            current["created"] = created + 60
+            stub.state.subscriptions[current["id"]] = current
+            if i % 7 == 0:
+                previous = stripe_subscription(f"sub_{i}_old", customer_id, "canceled")
+                previous["created"] = created + 30
+                stub.state.subscriptions[previous["id"]] = previous
+
+
+def populate_users(customers: int):
+    reset()
+    for i in range(customers):
+        database.create_user(f"user{i}@example.com", "x")
+
+
+def store_summary() -> dict:
+    return {
+        "linked_users": len(database.stripe_customer_to_user_id),
+        "subscriptions": dict(database.subscription_status_counts),
+        "consistency_problems": len(database.check_index_consistency()),
+    }
+
+
+async def backfill(stub, shards: int, concurrency: int, rps: float, checkpoint=None, stop_after=None) -> dict:
+    requests = stub.state.requests
+    if checkpoint and os.path.exists(checkpoint):
+        job = StripeBackfill.resume(MemoryRepository(), checkpoint, concurrency=concurrency, requests_per_second=rps)
+    else:
+        job = StripeBackfill(
+            MemoryRepository(), plan_shards(int(time.time()) - 6 * YEAR, int(time.time()) + 1, shards),
+            checkpoint, concurrency=concurrency, requests_per_second=rps,
+        )
+    run = asyncio.create_task(job.run())
+    if stop_after:
+        # Simulates the process being killed part way through.
+        await asyncio.sleep(stop_after)
+        run.cancel()
+    await asyncio.gather(run, return_exceptions=True)
+    progress = job.progress()
+    return {
+        "seconds": round(progress["elapsed_seconds"], 2),
+        "objects_per_second": round(progress["objects_per_second"]),
+        "pages": progress["pages"],
+        "shards_done": f'{progress["shards_done"]}/{progress["shards"]}',
+        "rate_limited": progress["rate_limited"],
+        "stripe_requests": stub.state.requests - requests,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Stripe backfill throughput, rate-limit handling and checkpoint/resume against a stub.")
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--subscribed", type=float, default=0.6)
+    parser.add_argument("--stripe-latency", type=float, default=0.05)
+    parser.add_argument("--stripe-rate-limit", type=int, default=50, help="stub requests per second before 429s")
+    parser.add_argument("--rps", type=float, default=40.0)
+    args = parser.parse_args()
+
+    stub = stripe_app(latency=args.stripe_latency, rate_limit=args.stripe_rate_limit)
+    server = BackgroundServer(stub).start()
+    stripe = stripe_api()
+    stripe.api_key = "sk_test_backfill"
+    stripe.api_base = server.url
+    populate_stripe(stub, args.customers, args.subscribed, int(time.time()))
+    results = {"customers": args.customers, "runs": {}}
+    try:
+        for name, shards, concurrency in (("serial", 1, 1), ("sharded", 8, 4)):
+            populate_users(args.customers)
+            results["runs"][name] = await backfill(stub, shards, concurrency, args.rps)
+            results["runs"][name]["store"] = store_summary()
+
+        populate_users(args.customers)
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, "backfill.json")
+            interrupted = await backfill(stub, 8, 4, args.rps, checkpoint, stop_after=results["runs"]["sharded"]["seconds"] / 2)
+            resumed = await backfill(stub, 8, 4, args.rps, checkpoint)
+        results["runs"]["interrupted_then_resumed"] = {"interrupted": interrupted, "resumed": resumed, "store": store_summary()}
+    finally:
+        server.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from app import database
+
+
+def time_lookups(lookup, keys) -> float:
+    started = time.perf_counter()
+    for key in keys:
+        lookup(key)
+    return (time.perf_counter() - started) / len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Stripe ID lookups in the in-memory store as it grows.")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--check", action="store_true", help="run check_index_consistency afterwards")
+    args = parser.parse_args()
+
+    populated = 0
+    size = 1000
+    while populated < args.users:
+        target = min(size, args.users)
+        populate_started = time.perf_counter()
+        for i in range(populated, target):
+            user = database.create_user(f"user{i}@example.com", "x")
+            database.update_user_stripe_customer(user.id, f"cus_{i}")
+            database.create_subscription(user.id, f"sub_{i}", "active", datetime.utcnow() + timedelta(days=30))
+        populated = target
+        populate_seconds = time.perf_counter() - populate_started
+
+        step = max(1, populated // args.lookups)
+        customer_keys = [f"cus_{i}" for i in range(0, populated, step)]
+        subscription_keys = [f"sub_{i}" for i in range(0, populated, step)]
+        print({
+            "users": populated,
+            "by_customer_ns": round(time_lookups(database.get_user_by_stripe_customer_id, customer_keys) * 1e9),
+            "by_subscription_ns": round(time_lookups(database.get_user_by_stripe_subscription_id, subscription_keys) * 1e9),
+            "populate_seconds": round(populate_seconds, 2),
+        })
+        size *= 10
+
+    if args.check:
+        started = time.perf_counter()
+        problems = database.check_index_consistency()
+        print({"consistency_problems": len(problems), "check_seconds": round(time.perf_counter() - started, 2)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.common import write_sample_feed
+
+# Settings are read once per process, so the environment is fixed before the
+# first app import. Background loops that would race the tests are off.
+os.environ.update({
+    "OPENAI_API_KEY": "test",
+    "FCA_FEED_URL": write_sample_feed(),
+    "FEED_PARSE_WORKERS": "0",
+    "PRESUMMARIZE_WORKERS": "0",
+    "EXPIRY_SWEEP_INTERVAL_SECONDS": "0",
+    "RATE_LIMITS_ENABLED": "0",
+    "BCRYPT_ROUNDS": "4",
+    "LOG_LEVEL": "WARNING",
+    "STRIPE_WEBHOOK_SECRET": "whsec_test",
+    "ADMIN_EMAILS": "admin@example.com",
+})
+
+from app import database  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def store():
+    yield database
+    for table in (database.users_db, database.subscriptions_db, database.email_to_user_id,
+                  database.stripe_customer_to_user_id, database.stripe_subscription_to_user_id,
+                  database.webhook_events_db, database.subscription_event_versions,
+                  database.subscription_status_counts, database.expiry_index):
+        table.clear()
+    database.user_order.clear()
+    database.expiry_days.clear()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def auth_headers(email: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+@pytest.fixture
+def subscriber():
+    # Fresh address per test, so principals cached by earlier tests never match.
+    user = database.create_user(f"{uuid.uuid4().hex}@example.com", "x")
+    database.create_subscription(user.id, f"sub_{uuid.uuid4().hex}", "active", datetime.utcnow() + timedelta(days=30))
+    return auth_headers(user.email)
+
+
+@pytest.fixture
+def admin():
+    database.create_user("admin@example.com", "x")
+    return auth_headers("admin@example.com")
+
+
+@pytest.fixture
+def auth():
+    return auth_headers
+
+
+@pytest.fixture(scope="session")
+def stripe_stub():
+    # The Stripe SDK pointed at a local stub; tests arrange state.subscriptions,
+    # state.customers and state.missing as they need.
+    from app.clients import stripe_api
+    from benchmarks.fakes import BackgroundServer, stripe_app
+
+    app = stripe_app()
+    server = BackgroundServer(app).start()
+    stripe = stripe_api()
+    previous = stripe.api_key, stripe.api_base
+    stripe.api_key, stripe.api_base = "sk_test_stub", server.url
+    yield app
+    stripe.api_key, stripe.api_base = previous
+    server.stop()
+
+
+@pytest.fixture
+def stripe_state(stripe_stub):
+    state = stripe_stub.state
+    for table in (state.customers, state.subscriptions, state.missing, state.listings):
+        table.clear()
+    return state
@@ -0,0 +1,154 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.account_export import export_accounts
+from app.repository import MemoryRepository
+
+
+@pytest.fixture
+def accounts(store):
+    users = [store.create_user(f"user{i}@example.com", "x") for i in range(7)]
+    for i, user in enumerate(users[::2]):
+        store.create_subscription(user.id, f"sub_{i}", "active", datetime.utcnow() + timedelta(days=30))
+    return users
+
+
+def walk(store, page_size: int, after=None) -> list:
+    emails = []
+    while True:
+        page = store.list_accounts_page(after, page_size)
+        emails.extend(user.email for _, user, _ in page)
+        if len(page) < page_size:
+            return emails
+        after = page[-1][0]
+
+
+def export(client, headers, **params) -> list:
+    response = client.get("/api/admin/accounts/export", headers=headers, params=params)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("page_size", [1, 3, 7, 100])
+def test_pages_walk_every_account_once_in_creation_order(store, accounts, page_size):
+    assert walk(store, page_size) == [user.email for user in accounts]
+
+
+def test_cursor_of_a_deleted_account_still_continues_after_it(store, accounts):
+    first = store.list_accounts_page(None, 3)
+    cursor = first[-1][0]
+
+    store.delete_user(first[-1][1].id)
+    store.delete_user(accounts[4].id)
+
+    assert [user.email for _, user, _ in store.list_accounts_page(cursor, 2)] == ["user3@example.com", "user5@example.com"]
+    assert walk(store, 2, cursor) == ["user3@example.com", "user5@example.com", "user6@example.com"]
+
+
+def test_accounts_created_during_a_walk_are_picked_up_at_the_end(store, accounts):
+    cursor = store.list_accounts_page(None, 7)[-1][0]
+
+    store.create_user("late@example.com", "x")
+
+    assert walk(store, 3, cursor) == ["late@example.com"]
+
+
+@pytest.mark.parametrize("cursor", ["-1", "soon"])
+def test_malformed_cursor_is_rejected(store, cursor):
+    with pytest.raises(ValueError):
+        store.list_accounts_page(cursor, 10)
+
+
+def test_export_streams_one_line_per_account(client, store, accounts, admin):
+    records = export(client, admin, page_size=2)
+
+    assert [record["email"] for record in records] == [user.email for user in accounts] + ["admin@example.com"]
+    subscribed = records[0]["subscription"]
+    assert subscribed["status"] == "active" and subscribed["plan"] == "standard"
+    assert records[1]["subscription"] is None
+
+
+def test_export_resumes_from_the_last_cursor_received(client, store, accounts, admin):
+    records = export(client, admin, page_size=3)
+
+    resumed = export(client, admin, page_size=3, after=records[3]["cursor"])
+
+    assert resumed == records[4:]
+
+
+def test_export_with_a_bad_cursor_is_a_400(client, admin):
+    response = client.get("/api/admin/accounts/export", headers=admin, params={"after": "soon"})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_export_reads_the_next_page_only_once_the_last_one_was_sent(store, accounts):
+    pages = []
+
+    class CountingRepository(MemoryRepository):
+        async def list_accounts_page(self, after, limit):
+            pages.append(after)
+            return await super().list_accounts_page(after, limit)
+
+    repository = CountingRepository()
+    chunks = export_accounts(repository, await repository.list_accounts_page(None, 3), 3)
+
+    first = await chunks.__anext__()
+    assert len(first.decode().splitlines()) == 3
+    assert pages == [None]
+    rest = [chunk async for chunk in chunks]
+    assert len(rest) == 2
+    assert pages == [None, "3", "6"]
+
+
+def full_scan(store, now: datetime, days: int) -> dict:
+    statuses = {}
+    for subscription in store.subscriptions_db.values():
+        statuses[subscription.status] = statuses.get(subscription.status, 0) + 1
+    end = now + timedelta(days=days)
+    expiring = sum(
+        1 for subscription in store.subscriptions_db.values()
+        if subscription.status in store.LIVE_STATUSES and now <= subscription.current_period_end < end
+    )
+    return {"users": len(store.users_db), "subscriptions": statuses, "expiring": expiring}
+
+
+def test_counters_match_a_full_scan_after_mixed_writes(store):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    users = []
+    for step in range(400):
+        action = rng.choice(["create", "create", "subscribe", "update", "relink", "delete"])
+        if action == "create" or not users:
+            users.append(store.create_user(f"user{step}@example.com", "x").id)
+            continue
+        user_id = rng.choice(users)
+        ends = now + timedelta(days=rng.randint(-5, 20), hours=rng.randint(0, 23))
+        status = rng.choice(["active", "trialing", "past_due", "canceled"])
+        if action == "subscribe":
+            store.create_subscription(user_id, f"sub_{step}", status, ends)
+        elif action == "update":
+            store.update_subscription(user_id, status, ends)
+        elif action == "relink":
+            store.update_user_stripe_customer(user_id, f"cus_{step}")
+        else:
+            store.delete_user(user_id)
+            users.remove(user_id)
+
+    for days in (0, 3, 7, 30):
+        assert store.account_stats(now, days) == full_scan(store, now, days)
+    assert not store.check_index_consistency()
+
+
+def test_stats_route_reports_the_counters(client, store, accounts, admin):
+    store.update_subscription(accounts[0].id, "canceled", datetime.utcnow())
+    store.delete_user(accounts[2].id)
+
+    stats = client.get("/api/admin/accounts/stats", headers=admin, params={"expiring_within_days": 31}).json()
+
+    assert stats == {"users": 7, "subscriptions": {"active": 2, "canceled": 1}, "expiring": 2, "expiring_within_days": 31}
@@ -0,0 +1,13 @@
+def test_portal_needs_a_stripe_customer(client, store, auth):
+    user = store.create_user("unlinked@example.com", "x")
+
+    response = client.post("/api/stripe/create-portal-session", headers=auth(user.email))
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No Stripe customer found"
+
+
+def test_portal_for_an_unknown_account_is_not_found(client, auth):
+    response = client.post("/api/stripe/create-portal-session", headers=auth("ghost@example.com"))
+
+    assert response.status_code == 404
@@ -0,0 +1,153 @@
+import pytest
+from fastapi import HTTPException
+
+from app import main
+from app.broadcaster import (
+    EVICTED_FRAME,
+    HEARTBEAT_FRAME,
+    RESET_FRAME,
+    UNSUBSCRIBED_FRAME,
+    Broadcaster,
+    Subscriber,
+    sse_frame,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def drain(subscriber: Subscriber) -> list:
+    frames = []
+    while not subscriber.queue.empty():
+        frames.append(subscriber.queue.get_nowait())
+    return frames
+
+
+def published(broadcaster: Broadcaster, count: int) -> list:
+    start = broadcaster.stats.published
+    for i in range(start + 1, start + count + 1):
+        broadcaster.publish("article", f"notice {i}")
+    return [sse_frame(i, "article", f"notice {i}") for i in range(start + 1, start + count + 1)]
+
+
+async def test_reconnecting_client_gets_what_it_missed():
+    broadcaster = Broadcaster(buffer_size=8, replay_size=8)
+    frames = published(broadcaster, 5)
+
+    subscriber = broadcaster.subscribe(last_event_id="2")
+
+    assert drain(subscriber) == frames[2:]
+    assert broadcaster.stats.replayed == 3
+
+
+async def test_client_that_is_up_to_date_gets_nothing_replayed():
+    broadcaster = Broadcaster(buffer_size=8, replay_size=8)
+    published(broadcaster, 3)
+
+    assert drain(broadcaster.subscribe(last_event_id="3")) == []
+    assert broadcaster.stats.resets == 0
+
+
+@pytest.mark.parametrize("last_event_id, why", [
+    ("1", "older than the replay window"),
+    ("99", "from before a restart"),
+])
+async def test_client_that_cannot_be_replayed_is_told_to_reset(last_event_id, why):
+    broadcaster = Broadcaster(buffer_size=8, replay_size=4)
+    published(broadcaster, 10)
+
+    subscriber = broadcaster.subscribe(last_event_id=last_event_id)
+
+    assert drain(subscriber) == [RESET_FRAME], why
+    assert broadcaster.stats.resets == 1
+
+
+async def test_replay_larger_than_the_buffer_is_a_reset():
+    broadcaster = Broadcaster(buffer_size=2, replay_size=8)
+    published(broadcaster, 5)
+
+    assert drain(broadcaster.subscribe(last_event_id="1")) == [RESET_FRAME]
+
+
+async def test_unparseable_last_event_id_is_ignored():
+    broadcaster = Broadcaster()
+    published(broadcaster, 3)
+
+    assert drain(broadcaster.subscribe(last_event_id="soon")) == []
+
+
+async def test_slow_consumer_is_evicted_without_holding_back_others():
+    broadcaster = Broadcaster(buffer_size=2)
+    slow, fast = broadcaster.subscribe(), broadcaster.subscribe()
+
+    for _ in range(3):
+        (frame,) = published(broadcaster, 1)
+        assert await fast.queue.get() == frame
+
+    assert drain(slow) == [EVICTED_FRAME]
+    assert slow.closing
+    assert len(broadcaster) == 1
+    assert broadcaster.stats.evicted == 1
+
+
+async def test_evicted_stream_ends_after_the_eviction_frame():
+    broadcaster = Broadcaster(buffer_size=1)
+    subscriber = broadcaster.subscribe()
+    published(broadcaster, 2)
+
+    async def allowed():
+        return True
+
+    frames = [frame async for frame in broadcaster.stream(subscriber, 1.0, allowed)]
+
+    assert frames == [EVICTED_FRAME]
+
+
+async def test_subscribers_past_the_limit_are_turned_away():
+    broadcaster = Broadcaster(max_subscribers=1)
+    broadcaster.subscribe()
+
+    with pytest.raises(HTTPException) as raised:
+        broadcaster.subscribe()
+
+    assert raised.value.status_code == 503
+    assert raised.value.headers["Retry-After"] == "5"
+    assert broadcaster.stats.rejected == 1
+
+
+def test_stream_route_answers_503_when_full(client, subscriber, monkeypatch):
+    monkeypatch.setattr(main.news_broadcaster, "max_subscribers", 0)
+
+    response = client.get("/api/news/stream", headers=subscriber)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+async def test_idle_stream_closes_once_the_subscription_lapses():
+    broadcaster = Broadcaster()
+    subscriber = broadcaster.subscribe()
+    checks = []
+
+    async def still_allowed():
+        checks.append(True)
+        return len(checks) < 2
+
+    frames = [frame async for frame in broadcaster.stream(subscriber, 0.01, still_allowed)]
+
+    assert frames == [HEARTBEAT_FRAME, UNSUBSCRIBED_FRAME]
+    assert len(broadcaster) == 0
+    assert broadcaster.stats.disconnected == 1
+
+
+async def test_busy_stream_does_not_recheck_the_subscription():
+    broadcaster = Broadcaster()
+    subscriber = broadcaster.subscribe()
+    frames = published(broadcaster, 2)
+
+    async def still_allowed():
+        raise AssertionError("checked while frames were waiting")
+
+    stream = broadcaster.stream(subscriber, 0.01, still_allowed)
+    assert [await stream.__anext__() for _ in frames] == frames
+    await stream.aclose()
+    assert len(broadcaster) == 0
@@ -0,0 +1,74 @@
+import pytest
+
+from app.config import Settings, get_settings
+
+
+def test_unset_variables_keep_the_defaults():
+    settings = Settings.from_env(environ={})
+
+    assert settings == Settings()
+    assert settings.bcrypt_rounds == 12
+    assert settings.rate_limits_enabled is True
+    assert settings.database_url is None
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1", True), ("true", True), ("YES", True), (" on ", True),
+    ("0", False), ("false", False), ("no", False), ("", False),
+])
+def test_booleans_accept_the_usual_spellings(raw, expected):
+    assert Settings.from_env(environ={"RATE_LIMITS_ENABLED": raw}).rate_limits_enabled is expected
+
+
+def test_numbers_are_converted_to_the_field_type():
+    settings = Settings.from_env(environ={"BCRYPT_ROUNDS": "10", "TRACE_SAMPLE_RATE": "0.5", "FCA_FEED_REFRESH_SECONDS": "60"})
+
+    assert settings.bcrypt_rounds == 10 and type(settings.bcrypt_rounds) is int
+    assert settings.trace_sample_rate == 0.5
+    assert type(settings.fca_feed_refresh_seconds) is float
+
+
+def test_optional_fields_take_the_inner_type():
+    settings = Settings.from_env(environ={"PASSWORD_HASH_MAX_PENDING": "16", "DATABASE_URL": "postgresql://db/app"})
+
+    assert settings.password_hash_max_pending == 16
+    assert settings.database_url == "postgresql://db/app"
+
+
+@pytest.mark.parametrize("name, raw, kind", [
+    ("BCRYPT_ROUNDS", "twelve", "int"),
+    ("BCRYPT_ROUNDS", "12.5", "int"),
+    ("TRACE_SAMPLE_RATE", "lots", "float"),
+    ("PASSWORD_HASH_MAX_PENDING", "none", "int"),
+])
+def test_invalid_numbers_name_the_variable(name, raw, kind):
+    with pytest.raises(ValueError, match=f"^{name}={raw!r} is not a valid {kind}$"):
+        Settings.from_env(environ={name: raw})
+
+
+def test_variable_names_are_the_upper_case_field_names():
+    assert Settings.from_env(environ={"bcrypt_rounds": "4", "LOG_LEVEL": "DEBUG"}) == Settings(log_level="DEBUG")
+
+
+@pytest.fixture
+def fresh_settings():
+    get_settings.cache_clear()
+    yield get_settings
+    get_settings.cache_clear()
+
+
+def test_dotenv_values_fill_in_unset_variables(fresh_settings, tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("FEED_MAX_PER_HOST=7\nLOG_FORMAT=text\n")
+    monkeypatch.setattr("dotenv.main.find_dotenv", lambda *args, **kwargs: str(env_file))
+    # Set then delete, so monkeypatch also removes what load_dotenv adds.
+    monkeypatch.setenv("FEED_MAX_PER_HOST", "")
+    monkeypatch.delenv("FEED_MAX_PER_HOST")
+    monkeypatch.setenv("LOG_FORMAT", "json")
+
+    settings = fresh_settings()
+
+    assert settings.feed_max_per_host == 7
+    # The real environment wins over .env.
+    assert settings.log_format == "json"
+    assert fresh_settings() is settings
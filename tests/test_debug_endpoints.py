@@ -0,0 +1,20 @@
+import pytest
+
+from app import principal
+
+
+@pytest.mark.parametrize("path", ["/api/debug/cache-stats", "/api/debug/traces", "/metrics"])
+def test_debug_endpoints_require_an_admin(client, subscriber, admin, path):
+    assert client.get(path).status_code in (401, 403)
+    assert client.get(path, headers=subscriber).status_code == 403
+    assert client.get(path, headers=admin).status_code == 200
+
+
+def test_metrics_accept_the_scrape_token(client, monkeypatch):
+    monkeypatch.setattr(principal, "METRICS_TOKEN", "scrape-secret")
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert client.get("/metrics", headers={"Authorization": "Bearer guess"}).status_code == 401
@@ -0,0 +1,117 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.expiry_sweeper import ExpirySweeper
+from app.repository import MemoryRepository
+from benchmarks.fakes import stripe_subscription
+
+pytestmark = pytest.mark.anyio
+
+
+def utc(timestamp: int) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+@pytest.fixture(autouse=True)
+def restore_timezone():
+    yield
+    time.tzset()
+
+
+@pytest.fixture
+def changed():
+    return []
+
+
+@pytest.fixture
+def sweeper(changed):
+    return ExpirySweeper(MemoryRepository(), grace=3600, batch_size=2, concurrency=2, on_user_changed=changed.append)
+
+
+def overdue(store, name: str, days: float = 2, status: str = "active"):
+    user = store.create_user(f"{name}@example.com", "x")
+    # Whole seconds, like the timestamps Stripe sends back.
+    period_end = (datetime.utcnow() - timedelta(days=days)).replace(microsecond=0)
+    return store.create_subscription(user.id, f"sub_{name}", status, period_end)
+
+
+async def test_renewed_subscription_gets_the_new_period_in_utc(store, stripe_state, sweeper, changed, monkeypatch):
+    # Far from UTC, so reading Stripe's timestamps as local time would move
+    # the period end by hours.
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    subscription = overdue(store, "renewed")
+    remote = stripe_state.subscriptions["sub_renewed"] = stripe_subscription("sub_renewed", "cus_1")
+
+    assert await sweeper.sweep_once() == 1
+
+    current = store.get_subscription_by_user_id(subscription.user_id)
+    assert current.status == "active"
+    assert current.current_period_end == utc(remote["current_period_end"])
+    assert sweeper.stats.renewed == 1
+    assert changed == [subscription.user_id]
+    assert await sweeper.sweep_once() == 0
+
+
+async def test_canceled_and_deleted_subscriptions_end(store, stripe_state, sweeper):
+    canceled = overdue(store, "canceled")
+    deleted = overdue(store, "deleted")
+    stripe_state.subscriptions["sub_canceled"] = stripe_subscription("sub_canceled", "cus_1", "canceled")
+    stripe_state.missing.add("sub_deleted")
+
+    assert await sweeper.sweep_once() == 2
+
+    assert store.get_subscription_by_user_id(canceled.user_id).status == "canceled"
+    assert store.get_subscription_by_user_id(deleted.user_id).status == "canceled"
+    assert sweeper.stats.ended == 2
+    assert store.due_subscriptions(datetime.utcnow(), 10) == []
+
+
+async def test_unchanged_subscription_is_deferred_not_rechecked_every_tick(store, stripe_state, sweeper):
+    subscription = overdue(store, "retrying")
+    # A renewal payment being retried: still active, period end not moved.
+    remote = stripe_subscription("sub_retrying", "cus_1")
+    remote["current_period_end"] = remote["items"]["data"][0]["current_period_end"] = int(
+        subscription.current_period_end.replace(tzinfo=timezone.utc).timestamp()
+    )
+    stripe_state.subscriptions["sub_retrying"] = remote
+
+    assert await sweeper.sweep_once() == 1
+    assert sweeper.stats.unchanged == 1
+    assert await sweeper.sweep_once() == 0
+    assert sweeper.metrics()["deferred"] == 1
+
+
+async def test_renewal_still_overdue_is_deferred_too(store, stripe_state, sweeper, changed):
+    subscription = overdue(store, "lagging", days=5)
+    # Stripe moved the period end, but not past the sweep's cutoff.
+    remote = stripe_subscription("sub_lagging", "cus_1")
+    still_overdue = int((datetime.utcnow() - timedelta(days=1)).replace(tzinfo=timezone.utc).timestamp())
+    remote["current_period_end"] = remote["items"]["data"][0]["current_period_end"] = still_overdue
+    stripe_state.subscriptions["sub_lagging"] = remote
+    requests = stripe_state.requests
+
+    assert await sweeper.sweep_once() == 1
+    assert store.get_subscription_by_user_id(subscription.user_id).current_period_end == utc(still_overdue)
+    assert changed == [subscription.user_id]
+    assert await sweeper.sweep_once() == 0
+    assert stripe_state.requests - requests == 1
+    assert sweeper.metrics()["deferred"] == 1
+
+
+async def test_subscriptions_within_the_grace_period_are_left_to_webhooks(store, stripe_state, sweeper):
+    overdue(store, "recent", days=0.01)
+
+    assert await sweeper.sweep_once() == 0
+
+
+async def test_each_tick_is_capped(store, stripe_state, changed):
+    for i in range(5):
+        overdue(store, f"user{i}")
+        stripe_state.missing.add(f"sub_user{i}")
+    sweeper = ExpirySweeper(MemoryRepository(), grace=0, batch_size=2, max_per_tick=3)
+
+    assert await sweeper.sweep_once() == 3
+    assert await sweeper.sweep_once() == 2
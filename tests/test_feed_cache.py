@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.feed_cache import FeedCache, FeedResponse
+
+pytestmark = pytest.mark.anyio
+
+
+def counting_fetcher(calls: list, delay: float = 0.01, fail: bool = False):
+    async def fetch(etag, modified):
+        calls.append((etag, modified))
+        await asyncio.sleep(delay)
+        if fail:
+            raise ConnectionError("feed down")
+        return FeedResponse(entries=["a", "b"], etag='"v1"')
+    return fetch
+
+
+async def test_cold_cache_fetches_once_for_concurrent_callers():
+    calls, notified = [], []
+
+    async def listener(articles):
+        notified.append(articles)
+
+    cache = FeedCache(counting_fetcher(calls), parse=list)
+    cache.add_listener(listener)
+
+    results = await asyncio.gather(*(cache.get_articles() for _ in range(10)))
+
+    assert len(calls) == 1
+    assert len(notified) == 1
+    assert all(result == ["a", "b"] for result in results)
+    assert cache.stats.misses == 10
+    assert cache.stats.refreshes == 1
+
+
+async def test_cold_cache_failure_is_not_retried_by_each_waiter():
+    calls = []
+    cache = FeedCache(counting_fetcher(calls, fail=True), parse=list)
+
+    results = await asyncio.gather(*(cache.get_articles() for _ in range(5)))
+
+    assert len(calls) == 1
+    assert results == [[]] * 5
+
+
+async def test_explicit_refresh_still_fetches_a_warm_cache():
+    calls = []
+    cache = FeedCache(counting_fetcher(calls), parse=list)
+    await cache.get_articles()
+
+    await cache.refresh()
+
+    assert len(calls) == 2
+    assert calls[1] == ('"v1"', None)
@@ -0,0 +1,72 @@
+import pytest
+
+from app.feed_registry import FeedSource
+from app.ingestion import IngestionEngine, canonical_link
+from app.models import Article
+
+
+def article(link: str, source: str) -> Article:
+    return Article(title=link, link=link, published="", summary="", source=source)
+
+
+@pytest.fixture
+def engine():
+    return IngestionEngine([FeedSource("PRA", "pra.xml"), FeedSource("BoE", "boe.xml")], parse_workers=0)
+
+
+@pytest.mark.parametrize("variant", [
+    "https://www.bankofengland.co.uk/prudential-regulation/news/notice",
+    "http://bankofengland.co.uk/prudential-regulation/news/notice/",
+    "  https://WWW.BankOfEngland.co.uk/prudential-regulation/news/notice  ",
+    "https://www.bankofengland.co.uk/prudential-regulation/news/notice?utm_source=rss&utm_medium=feed",
+    "https://www.bankofengland.co.uk/prudential-regulation/news/notice?fbclid=abc&gclid=def&mc_cid=1",
+])
+def test_variants_of_a_link_share_one_canonical_form(variant):
+    assert canonical_link(variant) == "bankofengland.co.uk/prudential-regulation/news/notice"
+
+
+def test_meaningful_query_parameters_are_kept_in_a_stable_order():
+    assert canonical_link("https://fca.org.uk/news?year=2024&id=7&utm_campaign=x") == "fca.org.uk/news?id=7&year=2024"
+    assert canonical_link("https://fca.org.uk/news?id=7&year=2024") == "fca.org.uk/news?id=7&year=2024"
+
+
+def test_different_paths_stay_distinct():
+    assert canonical_link("https://fca.org.uk/news/a") != canonical_link("https://fca.org.uk/news/b")
+
+
+def test_cross_posted_notice_belongs_to_the_first_feed(engine):
+    pra = [article("https://www.bankofengland.co.uk/pra/notice", "PRA")]
+    boe = [
+        article("https://bankofengland.co.uk/pra/notice?utm_source=boe", "BoE"),
+        article("https://bankofengland.co.uk/boe/rates", "BoE"),
+    ]
+
+    assert engine._unique(pra, count=True) == pra
+    assert engine._unique(boe, count=True) == boe[1:]
+    assert engine.stats.duplicates == 1
+    # The owner keeps getting its own item on later refreshes.
+    assert engine._unique(pra) == pra
+
+
+def test_repeats_within_one_feed_are_emitted_once(engine):
+    first = article("https://fca.org.uk/news/a", "PRA")
+    repeat = article("https://fca.org.uk/news/a/", "PRA")
+
+    assert engine._unique([first, repeat]) == [first]
+
+
+def test_merged_batches_keep_one_copy_per_notice(engine):
+    engine._unique([article("https://fca.org.uk/news/a", "BoE")])
+    merged = [article("https://fca.org.uk/news/a", "PRA"), article("https://fca.org.uk/news/a", "BoE")]
+
+    assert [item.source for item in engine._unique(merged)] == ["BoE"]
+
+
+def test_remembered_articles_keep_deduplicating_after_a_restart(engine):
+    engine.remember([article("https://fca.org.uk/news/a", "PRA"), article("https://fca.org.uk/news/b", None)])
+
+    assert engine._unique([article("https://fca.org.uk/news/a?utm_source=x", "BoE")]) == []
+    # Archived without a source: the first feed to see it again claims it.
+    claimed = [article("https://fca.org.uk/news/b", "BoE")]
+    assert engine._unique(claimed) == claimed
+    assert engine._unique([article("https://fca.org.uk/news/b", "PRA")]) == []
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway, RetryBudget
+
+pytestmark = pytest.mark.anyio
+
+
+def api_error(cls, status: int, headers=None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://llm.test/v1/chat/completions"))
+    return cls("upstream said no", response=response, body=None)
+
+
+class FakeClient:
+    # Plays back the scripted outcomes in order: an exception is raised, an
+    # awaitable is awaited, anything else is returned.
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if asyncio.iscoroutine(outcome):
+            return await outcome
+        return outcome
+
+
+def gateway(client, **kwargs):
+    kwargs.setdefault("backoff_base", 0.001)
+    return LLMGateway(lambda: client, **kwargs)
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+
+async def test_retries_server_errors_then_succeeds():
+    client = FakeClient(api_error(openai.InternalServerError, 500), "done")
+    llm = gateway(client)
+
+    assert await llm.chat_completion(model="m") == "done"
+    assert client.calls == 2
+    assert llm.stats.retries == 1
+    assert llm.breaker.state == "closed"
+
+
+async def test_gives_up_after_max_attempts_and_counts_a_failure():
+    client = FakeClient(*[api_error(openai.InternalServerError, 503)] * 3)
+    llm = gateway(client, max_attempts=3)
+
+    with pytest.raises(openai.InternalServerError):
+        await llm.chat_completion(model="m")
+    assert client.calls == 3
+    assert llm.breaker.failures == 1
+
+
+async def test_retry_budget_stops_retries_once_spent():
+    client = FakeClient(*[api_error(openai.InternalServerError, 500)] * 5)
+    llm = gateway(client, max_attempts=5, retry_budget=RetryBudget(ratio=0.0, min_tokens=1.0))
+
+    with pytest.raises(openai.InternalServerError):
+        await llm.chat_completion(model="m")
+    assert client.calls == 2
+    assert llm.stats.retry_budget_exhausted == 1
+
+
+async def test_client_errors_are_not_retried_or_counted_as_successes():
+    client = FakeClient(api_error(openai.BadRequestError, 400))
+    llm = gateway(client)
+    llm.breaker.failures = 3
+
+    with pytest.raises(openai.BadRequestError):
+        await llm.chat_completion(model="m")
+    assert client.calls == 1
+    assert llm.breaker.failures == 3
+
+
+async def test_breaker_opens_after_threshold_and_rejects_calls():
+    client = FakeClient(*[api_error(openai.InternalServerError, 500)] * 2)
+    llm = gateway(client, max_attempts=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            await llm.chat_completion(model="m")
+    with pytest.raises(CircuitOpenError):
+        await llm.chat_completion(model="m")
+    assert client.calls == 2
+    assert llm.breaker.state == "open"
+
+
+async def test_half_open_allows_a_single_probe():
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return "done"
+
+    client = FakeClient(slow())
+    llm = gateway(client)
+    open_breaker(llm.breaker)
+
+    probe = asyncio.create_task(llm.chat_completion(model="m"))
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitOpenError):
+        await llm.chat_completion(model="m")
+    release.set()
+
+    assert await probe == "done"
+    assert llm.breaker.state == "closed"
+
+
+async def test_cancelled_probe_frees_the_half_open_slot():
+    client = FakeClient(asyncio.sleep(60), "done")
+    llm = gateway(client)
+    open_breaker(llm.breaker)
+
+    probe = asyncio.create_task(llm.chat_completion(model="m"))
+    await asyncio.sleep(0)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert await llm.chat_completion(model="m") == "done"
+    assert llm.breaker.state == "closed"
+
+
+async def test_probe_rejected_by_the_provider_frees_the_slot():
+    client = FakeClient(api_error(openai.BadRequestError, 400), "done")
+    llm = gateway(client)
+    open_breaker(llm.breaker)
+
+    with pytest.raises(openai.BadRequestError):
+        await llm.chat_completion(model="m")
+    assert llm.breaker.state == "half_open"
+    assert await llm.chat_completion(model="m") == "done"
+
+
+async def test_retry_after_is_capped_at_backoff_max():
+    client = FakeClient(api_error(openai.RateLimitError, 429, headers={"retry-after": "3600"}), "done")
+    llm = gateway(client, backoff_max=0.05)
+
+    started = time.monotonic()
+    assert await asyncio.wait_for(llm.chat_completion(model="m"), 5) == "done"
+    assert time.monotonic() - started < 1
+
+
+async def test_short_retry_after_is_honoured():
+    error = api_error(openai.RateLimitError, 429, headers={"retry-after": "0.2"})
+    assert gateway(FakeClient())._backoff(1, error) == pytest.approx(0.2)
@@ -0,0 +1,31 @@
+import logging
+import os
+import subprocess
+import sys
+
+from app.log_config import configure_logging, shutdown_logging
+
+IMPORT_PROBE = """
+import logging
+before = (logging._srcfile, logging.logThreads, logging.getLogger().handlers[:])
+import app.main
+assert (logging._srcfile, logging.logThreads, logging.getLogger().handlers[:]) == before
+"""
+
+
+def test_importing_the_app_leaves_logging_alone():
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env, check=True, timeout=60)
+
+
+def test_shutdown_restores_what_configure_changed():
+    shutdown_logging()  # in case the app's lifespan configured it already
+    root = logging.getLogger()
+    before = (logging._srcfile, logging.logThreads, root.handlers[:], root.level)
+
+    configure_logging("DEBUG", "text")
+    assert logging.logThreads is False
+    assert root.level == logging.DEBUG
+    shutdown_logging()
+
+    assert (logging._srcfile, logging.logThreads, root.handlers[:], root.level) == before
@@ -0,0 +1,89 @@
+import gzip
+
+import pytest
+
+from app.response_cache import ENCODERS
+from app.services import article_archive, article_list, news_response_cache
+
+
+def get_news(client, headers, **extra):
+    return client.get("/api/news", params={"limit": 5}, headers={**headers, **extra})
+
+
+def test_identity_body_is_the_serialized_page(client, subscriber):
+    response = get_news(client, subscriber, **{"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    articles, _ = article_archive.page(limit=5)
+    assert response.content == article_list.dump_json(articles)
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_gzip_variant_decodes_to_identity_bytes(client, subscriber):
+    identity = get_news(client, subscriber, **{"Accept-Encoding": "identity"})
+    compressed = get_news(client, subscriber, **{"Accept-Encoding": "gzip"})
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    # httpx decodes the body; the validators must still tell the two apart.
+    assert compressed.content == identity.content
+    assert compressed.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+
+
+def test_gzip_bytes_are_deterministic():
+    body = b"x" * 4096
+    assert ENCODERS["gzip"](body) == ENCODERS["gzip"](body)
+    assert gzip.decompress(ENCODERS["gzip"](body)) == body
+
+
+@pytest.mark.skipif("br" not in ENCODERS, reason="brotli is not installed")
+def test_brotli_variant_decodes_to_identity_bytes(client, subscriber):
+    identity = get_news(client, subscriber, **{"Accept-Encoding": "identity"})
+    compressed = get_news(client, subscriber, **{"Accept-Encoding": "br, gzip"})
+
+    assert compressed.headers["content-encoding"] == "br"
+    assert compressed.content == identity.content
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip"])
+def test_matching_etag_is_not_modified(client, subscriber, encoding):
+    first = get_news(client, subscriber, **{"Accept-Encoding": encoding})
+    etag = first.headers["etag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = get_news(client, subscriber, **{"Accept-Encoding": encoding, "If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+
+def test_variant_etag_revalidates_other_encodings(client, subscriber):
+    gzipped = get_news(client, subscriber, **{"Accept-Encoding": "gzip"})
+
+    response = get_news(client, subscriber, **{"Accept-Encoding": "identity", "If-None-Match": gzipped.headers["etag"]})
+
+    assert response.status_code == 304
+
+
+def test_stale_etag_gets_the_full_page(client, subscriber):
+    response = get_news(client, subscriber, **{"If-None-Match": '"0000"'})
+
+    assert response.status_code == 200
+    assert response.json()
+
+
+def test_etag_survives_a_cache_rebuild(client, subscriber):
+    before = get_news(client, subscriber, **{"Accept-Encoding": "identity"}).headers["etag"]
+    news_response_cache.clear()
+
+    response = get_news(client, subscriber, **{"Accept-Encoding": "identity", "If-None-Match": before})
+
+    assert response.status_code == 304
+
+
+def test_not_modified_still_checks_the_subscription(client, subscriber):
+    etag = get_news(client, subscriber).headers["etag"]
+
+    response = client.get("/api/news", params={"limit": 5}, headers={"If-None-Match": etag})
+
+    assert response.status_code in (401, 403)
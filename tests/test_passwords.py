@@ -0,0 +1,87 @@
+import asyncio
+import threading
+
+import bcrypt
+import pytest
+from fastapi import HTTPException
+
+from app import main
+from app.auth import BCRYPT_ROUNDS, get_password_hash, password_needs_rehash
+from app.password_pool import PasswordHasherPool
+
+
+def login(client, email="user@example.com", password="correct horse"):
+    return client.post("/api/auth/login", json={"email": email, "password": password})
+
+
+@pytest.mark.anyio
+async def test_pool_turns_away_work_past_max_pending():
+    pool = PasswordHasherPool(workers=1, max_pending=1)
+    release = threading.Event()
+    running = asyncio.create_task(pool.run(release.wait))
+    await asyncio.sleep(0)
+    try:
+        assert pool.pending == 1
+
+        with pytest.raises(HTTPException) as raised:
+            await pool.hash("correct horse")
+
+        assert raised.value.status_code == 503
+        assert raised.value.headers["Retry-After"] == "1"
+        assert pool.metrics()["rejected"] == 1
+    finally:
+        release.set()
+        await running
+        pool.shutdown()
+    assert pool.metrics()["completed"] == 1
+
+
+def test_login_answers_503_while_the_pool_is_full(client, store, monkeypatch):
+    store.create_user("user@example.com", get_password_hash("correct horse"))
+    monkeypatch.setattr(main.password_pool, "pending", main.password_pool.max_pending)
+
+    response = login(client)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_register_answers_503_while_the_pool_is_full(client, monkeypatch):
+    monkeypatch.setattr(main.password_pool, "pending", main.password_pool.max_pending)
+
+    response = client.post("/api/auth/register", json={"email": "new@example.com", "password": "correct horse"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+@pytest.mark.parametrize("hashed, stale", [
+    (bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode(), False),
+    (bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=BCRYPT_ROUNDS + 1)).decode(), True),
+    ("not-a-bcrypt-hash", True),
+])
+def test_hashes_at_other_costs_need_rehashing(hashed, stale):
+    assert password_needs_rehash(hashed) is stale
+
+
+def test_login_rehashes_a_password_hashed_at_an_old_cost(client, store):
+    old = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(rounds=BCRYPT_ROUNDS + 1)).decode()
+    user = store.create_user("user@example.com", old)
+
+    assert login(client).status_code == 200
+
+    rehashed = store.get_user_by_id(user.id).hashed_password
+    assert rehashed != old
+    assert not password_needs_rehash(rehashed)
+    assert bcrypt.checkpw(b"correct horse", rehashed.encode())
+    # Already current: a second login leaves the hash alone.
+    assert login(client).status_code == 200
+    assert store.get_user_by_id(user.id).hashed_password == rehashed
+
+
+def test_failed_login_does_not_rehash(client, store):
+    old = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(rounds=BCRYPT_ROUNDS + 1)).decode()
+    user = store.create_user("user@example.com", old)
+
+    assert login(client, password="wrong").status_code == 401
+    assert store.get_user_by_id(user.id).hashed_password == old
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+
+from app.models import Article
+from app.presummarizer import Pacer, Presummarizer
+from app.summary_store import SummaryStore, summary_key
+
+pytestmark = pytest.mark.anyio
+
+
+def article(i: int) -> Article:
+    return Article(title=f"FCA notice {i}", link=f"https://fca.org.uk/news/{i}", published="", summary=f"Notice {i}.")
+
+
+def key(item: Article) -> str:
+    return summary_key(item.link, item.summary)
+
+
+class Summarizer:
+    # Records the order it was asked in; blocks until released if gated.
+    def __init__(self, gated: bool = False):
+        self.calls = []
+        self.gate = asyncio.Event()
+        if not gated:
+            self.gate.set()
+
+    async def __call__(self, content: str) -> str:
+        self.calls.append(content)
+        await self.gate.wait()
+        return f"summary of {content}"
+
+
+@pytest.fixture
+async def pipeline():
+    started = []
+
+    def build(summarize, **kwargs) -> Presummarizer:
+        presummarizer = Presummarizer(SummaryStore(), summarize, **{"rate_per_second": 0, **kwargs})
+        presummarizer.start()
+        started.append(presummarizer)
+        return presummarizer
+
+    yield build
+    for presummarizer in started:
+        await presummarizer.stop()
+
+
+async def test_articles_are_summarized_in_feed_order(pipeline):
+    summarize = Summarizer()
+    presummarizer = pipeline(summarize, workers=1)
+    articles = [article(i) for i in range(5)]
+
+    await presummarizer.enqueue_missing(articles)
+    await presummarizer.drain()
+
+    assert summarize.calls == [item.summary for item in articles]
+    assert presummarizer.stats.completed == 5
+
+
+async def test_reader_asking_first_does_not_wait_behind_the_queue(pipeline):
+    summarize = Summarizer(gated=True)
+    presummarizer = pipeline(summarize, workers=1)
+    first, wanted = article(1), article(2)
+    await presummarizer.enqueue_missing([first, wanted])
+    await asyncio.sleep(0)
+
+    # The worker is stuck on the first article; a reader goes straight to the store.
+    reader = asyncio.create_task(presummarizer.store.get_or_create(key(wanted), lambda: summarize(wanted.summary)))
+    await asyncio.sleep(0)
+    summarize.gate.set()
+
+    assert await reader == "summary of Notice 2."
+    await presummarizer.drain()
+    assert summarize.calls == ["Notice 1.", "Notice 2."]
+    assert presummarizer.stats.completed == 2
+
+
+async def test_full_queue_drops_articles_until_there_is_room(pipeline):
+    summarize = Summarizer(gated=True)
+    presummarizer = pipeline(summarize, workers=1, max_queue=2)
+    articles = [article(i) for i in range(5)]
+
+    await presummarizer.enqueue_missing(articles)
+
+    assert presummarizer.stats.enqueued == 2
+    assert presummarizer.stats.dropped == 3
+    assert presummarizer.metrics()["queue_depth"] == 2
+
+    summarize.gate.set()
+    await presummarizer.drain()
+    # Dropped articles were never marked pending, so later refreshes retry
+    # them, a queue's worth at a time.
+    for _ in range(2):
+        await presummarizer.enqueue_missing(articles)
+        await presummarizer.drain()
+    assert sorted(summarize.calls) == sorted(item.summary for item in articles)
+    assert presummarizer.stats.dropped == 4
+
+
+async def test_queued_and_cached_articles_are_not_enqueued_twice(pipeline):
+    summarize = Summarizer(gated=True)
+    ready = []
+    presummarizer = pipeline(summarize, workers=1, on_summary=lambda item, summary: ready.append(item.link))
+    cached, queued = article(1), article(2)
+    await presummarizer.store.get_or_create(key(cached), lambda: asyncio.sleep(0, "cached"))
+
+    await presummarizer.enqueue_missing([cached, queued])
+    await presummarizer.enqueue_missing([queued])
+
+    assert presummarizer.stats.enqueued == 1
+    assert presummarizer.stats.skipped == 2
+    assert ready == [cached.link]
+    summarize.gate.set()
+    await presummarizer.drain()
+
+
+async def test_pacer_spaces_calls_at_the_rate():
+    pacer = Pacer(rate_per_second=50)
+
+    started = time.monotonic()
+    await asyncio.gather(*(pacer.acquire() for _ in range(4)))
+
+    assert time.monotonic() - started >= 3 / 50 * 0.9
+
+
+async def test_workers_are_paced(pipeline):
+    presummarizer = pipeline(Summarizer(), workers=4, rate_per_second=50)
+
+    started = time.monotonic()
+    await presummarizer.enqueue_missing([article(i) for i in range(4)])
+    await presummarizer.drain()
+
+    assert time.monotonic() - started >= 3 / 50 * 0.9
@@ -0,0 +1,40 @@
+import pytest
+
+from app.database import UserRecord
+from app.models import User
+from app.principal import load_principal, principal_cache
+from app.repository import snapshot
+
+pytestmark = pytest.mark.anyio
+
+
+def test_store_lookups_return_records_without_copying(store):
+    user = store.create_user("record@example.com", "x")
+
+    found = store.get_user_by_email("record@example.com")
+
+    assert isinstance(found, UserRecord)
+    assert found is user
+
+
+def test_snapshot_copies_records_and_passes_models_through(store):
+    record = store.create_user("copy@example.com", "x")
+
+    copy = snapshot(record)
+
+    assert isinstance(copy, User)
+    assert (copy.id, copy.email, copy.created_at) == (record.id, record.email, record.created_at)
+    assert snapshot(copy) is copy
+    assert snapshot(None) is None
+
+
+async def test_cached_principal_is_not_changed_by_later_writes(store):
+    user = store.create_user("cached@example.com", "x")
+    principal = await load_principal(user.email)
+
+    store.update_user_stripe_customer(user.id, "cus_later")
+
+    assert isinstance(principal.user, User)
+    assert principal.user.stripe_customer_id is None
+    principal_cache.invalidate_user(user.id)
+    assert (await load_principal(user.email)).user.stripe_customer_id == "cus_later"
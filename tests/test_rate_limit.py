@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import database, rate_limit
+from app.rate_limit import Limit, MemoryBucketStore, PostgresBucketStore, RateLimiter, RateLimitExceeded, load_limits
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def elapse(store: MemoryBucketStore, key: str, seconds: float):
+    # Ages the bucket rather than the clock the event loop also reads.
+    store._buckets[key][1] -= seconds
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    def install(overrides: dict) -> RateLimiter:
+        installed = RateLimiter(load_limits(json.dumps(overrides)))
+        monkeypatch.setattr(rate_limit, "rate_limiter", installed)
+        return installed
+    return install
+
+
+@pytest.mark.parametrize("spec, rate, burst", [
+    ("30/minute", 0.5, 30.0),
+    ("10/hour", 10 / 3600, 10.0),
+    ("5/seconds", 5.0, 5.0),
+    ("2 / day", 2 / 86400, 2.0),
+])
+def test_limit_parses_count_and_period(spec, rate, burst):
+    assert Limit.parse(spec) == Limit(rate=rate, burst=burst)
+
+
+@pytest.mark.parametrize("spec", ["30", "30/fortnight", "0/minute", "-1/minute", "many/minute"])
+def test_limit_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError):
+        Limit.parse(spec)
+
+
+def test_overrides_replace_single_plans_and_add_policies():
+    limits = load_limits(json.dumps({"summary": {"pro": "600/minute"}, "export": {"standard": "1/hour"}}))
+
+    assert limits["summary"]["pro"] == Limit.parse("600/minute")
+    assert limits["summary"]["standard"] == Limit.parse(rate_limit.DEFAULT_LIMITS["summary"]["standard"])
+    assert limits["export"] == {"standard": Limit.parse("1/hour")}
+    assert limits["login_ip"] == {"standard": Limit.parse(rate_limit.DEFAULT_LIMITS["login_ip"]["standard"])}
+
+
+def test_overrides_need_a_standard_limit_for_new_policies():
+    with pytest.raises(ValueError, match="needs a 'standard' limit"):
+        load_limits(json.dumps({"export": {"pro": "1/hour"}}))
+
+
+def test_bucket_spends_its_burst_then_refills_at_the_rate():
+    store, limit = MemoryBucketStore(), Limit.parse("2/minute")
+
+    assert store.take("k", limit) == 0.0
+    assert store.take("k", limit) == 0.0
+    assert store.take("k", limit) == pytest.approx(30.0, abs=0.01)
+
+    elapse(store, "k", 15.0)
+    # Half a token has come back, so the other half is 15 seconds away.
+    assert store.take("k", limit) == pytest.approx(15.0, abs=0.01)
+    elapse(store, "k", 15.0)
+    assert store.take("k", limit) == 0.0
+
+
+def test_bucket_never_refills_past_its_burst():
+    store, limit = MemoryBucketStore(), Limit.parse("2/minute")
+    store.take("k", limit)
+
+    elapse(store, "k", 3600.0)
+
+    assert store.take("k", limit) == store.take("k", limit) == 0.0
+    assert store.take("k", limit) == pytest.approx(30.0, abs=0.01)
+
+
+def test_bucket_store_prunes_idle_buckets():
+    store, limit = MemoryBucketStore(max_buckets=2), Limit.parse("2/minute")
+    store.take("idle", limit)
+    store.take("busy", limit)
+    elapse(store, "idle", 2 * 86400.0)
+
+    store.take("new", limit)
+
+    assert sorted(store._buckets) == ["busy", "new"]
+
+
+def test_retry_after_header_rounds_up_to_whole_seconds():
+    assert RateLimitExceeded(0.2).headers["Retry-After"] == "1"
+    assert RateLimitExceeded(29.01).headers["Retry-After"] == "30"
+
+
+@pytest.mark.anyio
+async def test_limiter_picks_the_plan_limit_and_falls_back_to_standard():
+    limiter = RateLimiter(load_limits(json.dumps({"summary": {"standard": "1/minute", "pro": "3/minute"}})))
+
+    assert limiter.limit_for("summary", "enterprise") == limiter.limit_for("summary")
+    for plan, allowed in [("standard", 1), ("pro", 3), ("enterprise", 1)]:
+        for _ in range(allowed):
+            await limiter.hit("summary", f"user-{plan}", plan)
+        with pytest.raises(RateLimitExceeded):
+            await limiter.hit("summary", f"user-{plan}", plan)
+
+    assert limiter.metrics()["policies"]["summary"] == {"allowed": 5, "rejected": 3}
+
+
+@pytest.mark.anyio
+async def test_disabled_limiter_lets_everything_through():
+    limiter = RateLimiter(load_limits(json.dumps({"summary": {"standard": "1/day"}})), enabled=False)
+
+    for _ in range(5):
+        await limiter.hit("summary", "user-1")
+
+    assert len(limiter.memory) == 0
+
+
+def test_ip_limited_route_answers_429_with_retry_after(client, limiter):
+    limiter({"register": {"standard": "1/hour"}})
+
+    def register():
+        return client.post("/api/auth/register", json={"email": f"{uuid.uuid4().hex}@example.com", "password": "correct horse"})
+
+    assert register().status_code == 200
+    response = register()
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3600"
+
+
+@pytest.mark.parametrize("plan, allowed", [("standard", 1), ("pro", 3)])
+def test_plan_limited_route_uses_the_subscribers_plan(client, limiter, auth, plan, allowed):
+    limiter({"summary": {"standard": "1/minute", "pro": "3/minute"}})
+    user = database.create_user(f"{uuid.uuid4().hex}@example.com", "x")
+    database.create_subscription(user.id, f"sub_{uuid.uuid4().hex}", "active", datetime.utcnow() + timedelta(days=30), plan)
+    headers = auth(user.email)
+
+    statuses = [client.get("/api/articles/missing/summary", headers=headers).status_code for _ in range(allowed + 1)]
+    response = client.get("/api/articles/missing/summary", headers=headers)
+
+    assert statuses == [404] * allowed + [429]
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == 60 // allowed
+
+
+@pytest.mark.anyio
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+async def test_shared_buckets_allow_exactly_the_burst_across_connections():
+    from app.postgres_repository import PostgresRepository
+
+    repository = PostgresRepository(TEST_DATABASE_URL, max_size=5)
+    await repository.open()
+    try:
+        key = f"test:{uuid.uuid4().hex}"
+        store, limit = PostgresBucketStore(repository), Limit.parse("3/minute")
+
+        outcomes = await asyncio.gather(*[store.take(key, limit) for _ in range(10)])
+
+        assert outcomes.count(0.0) == 3
+        assert max(outcomes) == pytest.approx(20.0, abs=0.5)
+        async with repository.pool.connection() as conn:
+            await conn.execute("DELETE FROM rate_limit_buckets WHERE key = %s", (key,))
+    finally:
+        await repository.close()
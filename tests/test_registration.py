@@ -0,0 +1,40 @@
+import pytest
+
+from app.database import EmailAlreadyRegistered
+from app.repository import repository
+
+
+def register(client, email="dup@example.com"):
+    return client.post("/api/auth/register", json={"email": email, "password": "correct horse"})
+
+
+def test_second_registration_for_an_email_is_rejected(client):
+    assert register(client).status_code == 200
+
+    response = register(client)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+
+def test_registration_racing_past_the_lookup_is_rejected(client, store, monkeypatch):
+    # Both requests saw no account; the store has to refuse the second one.
+    store.create_user("dup@example.com", "x")
+
+    async def nobody(email):
+        return None
+
+    monkeypatch.setattr(repository, "get_user_by_email", nobody)
+    response = register(client)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+
+def test_store_keeps_the_first_account_for_an_email(store):
+    first = store.create_user("dup@example.com", "x")
+
+    with pytest.raises(EmailAlreadyRegistered):
+        store.create_user("dup@example.com", "y")
+    assert store.get_user_by_email("dup@example.com").id == first.id
+    assert not store.check_index_consistency()
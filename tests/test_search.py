@@ -0,0 +1,7 @@
+def test_search_returns_matching_articles_best_first(client, subscriber):
+    response = client.get("/api/news/search", params={"q": "notice 3", "limit": 3}, headers=subscriber)
+
+    assert response.status_code == 200
+    articles = response.json()
+    assert 0 < len(articles) <= 3
+    assert articles[0]["title"].startswith("FCA notice 3:")
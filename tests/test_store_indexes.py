@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+
+def period_end(days: int) -> datetime:
+    return datetime.utcnow() + timedelta(days=days)
+
+
+def test_indexes_follow_create_update_relink_and_delete(store):
+    alice = store.create_user("alice@example.com", "x")
+    bob = store.create_user("bob@example.com", "x")
+    store.update_user_stripe_customer(alice.id, "cus_a1")
+    store.create_subscription(alice.id, "sub_a1", "active", period_end(10))
+    store.update_user_stripe_customer(bob.id, "cus_b1")
+    store.create_subscription(bob.id, "sub_b1", "trialing", period_end(3))
+    assert not store.check_index_consistency()
+
+    store.update_subscription(alice.id, "past_due", period_end(-1), "pro")
+    store.update_subscription(bob.id, "active", period_end(30))
+    assert not store.check_index_consistency()
+
+    # Relinked to a new customer, with a new subscription replacing the old one.
+    store.update_user_stripe_customer(alice.id, "cus_a2")
+    store.create_subscription(alice.id, "sub_a2", "active", period_end(20))
+    assert not store.check_index_consistency()
+    assert store.get_user_by_stripe_customer_id("cus_a1") is None
+    assert store.get_user_by_stripe_customer_id("cus_a2").id == alice.id
+    assert store.get_user_by_stripe_subscription_id("sub_a1") is None
+    assert store.get_user_by_stripe_subscription_id("sub_a2").id == alice.id
+
+    store.delete_user(bob.id)
+    assert not store.check_index_consistency()
+    assert store.get_user_by_email("bob@example.com") is None
+    assert store.get_user_by_stripe_customer_id("cus_b1") is None
+    assert store.get_user_by_stripe_subscription_id("sub_b1") is None
+    assert store.account_stats(datetime.utcnow(), 31)["subscriptions"] == {"active": 1}
+
+    # The address is free again.
+    store.create_user("bob@example.com", "y")
+    assert not store.check_index_consistency()
+
+
+def test_consistency_check_reports_a_stale_index(store):
+    user = store.create_user("alice@example.com", "x")
+    store.update_user_stripe_customer(user.id, "cus_1")
+    store.create_subscription(user.id, "sub_1", "active", period_end(10))
+
+    store.email_to_user_id["ghost@example.com"] = user.id
+    del store.stripe_customer_to_user_id["cus_1"]
+    store.subscription_status_counts["active"] += 1
+
+    problems = store.check_index_consistency()
+
+    assert any("ghost@example.com" in problem for problem in problems)
+    assert any("missing from the stripe customer index" in problem for problem in problems)
+    assert any("active subscription count" in problem for problem in problems)
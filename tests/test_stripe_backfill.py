@@ -0,0 +1,141 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.repository import MemoryRepository
+from app.stripe_backfill import StripeBackfill, plan_shards
+from benchmarks.fakes import stripe_customer, stripe_subscription
+
+pytestmark = pytest.mark.anyio
+
+ACCOUNTS = 12
+
+
+class FailingRepository(MemoryRepository):
+    # Stands in for the process dying: every write after the first few fails.
+    def __init__(self, writes: int):
+        self.writes = writes
+
+    def _write(self):
+        self.writes -= 1
+        if self.writes < 0:
+            raise RuntimeError("store went away")
+
+    async def link_stripe_customers(self, rows):
+        self._write()
+        return await super().link_stripe_customers(rows)
+
+    async def upsert_stripe_subscriptions(self, rows):
+        self._write()
+        return await super().upsert_stripe_subscriptions(rows)
+
+
+@pytest.fixture
+def accounts(store, stripe_state):
+    created = int(time.time()) - 1000
+    for i in range(ACCOUNTS):
+        store.create_user(f"user{i}@example.com", "x")
+        stripe_state.customers[f"cus_{i}"] = stripe_customer(f"cus_{i}", f"user{i}@example.com", created + i)
+        subscription = stripe_state.subscriptions[f"sub_{i}"] = stripe_subscription(f"sub_{i}", f"cus_{i}")
+        subscription["created"] = created + i
+    return plan_shards(created - 1, int(time.time()) + 1, 2)
+
+
+def backfill(repository, shards, checkpoint, **kwargs) -> StripeBackfill:
+    return StripeBackfill(repository, shards, str(checkpoint), concurrency=1, requests_per_second=1000, page_size=3, **kwargs)
+
+
+def assert_all_linked(store):
+    for i in range(ACCOUNTS):
+        user = store.get_user_by_email(f"user{i}@example.com")
+        assert user.stripe_customer_id == f"cus_{i}"
+        assert store.get_subscription_by_user_id(user.id).stripe_subscription_id == f"sub_{i}"
+    assert not store.check_index_consistency()
+
+
+async def test_full_run_links_every_account(store, accounts, tmp_path):
+    changed = []
+    job = backfill(MemoryRepository(), accounts, tmp_path / "backfill.json", on_user_changed=changed.append)
+
+    progress = await job.run()
+
+    assert progress["shards_done"] == progress["shards"]
+    assert progress["customers"] == progress["subscriptions"] == ACCOUNTS
+    assert len(set(changed)) == ACCOUNTS
+    assert_all_linked(store)
+
+
+async def test_resume_continues_from_the_checkpoint(store, stripe_state, accounts, tmp_path):
+    checkpoint = tmp_path / "backfill.json"
+
+    interrupted = backfill(FailingRepository(writes=3), accounts, checkpoint)
+    with pytest.raises(RuntimeError):
+        await interrupted.run()
+    assert interrupted.progress()["error"] == "RuntimeError: store went away"
+
+    requests = stripe_state.requests
+    resumed = StripeBackfill.resume(MemoryRepository(), str(checkpoint), concurrency=1, requests_per_second=1000, page_size=3)
+    assert resumed.stats.pages == 3
+    assert any(shard.starting_after for shard in resumed.shards)
+    progress = await resumed.run()
+    resume_requests = stripe_state.requests - requests
+
+    assert progress["shards_done"] == progress["shards"]
+    assert_all_linked(store)
+    # The three applied pages are not fetched again; the one that failed is.
+    requests = stripe_state.requests
+    await backfill(MemoryRepository(), plan_shards(accounts[0].gte, accounts[-1].lt, 2), tmp_path / "full.json").run()
+    assert resume_requests == stripe_state.requests - requests - 3
+
+
+async def test_ended_subscription_does_not_move_a_live_customer(store):
+    user = store.create_user("moved@example.com", "x")
+    store.update_user_stripe_customer(user.id, "cus_old")
+    store.create_subscription(user.id, "sub_live", "active", datetime.utcnow() + timedelta(days=10))
+
+    changed = store.upsert_stripe_subscriptions([
+        ("moved@example.com", "cus_new", "sub_ended", "canceled", datetime.utcnow(), "standard"),
+    ])
+
+    assert changed == []
+    assert store.get_user_by_email("moved@example.com").stripe_customer_id == "cus_old"
+    assert store.get_subscription_by_user_id(user.id).stripe_subscription_id == "sub_live"
+
+
+async def test_customer_pass_does_not_move_a_live_customer(store):
+    store.create_user("a@x.com", "x")
+    store.upsert_stripe_subscriptions([
+        ("a@x.com", "cus_A", "sub_1", "active", datetime.utcnow() + timedelta(days=10), "standard"),
+    ])
+
+    assert store.link_stripe_customers([("a@x.com", "cus_B")]) == []
+    assert store.get_user_by_stripe_customer_id("cus_A").email == "a@x.com"
+    assert store.get_user_by_stripe_customer_id("cus_B") is None
+
+
+async def test_duplicate_customers_keep_the_one_with_the_live_subscription(store, stripe_state, tmp_path):
+    created = int(time.time()) - 1000
+    user = store.create_user("dup@example.com", "x")
+    stripe_state.customers["cus_A"] = stripe_customer("cus_A", "dup@example.com", created)
+    # A newer customer with the same email and no subscription.
+    stripe_state.customers["cus_B"] = stripe_customer("cus_B", "dup@example.com", created + 10)
+    subscription = stripe_state.subscriptions["sub_A"] = stripe_subscription("sub_A", "cus_A")
+    subscription["created"] = created
+
+    await backfill(MemoryRepository(), plan_shards(created - 1, int(time.time()) + 1, 1), tmp_path / "backfill.json").run()
+
+    assert store.get_user_by_email("dup@example.com").stripe_customer_id == "cus_A"
+    assert store.get_user_by_stripe_customer_id("cus_A").id == user.id
+    assert store.get_subscription_by_user_id(user.id).stripe_subscription_id == "sub_A"
+    assert not store.check_index_consistency()
+
+
+async def test_unchanged_user_with_a_kept_subscription_is_not_reported(store):
+    user = store.create_user("same@example.com", "x")
+    store.update_user_stripe_customer(user.id, "cus_1")
+    store.create_subscription(user.id, "sub_live", "active", datetime.utcnow() + timedelta(days=10))
+
+    assert store.upsert_stripe_subscriptions([
+        ("same@example.com", "cus_1", "sub_ended", "canceled", datetime.utcnow(), "standard"),
+    ]) == []
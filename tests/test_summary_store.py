@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.summary_store import SummaryStore
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_callers_share_one_producer():
+    store = SummaryStore()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "summary"
+
+    results = await asyncio.gather(*(store.get_or_create("k", produce) for _ in range(5)))
+
+    assert results == ["summary"] * 5
+    assert len(calls) == 1
+    assert store.stats.coalesced == 4
+    assert store.metrics()["inflight"] == 0
+
+
+async def test_producer_error_reaches_every_waiter():
+    store = SummaryStore()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(store.get_or_create("k", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert store.metrics()["inflight"] == 0
+
+
+async def test_waiters_take_over_when_the_producer_is_cancelled():
+    store = SummaryStore()
+    started = asyncio.Event()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        started.set()
+        await asyncio.sleep(0.05)
+        return "summary"
+
+    leader = asyncio.create_task(store.get_or_create("k", produce))
+    await started.wait()
+    follower = asyncio.create_task(store.get_or_create("k", produce))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await asyncio.wait_for(follower, 1) == "summary"
+    assert leader.cancelled()
+    assert len(calls) == 2
+    assert store.metrics()["inflight"] == 0
+
+
+async def test_cancelled_waiter_leaves_the_producer_running():
+    store = SummaryStore()
+    started = asyncio.Event()
+
+    async def produce():
+        started.set()
+        await asyncio.sleep(0.02)
+        return "summary"
+
+    leader = asyncio.create_task(store.get_or_create("k", produce))
+    await started.wait()
+    follower = asyncio.create_task(store.get_or_create("k", produce))
+    await asyncio.sleep(0)
+    follower.cancel()
+
+    assert await leader == "summary"
+    with pytest.raises(asyncio.CancelledError):
+        await follower
+    assert store.peek("k") == "summary"
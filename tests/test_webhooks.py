@@ -0,0 +1,165 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.repository import MemoryRepository
+from app.webhooks import WebhookQueue
+
+pytestmark = pytest.mark.anyio
+
+PERIOD_END = 1_900_000_000
+
+
+def event(event_id: str, event_type: str, obj: dict, created: int = 1_700_000_000) -> dict:
+    return {"id": event_id, "type": event_type, "created": created, "data": {"object": obj}}
+
+
+def checkout(event_id: str, email: str, customer: str = "cus_1") -> dict:
+    return event(event_id, "checkout.session.completed", {"id": f"cs_{event_id}", "customer": customer, "customer_email": email})
+
+
+def subscription_event(event_id: str, event_type: str, status: str, created: int, customer: str = "cus_1") -> dict:
+    subscription = {"id": "sub_1", "customer": customer, "status": status, "current_period_end": PERIOD_END}
+    return event(event_id, event_type, subscription, created)
+
+
+async def deliver(queue: WebhookQueue, *events) -> list:
+    accepted = [await queue.submit(e, json.dumps(e)) for e in events]
+    await queue.drain()
+    return accepted
+
+
+@pytest.fixture
+async def queue():
+    queue = WebhookQueue(MemoryRepository(), workers=2, claim_timeout=0)
+    queue.start()
+    yield queue
+    await queue.stop()
+
+
+@pytest.fixture
+def user(store):
+    return store.create_user("payer@example.com", "x")
+
+
+async def test_duplicate_deliveries_are_applied_once(queue, store, user):
+    created = subscription_event("evt_2", "customer.subscription.created", "active", 1_700_000_100)
+
+    accepted = await deliver(queue, checkout("evt_1", user.email), created, created)
+
+    assert accepted == [True, True, False]
+    assert queue.stats.duplicates == 1
+    assert queue.stats.processed == 2
+    assert store.get_subscription_by_user_id(user.id).status == "active"
+
+
+async def test_subscription_event_before_checkout_is_parked_until_the_link(queue, store, user):
+    await deliver(queue, subscription_event("evt_2", "customer.subscription.created", "active", 1_700_000_100))
+
+    assert queue.metrics()["parked_customers"] == 1
+    assert store.get_subscription_by_user_id(user.id) is None
+    assert store.webhook_events_db["evt_2"]["processed_at"] is None
+
+    await deliver(queue, checkout("evt_1", user.email))
+    await queue.drain()
+
+    assert queue.metrics()["parked_customers"] == 0
+    assert store.get_subscription_by_user_id(user.id).status == "active"
+    assert store.webhook_events_db["evt_2"]["processed_at"] is not None
+
+
+async def test_older_event_arriving_late_is_skipped(queue, store, user):
+    await deliver(
+        queue,
+        checkout("evt_1", user.email),
+        subscription_event("evt_3", "customer.subscription.deleted", "canceled", 1_700_000_200),
+        subscription_event("evt_2", "customer.subscription.updated", "active", 1_700_000_100),
+    )
+
+    assert queue.stats.stale_skipped == 1
+    assert store.get_subscription_by_user_id(user.id).status == "canceled"
+
+
+async def test_same_second_events_are_ordered_by_type(queue, store, user):
+    await deliver(
+        queue,
+        checkout("evt_1", user.email),
+        subscription_event("evt_3", "customer.subscription.updated", "past_due", 1_700_000_100),
+        subscription_event("evt_2", "customer.subscription.created", "incomplete", 1_700_000_100),
+    )
+
+    assert queue.stats.stale_skipped == 1
+    assert store.get_subscription_by_user_id(user.id).status == "past_due"
+
+
+async def test_event_versions_are_shared_between_workers(store, user):
+    first, second = WebhookQueue(MemoryRepository()), WebhookQueue(MemoryRepository())
+    await first.apply(checkout("evt_1", user.email))
+
+    await first.apply(subscription_event("evt_3", "customer.subscription.deleted", "canceled", 1_700_000_200))
+    await second.apply(subscription_event("evt_2", "customer.subscription.updated", "active", 1_700_000_100))
+
+    assert second.stats.stale_skipped == 1
+    assert store.get_subscription_by_user_id(user.id).status == "canceled"
+
+
+async def pending(store, e: dict, claimed_seconds_ago: float):
+    # As if a worker took the event and died that long ago.
+    await MemoryRepository().record_webhook_event(e["id"], e["type"], json.dumps(e))
+    store.webhook_events_db[e["id"]]["claimed_at"] -= timedelta(seconds=claimed_seconds_ago)
+
+
+async def test_pending_events_are_recovered_by_one_worker_only(store, user):
+    await pending(store, checkout("evt_1", user.email), claimed_seconds_ago=120)
+    first, second = (WebhookQueue(MemoryRepository(), claim_timeout=60) for _ in range(2))
+
+    assert await first.recover() == 1
+    assert await second.recover() == 0
+
+    first.start()
+    await first.drain()
+    await first.stop()
+    assert store.get_user_by_email(user.email).stripe_customer_id == "cus_1"
+    assert store.webhook_events_db["evt_1"]["processed_at"] is not None
+
+
+async def test_recently_claimed_events_are_left_to_their_worker(store):
+    await pending(store, checkout("evt_1", "nobody@example.com"), claimed_seconds_ago=10)
+
+    assert await WebhookQueue(MemoryRepository(), claim_timeout=60).recover() == 0
+    assert await WebhookQueue(MemoryRepository(), claim_timeout=5).recover() == 1
+
+
+async def test_processed_events_are_forgotten_after_the_dedup_window(store, user):
+    queue = WebhookQueue(MemoryRepository(), claim_timeout=0, dedup_window=3600)
+    queue.start()
+    old, recent = checkout("evt_1", user.email), checkout("evt_2", user.email)
+    await deliver(queue, old, recent)
+    await queue.stop()
+    store.webhook_events_db["evt_1"]["processed_at"] -= timedelta(hours=2)
+    await pending(store, checkout("evt_3", user.email), claimed_seconds_ago=7200)
+
+    assert await queue.prune() == 1
+
+    # Unprocessed events are kept however old, so recovery still finds them.
+    assert sorted(store.webhook_events_db) == ["evt_2", "evt_3"]
+    assert queue.stats.pruned == 1
+    assert await queue.submit(recent, json.dumps(recent)) is False
+
+
+async def test_period_end_is_read_as_utc(queue, store, user, monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        await deliver(
+            queue,
+            checkout("evt_1", user.email),
+            subscription_event("evt_2", "customer.subscription.created", "active", 1_700_000_100),
+        )
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    assert store.get_subscription_by_user_id(user.id).current_period_end == datetime(2030, 3, 17, 17, 46, 40)